@@ -0,0 +1,53 @@
+import random
+import numpy as np
+import pytest
+from abstraction import HandAbstraction
+from card import CARDS, Card, Suit, evaluate
+
+def deal(n_cards, seed):
+    return random.Random(seed).sample(CARDS, n_cards)
+
+def test_river_hs_is_exact():
+    cards = deal(7, 1)
+    hole, board = cards[:2], cards[2:]
+    ours = evaluate(hole + board)
+    live = [card for card in CARDS if card not in cards]
+    scores = [(ours > theirs) + 0.5 * (ours == theirs)
+              for theirs in (evaluate([live[i], live[j]] + board) for i in range(len(live)) for j in range(i + 1, len(live)))]
+    for seed in (2, 3):
+        abstraction = HandAbstraction(rng=np.random.default_rng(seed))
+        assert abs(abstraction.strength(hole, board) - np.mean(scores)) < 1e-12
+
+def test_ehs2_range_and_buckets():
+    abstraction = HandAbstraction(metric='ehs2', rng=np.random.default_rng(1))
+    royal = [Card(Suit.Spade, value) for value in (14, 13, 12, 11, 10)]
+    assert abstraction.strength(royal[:2], royal[2:]) == 1.0
+    assert abstraction.bucket(royal[:2], royal[2:]) == abstraction.n_buckets - 1
+    for seed in range(5):
+        cards = deal(5, seed)
+        strength = abstraction.strength(cards[:2], cards[2:])
+        assert 0 <= strength <= 1
+        assert abstraction.bucket(cards[:2], cards[2:]) == abstraction.bucket_of(strength)
+    assert abstraction.bucket_of(0.0) == 0 and abstraction.bucket_of(0.55) == 5
+
+def test_tables_round_trip(tmp_path):
+    path = str(tmp_path / 'tables.pkl')
+    abstraction = HandAbstraction(rng=np.random.default_rng(1))
+    hands = [deal(n_cards, seed) for n_cards in (5, 6) for seed in range(4)]
+    strengths = [abstraction.strength(cards[:2], cards[2:]) for cards in hands]
+    abstraction.save_tables(path)
+    loaded = HandAbstraction(n_samples=0, rng=np.random.default_rng(2))
+    loaded.load_tables(path)
+    assert [loaded.strength(cards[:2], cards[2:]) for cards in hands] == strengths
+    with pytest.raises(ValueError):
+        HandAbstraction(metric='ehs2').load_tables(path)
+
+def test_tables_keep_the_most_recently_used_classes():
+    abstraction = HandAbstraction(rng=np.random.default_rng(1), table_size=2)
+    flops = [deal(5, seed) for seed in range(3)]
+    keys = [abstraction.key(cards[:2], cards[2:]) for cards in flops]
+    abstraction.strength(flops[0][:2], flops[0][2:])
+    abstraction.strength(flops[1][:2], flops[1][2:])
+    abstraction.strength(flops[0][:2], flops[0][2:])
+    abstraction.strength(flops[2][:2], flops[2][2:])
+    assert list(abstraction.tables['flop']) == [keys[0], keys[2]]
@@ -0,0 +1,41 @@
+import numpy as np
+from batch_game import BatchGames, game_actions
+from card import CARDS
+from game import GameState
+from player import RandomPlayer, RaisePlayer, CallPlayer
+
+class DealInOrder:
+    # stands in for a deck's rng: shuffle puts the cards in the order of codes, then the rest
+    def __init__(self, codes):
+        self.codes = [int(code) for code in codes]
+
+    def shuffle(self, deck):
+        rest = [card for card in CARDS if card.code not in self.codes]
+        deck[:] = [CARDS[code] for code in self.codes] + rest
+
+def replay(results, i):
+    # game i played through GameState from the same deal, as MatchSimulator.play drives it
+    codes = np.concatenate([results['hands'][i].reshape(-1), results['boards'][i]])
+    chips = results['chips'][i].tolist()
+    state = GameState(2, int(results['small_blind_player'][i]), list(chips), 'FL', rng=DealInOrder(codes))
+    moves = [(action, actor) for action, actor in game_actions(results, i)[2:] if action in ('bet', 'call', 'fold')]
+    while not state.is_termination_state():
+        while not state.is_all_set():
+            action, actor = moves.pop(0)
+            assert actor == state.current_better
+            state.act((action, 0))
+        state.update_round()
+    assert not moves
+    return state, [end - start for end, start in zip(state.players_chips, chips)]
+
+def test_batch_games_play_by_game_state_rules():
+    for policies, chips, seed in (([RandomPlayer, CallPlayer], (1000, 1000), 1), ([RaisePlayer, RandomPlayer], (150, 260), 2),
+                                  ([(0.5, 0.4, 0.1), (0.3, 0.6, 0.1)], (100, 400), 3)):
+        results = BatchGames(32, policies, chips, seed=seed).run(600)
+        assert results['showdown'].any() and not results['showdown'].all()
+        for i in range(len(results['deltas'])):
+            state, deltas = replay(results, i)
+            assert state.game_actions == game_actions(results, i)
+            assert deltas == results['deltas'][i].tolist()
+            assert state.pot_won == results['pots'][i]
+            assert (state.showdown_board is not None) == results['showdown'][i]
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+from benchmark import compare, flatten, run_suite
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vexbot', 'benchmark.py')
+
+def test_report_round_trips_through_json():
+    report = run_suite(['evaluator', 'engine', 'vexbot'], quick=True)
+    assert set(report) == {'meta', 'evaluator', 'engine', 'vexbot'}
+    assert [row['games_trained'] for row in report['vexbot']] == [0, 50, 200]
+    assert all(name.endswith('_per_sec') for name in list(report['evaluator']) + list(report['engine']))
+    loaded = json.loads(json.dumps(report))
+    assert loaded == report and flatten(loaded) == flatten(report)
+    # an unchanged report has no regressions
+    assert not any(row['regression'] for row in compare(loaded, report))
+
+def test_compare_flags_changes_past_the_threshold():
+    old = {'meta': {}, 'evaluator': {'evaluate_hands_per_sec': 1000.0}, 'vexbot': [{'games_trained': 0, 'p50_ms': 1.0, 'p99_ms': 2.0}]}
+    new = {'meta': {}, 'evaluator': {'evaluate_hands_per_sec': 850.0}, 'vexbot': [{'games_trained': 0, 'p50_ms': 1.05, 'p99_ms': 2.5}]}
+    rows = {row['metric']: row for row in compare(old, new, threshold=0.1)}
+    assert rows['evaluator.evaluate_hands_per_sec']['regression']
+    assert not rows['vexbot.0.p50_ms']['regression']
+    assert rows['vexbot.0.p99_ms']['regression'] and abs(rows['vexbot.0.p99_ms']['change'] - 0.25) < 1e-12
+    # faster is never a regression
+    assert not any(row['regression'] for row in compare(new, old, threshold=0.1))
+
+def test_compare_exits_with_an_error_on_a_regression(tmp_path):
+    report = run_suite(['evaluator'], quick=True)
+    for scale, returncode in ((100.0, 1), (0.01, 0)):
+        baseline = str(tmp_path / 'baseline.json')
+        with open(baseline, 'w') as f:
+            json.dump(dict(report, evaluator={name: value * scale for name, value in report['evaluator'].items()}), f)
+        out = str(tmp_path / 'report.json')
+        run = subprocess.run([sys.executable, BENCHMARK, 'evaluator', '--quick', '--compare', baseline, '--out', out])
+        assert run.returncode == returncode
+        with open(out) as f:
+            assert any(row['regression'] for row in json.load(f)['comparison']) == (returncode == 1)
@@ -0,0 +1,80 @@
+import random
+from itertools import combinations
+import numpy as np
+from card import CARDS, Hand, canonicalize, evaluate, evaluate_batch, hand_type_of, cards_to_codes
+
+# Hand.is_* in hand type order (0 = straight flush, ..., 7 = pair); 8 = high card
+CHECKS = [Hand.is_straight_flush, Hand.is_four_oak, Hand.is_full_house, Hand.is_flush,
+          Hand.is_straight, Hand.is_three_oak, Hand.is_two_pair, Hand.is_pair]
+
+def reference(cards):
+    # comparable key of the best 5 cards from the Hand oracle: (-hand type, card values in
+    # comparison order), larger is better as with evaluate()
+    best = None
+    for five in combinations(cards, 5):
+        five = sorted(five, key=lambda card: card.value, reverse=True)
+        hand_type, comp_cards = 8, five
+        for k, check in enumerate(CHECKS):
+            result = check(five)
+            if result:
+                hand_type, comp_cards = k, result
+                break
+        key = (-hand_type, [card.value for card in comp_cards])
+        if best is None or key > best:
+            best = key
+    return best
+
+def random_hands(n_cards, n_hands, seed):
+    rng = random.Random(seed)
+    return [rng.sample(CARDS, n_cards) for _ in range(n_hands)]
+
+def compare(a, b):
+    return (a > b) - (a < b)
+
+def test_evaluate_matches_hand_oracle():
+    for n_cards in (5, 6, 7):
+        hands = random_hands(n_cards, 1500, seed=n_cards)
+        refs = [reference(hand) for hand in hands]
+        strengths = [evaluate(hand) for hand in hands]
+        for strength, ref in zip(strengths, refs):
+            assert hand_type_of(strength) == -ref[0]
+        # neighbouring hands compare the same way under both
+        for i in range(len(hands) - 1):
+            assert compare(strengths[i], strengths[i + 1]) == compare(refs[i], refs[i + 1])
+
+def test_evaluate_matches_oracle_on_close_hands():
+    # hands sharing a board, where ties and kickers decide
+    rng = random.Random(11)
+    for _ in range(500):
+        cards = rng.sample(CARDS, 9)
+        board = cards[4:]
+        a, b = cards[:2] + board, cards[2:4] + board
+        assert compare(evaluate(a), evaluate(b)) == compare(reference(a), reference(b))
+
+def test_evaluate_batch_matches_evaluate():
+    for n_cards in (5, 6, 7):
+        hands = random_hands(n_cards, 5000, seed=100 + n_cards)
+        codes = np.array([cards_to_codes(hand) for hand in hands])
+        assert evaluate_batch(codes).tolist() == [evaluate(hand) for hand in hands]
+
+def test_flop_classes_cover_every_flop():
+    classes = dict()
+    for flop in combinations(CARDS, 3):
+        canonical, multiplicity = canonicalize([flop])
+        assert classes.setdefault(canonical, multiplicity) == multiplicity
+    assert len(classes) == 1755
+    assert sum(classes.values()) == 22100
+
+def test_turn_and_river_classes_cover_every_deal():
+    rng = random.Random(6)
+    for _ in range(20):
+        cards = rng.sample(CARDS, 4)
+        flop, turn = tuple(cards[:3]), (cards[3],)
+        for street, dealt in (([flop], 3), ([flop, turn], 4)):
+            classes = dict()
+            for card in CARDS:
+                if card in flop or card in turn[:dealt - 3]:
+                    continue
+                canonical, multiplicity = canonicalize(street + [(card,)])
+                assert classes.setdefault(canonical, multiplicity) == multiplicity
+            assert sum(classes.values()) == 52 - dealt
@@ -0,0 +1,28 @@
+from statistics import NormalDist
+from evaluation import duplicate_seatings, evaluate_duplicate
+from player import CallPlayer, RaisePlayer, RandomPlayer
+
+def test_seatings_swap_the_agents_over_the_same_deals():
+    sims = duplicate_seatings(RaisePlayer, RandomPlayer, deck_seed=11, agent_seed=12, opponent_seed=13)
+    for sim in sims:
+        sim.n_games = 200
+        sim.run()
+    assert [type(player) for player in sims[0].players] == [RaisePlayer, RandomPlayer]
+    assert [type(player) for player in sims[1].players] == [RandomPlayer, RaisePlayer]
+    assert len(sims[0].sink.games) == len(sims[1].sink.games) == 200
+    for games in zip(sims[0].sink.games, sims[1].sink.games):
+        states = [game['state'] for game in games]
+        # the same cards for each seat, so the agent gets the opponent's cards and position
+        assert states[0].players_hands == states[1].players_hands
+        assert states[0].small_blind_player == states[1].small_blind_player
+        n_board = min(len(state.board) for state in states)
+        assert states[0].board[:n_board] == states[1].board[:n_board]
+
+def test_lopsided_pairing_stops_early_and_mirrored_pairing_does_not():
+    z = NormalDist().inv_cdf(1 - 0.05 / (2 * 20))
+    result = evaluate_duplicate(RaisePlayer, RandomPlayer, max_deals=2000, block=100, seed=1)
+    assert result['stopped'] == 'significant' and result['deals'] < 2000
+    assert result['ci'][0] > 0 and result['z'] == z
+    # the same deterministic agent in both seats: every deal scores 0
+    result = evaluate_duplicate(CallPlayer, CallPlayer, max_deals=500, block=100, seed=1)
+    assert result['stopped'] == 'max_deals' and result['deals'] == 500 and result['ci'] == (0.0, 0.0)
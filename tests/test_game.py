@@ -0,0 +1,74 @@
+import random
+from game import GameState
+
+FIELDS = ('current_bets', 'players_chips', 'all_pots', 'is_player_set', 'is_player_all_in', 'folded', 'n_bets_left',
+          'board', 'game_actions', 'betting_round', 'current_better', 'should_showdown', 'game_over',
+          'showdown_board', 'showdown_pot', 'pot_won')
+
+def state(game_state):
+    fields = {name: getattr(game_state, name) for name in FIELDS}
+    fields = {name: list(value) if isinstance(value, list) else value for name, value in fields.items()}
+    fields['deck'] = (list(game_state.deck.deck), game_state.deck.top)
+    fields['hands'] = [list(hand) for hand in game_state.players_hands]
+    return fields
+
+def new_game(seed, chips=(2000, 2000)):
+    return GameState(2, seed % 2, list(chips), 'FL', rng=random.Random(seed))
+
+def random_action(rng):
+    return rng.choice([('bet', None), ('call', None), ('call', None), ('fold', None)])
+
+def test_undo_restores_every_state():
+    rng = random.Random(17)
+    for seed in range(200):
+        game_state = new_game(seed, (rng.choice([100, 300, 2000]), 2000))
+        states = [state(game_state)]
+        while not game_state.game_over:
+            game_state.apply(random_action(rng))
+            states.append(state(game_state))
+        for expected in states[-2::-1]:
+            game_state.undo()
+            assert state(game_state) == expected
+
+def test_apply_plays_like_act_and_update_round():
+    rng = random.Random(18)
+    for seed in range(200):
+        actions = [random_action(rng) for _ in range(40)]
+        applied, played = new_game(seed), new_game(seed)
+        for action in actions:
+            if applied.game_over:
+                break
+            applied.apply(action)
+        for action in actions:
+            if played.game_over:
+                break
+            played.act(action)
+            while played.is_all_set() and not played.game_over:
+                played.update_round()
+        assert state(applied) == state(played)
+
+def test_snapshot_is_independent():
+    rng = random.Random(19)
+    for seed in range(50):
+        game_state = new_game(seed)
+        game_state.apply(('call', None))
+        before = state(game_state)
+        clone = game_state.snapshot()
+        clone.determinize(0, rng)
+        while not clone.game_over:
+            clone.apply(random_action(rng))
+        assert state(game_state) == before
+
+def test_determinize_keeps_what_the_player_sees():
+    rng = random.Random(20)
+    for seed in range(50):
+        game_state = new_game(seed)
+        while game_state.betting_round == 0 and not game_state.game_over:
+            game_state.apply(('call', None))
+        clone = game_state.snapshot()
+        clone.determinize(1, rng)
+        assert clone.players_hands[1] == game_state.players_hands[1]
+        assert clone.board == game_state.board
+        assert sorted(card.code for card in clone.deck.deck) == list(range(52))
+        assert clone.players_hands[0] == clone.deck.deck[0:2]
+        assert set(clone.players_hands[0]).isdisjoint(clone.players_hands[1] + clone.board)
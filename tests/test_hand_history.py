@@ -0,0 +1,53 @@
+import random
+import numpy as np
+from batch_game import BatchGames, game_actions
+from evaluation import GameResults
+from game import MatchSimulator
+from hand_history import HandHistoryWriter, iter_games, iter_blocks, summarize
+from player import RandomPlayer, CallPlayer
+
+def test_match_games_round_trip(tmp_path):
+    path = str(tmp_path / 'match.vhh')
+    results = GameResults()
+    with HandHistoryWriter(path, block_size=64) as history:
+        MatchSimulator([RandomPlayer(0, seed=1), RandomPlayer(1, seed=2)], n_games=300, initial_players_chips=[2000, 2000],
+                       variant='FL', sink=results, rng=random.Random(3), reset_chips=True, history=history).run()
+    games = list(iter_games(path))
+    assert len(games) == len(results.games) == 300
+    for game, played in zip(games, results.games):
+        state = played['state']
+        assert game['game_actions'] == state.game_actions
+        assert game['hands'] == state.players_hands
+        assert game['board'] == state.board
+        assert game['deltas'] == played['deltas']
+        assert game['small_blind_player'] == state.small_blind_player
+        assert game['current_better'] == state.current_better
+        assert game['pot'] == state.pot_won
+        assert game['showdown'] == (state.showdown_board is not None)
+
+def test_batch_games_round_trip(tmp_path):
+    path = str(tmp_path / 'batch.vhh')
+    results = BatchGames(64, [RandomPlayer, CallPlayer], (1000, 1000), seed=4).run(500)
+    with HandHistoryWriter(path, block_size=100) as history:
+        history.write_batch(results)
+    games = list(iter_games(path))
+    assert len(games) == len(results['deltas'])
+    for i, game in enumerate(games):
+        assert game['game_actions'] == game_actions(results, i)
+        assert game['deltas'] == results['deltas'][i].tolist()
+    # every block read once across shards
+    shards = [sum(len(block['game']) for block in iter_blocks(path, shard, 3)) for shard in range(3)]
+    assert sum(shards) == len(games)
+
+def test_truncated_block_is_skipped_and_cut(tmp_path):
+    path = str(tmp_path / 'crash.vhh')
+    results = BatchGames(16, [RandomPlayer, RandomPlayer], (1000, 1000), seed=5).run(100)
+    with HandHistoryWriter(path, block_size=50) as history:
+        history.write_batch(results)
+    n_games = summarize(path)['games']
+    with open(path, 'ab') as f:
+        f.write(b'BLK0' + np.array([7, 9], dtype='<u4').tobytes() + b'\0' * 20)
+    assert summarize(path)['games'] == n_games
+    with HandHistoryWriter(path, block_size=50) as history:
+        history.write_batch(results, start_game=n_games)
+    assert [game['game'] for game in iter_games(path)] == list(range(2 * n_games))
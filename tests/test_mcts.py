@@ -0,0 +1,110 @@
+import random
+from types import SimpleNamespace
+import numpy as np
+from card import CARDS, Card, Suit
+from evaluation import GameResults
+from game import GameState, MatchSimulator
+from mcts import MCTSPlayer, legal_actions, opponent_prior, search
+from player import RaisePlayer, RandomPlayer
+from tree_store import ArrayTree, OPPONENT
+
+class DealInOrder:
+    # stands in for a deck's rng: shuffle puts the given cards on top
+    def __init__(self, cards):
+        self.cards = cards
+
+    def shuffle(self, deck):
+        deck[:] = self.cards + [card for card in CARDS if card not in self.cards]
+
+def play_all(state, action=('call', 0)):
+    while not state.is_all_set():
+        state.act(action)
+
+def trained_model(n_games=200):
+    results = GameResults()
+    MatchSimulator([RaisePlayer(0), RaisePlayer(1)], n_games=n_games, initial_players_chips=[2000, 2000], variant='FL',
+                   sink=results, rng=random.Random(1), reset_chips=True).run()
+    model = ArrayTree(0)
+    for game in results.games:
+        model.add_game(game['state'])
+    return model
+
+def test_match_closes_the_worker_pool():
+    bot = MCTSPlayer(0, iterations=40, processes=2, seed=1)
+    sim = MatchSimulator([bot, RandomPlayer(1, seed=2)], n_games=3, initial_players_chips=[2000, 2000], variant='FL',
+                         rng=random.Random(3), reset_chips=True)
+    for n_games in (3, 6):
+        sim.n_games = n_games
+        sim.run()
+        assert bot.pool is None
+        assert bot.root_stats is not None
+
+def test_opponent_prior_reads_the_model():
+    model = trained_model()
+    # the opponent is the small blind and acts first, then again after we raise
+    state = GameState(2, 1, [2000, 2000], 'FL', rng=random.Random(4))
+    states = [state.snapshot()]
+    state.act(('bet', 0))
+    state.act(('bet', 0))
+    states.append(state.snapshot())
+    for state in states:
+        node = model.find(state.start_player, state.game_actions)
+        assert node >= 0 and model.node_type[node] == OPPONENT and state.current_better == 1
+        freqs = model.act_freqs[node] + 2.0
+        assert np.allclose(opponent_prior(model, state, 2.0), freqs / freqs.sum())
+        # RaisePlayer only ever bets
+        assert model.act_freqs[node][0] > 0 and model.act_freqs[node][1:].sum() == 0
+    # the subtree parallel_search ships to its workers gives the same priors below the root line
+    node = model.find(states[0].start_player, states[0].game_actions)
+    subtree = model.select(model.subtree(node))
+    assert subtree.n_nodes < model.n_nodes
+    for state in states:
+        assert np.array_equal(opponent_prior(subtree, state, 2.0), opponent_prior(model, state, 2.0))
+    assert np.allclose(opponent_prior(None, states[0], 1.0), 1 / 3)
+
+def test_search_only_tries_legal_actions():
+    state = GameState(2, 0, [2000, 2000], 'FL', rng=random.Random(5))
+    # the big blind's option: nothing to call, so no fold
+    state.act(('call', 0))
+    assert legal_actions(state) == [1, 0]
+    totals = search(state.snapshot(), 1, None, 200, 1.0, 1.0, np.random.default_rng(0))
+    assert set(totals) == {0, 1} and sum(n for n, _ in totals.values()) == 200
+    # three raises each: betting is used up, so calling or folding is all that is left
+    state = GameState(2, 0, [2000, 2000], 'FL', rng=random.Random(5))
+    for _ in range(6):
+        state.act(('bet', 0))
+    assert state.current_better == 0 and legal_actions(state) == [1, 2]
+    assert set(search(state.snapshot(), 0, None, 100, 1.0, 1.0, np.random.default_rng(0))) == {1, 2}
+
+def test_parallel_search_is_reproducible():
+    decisions = list()
+    for _ in range(2):
+        bot = MCTSPlayer(0, iterations=60, processes=2, seed=7)
+        log = list()
+        policy = bot.policy
+        def record(match_state):
+            action, value = policy(match_state)
+            log.append((action, value, dict(bot.root_stats)))
+            return action, value
+        bot.policy = record
+        MatchSimulator([bot, RandomPlayer(1, seed=2)], n_games=5, initial_players_chips=[2000, 2000], variant='FL',
+                       rng=random.Random(3), reset_chips=True).run()
+        decisions.append(log)
+    assert decisions[0] == decisions[1] and len(decisions[0]) > 5
+
+def test_raises_the_nuts_on_the_river():
+    royal = [Card(Suit.Spade, value) for value in (14, 13, 12, 11, 10)]
+    rest = [card for card in CARDS if card not in royal]
+    state = GameState(2, 0, [2000, 2000], 'FL', rng=DealInOrder(royal[:2] + rest[:2] + royal[2:] + rest[2:4]))
+    while state.betting_round < 3:
+        play_all(state)
+        state.update_round()
+    if state.current_better == 0:
+        state.act(('call', 0))
+    state.act(('bet', 0))
+    assert state.current_better == 0 and state.players_hands[0] == royal[:2]
+    bot = MCTSPlayer(0, iterations=300, seed=3)
+    (action, _), _ = bot.policy(SimpleNamespace(current_game_state=state))
+    assert action == 'bet'
+    # rewards count from the decision, so folding loses nothing more
+    assert bot.root_stats['fold'][1] == 0 < bot.root_stats['call'][1] < bot.root_stats['bet'][1]
@@ -0,0 +1,219 @@
+import random
+import numpy as np
+import pytest
+from evaluation import GameResults
+from game import MatchSimulator
+from player import VexBot, CallPlayer, RandomPlayer
+from tree_store import ArrayTree, pack_key
+
+# a game the small blind (us) folds preflop: it never reaches a flop
+FOLDED = (0, [('bet', 0), ('bet', 1), ('fold', 0)], 1)
+
+def play(bot, n_games=150, seed=3):
+    # (action, EV) of every decision bot makes against a seeded RandomPlayer
+    decisions = list()
+    policy = bot.policy
+    def record(match_state):
+        action, value = policy(match_state)
+        decisions.append((action, float(value)))
+        return action, value
+    bot.policy = record
+    MatchSimulator([bot, RandomPlayer(1, seed=2)], n_games=n_games, initial_players_chips=[20000, 20000], variant='FL',
+                   rng=random.Random(seed), reset_chips=True).run()
+    return decisions
+
+def showdown_game(seed):
+    # a game checked and called down to a showdown
+    results = GameResults()
+    MatchSimulator([CallPlayer(0), CallPlayer(1)], n_games=1, initial_players_chips=[20000, 20000], variant='FL',
+                   sink=results, rng=random.Random(seed), reset_chips=True).run()
+    return results.games[0]['state']
+
+def random_games(n_games, seed):
+    results = GameResults()
+    MatchSimulator([RandomPlayer(0, seed=seed), RandomPlayer(1, seed=seed + 1)], n_games=n_games, initial_players_chips=[20000, 20000],
+                   variant='FL', sink=results, rng=random.Random(seed), reset_chips=True).run()
+    return [game['state'] for game in results.games]
+
+def tree_pairs(bot, tree):
+    # (object node, array tree node) for every node of bot's tree
+    stack = [(bot.roots[i], tree.roots[i]) for i in range(2)]
+    while stack:
+        node, idx = stack.pop()
+        yield node, idx
+        if isinstance(node, bot.ChanceNode):
+            stack.extend((child, tree.child(idx, 3, pack_key(key))) for key, (child, _, _) in node.children_and_freqs.items())
+        elif isinstance(node, (bot.ProgramDecisionNode, bot.OpponentNode)):
+            stack.extend((child, tree.child(idx, a)) for a, child in enumerate(node.children) if child is not None)
+            if node.showdown_node is not None:
+                stack.append((node.showdown_node, tree.child(idx, 4)))
+
+def test_array_store_decides_like_object_store():
+    assert play(VexBot(0, seed=1, store='array')) == play(VexBot(0, seed=1))
+
+def test_anytime_search_with_time_to_spare_decides_like_full_search():
+    for store in ('objects', 'array'):
+        bot = VexBot(0, seed=1, store=store, time_budget=60.0)
+        assert play(bot, 100) == play(VexBot(0, seed=1, store=store), 100)
+        assert bot.search_stats['complete']
+
+def test_parallel_search_decides_like_sequential_search():
+    for options in (dict(), dict(max_nodes=3000), dict(window=200)):
+        bot = VexBot(0, seed=1, processes=2, **options)
+        bot.parallel_min_nodes = 500
+        assert play(bot, 200) == play(VexBot(0, seed=1, **options), 200)
+        assert bot.workers is None
+
+def test_decay_halves_counts_after_a_half_life():
+    bot = VexBot(0, seed=1, decay=10)
+    bot.add_branch_to_tree(showdown_game(1))
+    leaf = next(node for node in bot.iter_nodes() if isinstance(node, bot.ShowdownLeafNode))
+    hist = leaf.hist.copy()
+    assert hist.sum() == 1 and leaf.n_visited == 1
+    for _ in range(10):
+        bot.add_actions(*FOLDED)
+    # node_ev reads the leaf scaled by its decay factor, refresh stores the scaled counts
+    assert bot.decay_factor(leaf.stamp) == 0.5
+    bot.refresh(leaf)
+    assert np.array_equal(leaf.hist, hist / 2) and leaf.n_visited == 0.5
+    for _ in range(10):
+        bot.add_actions(*FOLDED)
+    bot.refresh(leaf)
+    assert np.array_equal(leaf.hist, hist / 4)
+
+def test_window_forgets_games_after_its_length():
+    bot = VexBot(0, seed=1, window=5)
+    bot.add_branch_to_tree(showdown_game(1))
+    def after_flop(node):
+        while node is not None:
+            if isinstance(node, bot.ChanceNode):
+                return True
+            node = node.parent
+        return False
+    nodes = [node for node in bot.iter_nodes() if after_flop(node)]
+    assert any(isinstance(node, bot.ShowdownLeafNode) for node in nodes)
+    for n_games in range(1, 6):
+        bot.add_actions(*FOLDED)
+        for node in nodes:
+            bot.refresh(node)
+        # the showdown is forgotten window games after it was learned
+        counts = [node.n_visited for node in nodes]
+        if n_games < 5:
+            assert counts == [1] * len(nodes)
+    assert counts == [0] * len(nodes)
+    for node in nodes:
+        if isinstance(node, bot.ChanceNode):
+            assert all(freq == 0 for _, freq, _ in node.children_and_freqs.values())
+        elif isinstance(node, bot.ShowdownLeafNode):
+            assert not node.hist.any()
+        elif not isinstance(node, bot.FoldLeafNode):
+            assert sum(node.act_freqs) == 0 and node.showdown_freq == 0
+
+def test_saved_model_holds_the_decayed_counts(tmp_path):
+    bot = VexBot(0, seed=1, decay=50)
+    play(bot, 300)
+    # counts as of the clock, computed from each node's stamps before save_model refreshes them
+    expected = dict()
+    for node in bot.iter_nodes():
+        factor = bot.decay_factor(node.stamp)
+        if isinstance(node, bot.ChanceNode):
+            counts = [freq * bot.decay_factor(node.freq_stamps.get(key, bot.clock)) for key, (_, freq, _) in node.children_and_freqs.items()]
+        elif isinstance(node, bot.ShowdownLeafNode):
+            counts = node.hist * factor
+        elif isinstance(node, bot.FoldLeafNode):
+            counts = []
+        else:
+            counts = [f * factor for f in node.act_freqs] + [node.showdown_freq * factor]
+        expected[id(node)] = (node.n_visited * factor, counts)
+    assert min(bot.decay_factor(node.stamp) for node in bot.iter_nodes()) < 0.1
+    path = str(tmp_path / 'model.vxt')
+    bot.save_model(path)
+    tree, _ = ArrayTree.load(path)
+    assert tree.n_nodes == len(expected)
+    for node, idx in tree_pairs(bot, tree):
+        n_visited, counts = expected[id(node)]
+        assert tree.n_visited[idx] == np.rint(n_visited)
+        if isinstance(node, bot.ChanceNode):
+            children = [tree.child(idx, 3, pack_key(key)) for key in node.children_and_freqs]
+            assert np.array_equal(tree.chance_freq[children], np.rint(counts))
+        elif isinstance(node, bot.ShowdownLeafNode):
+            assert np.allclose(tree.hists[tree.hist_row[idx]], counts)
+        elif not isinstance(node, bot.FoldLeafNode):
+            assert np.array_equal(list(tree.act_freqs[idx]) + [tree.showdown_freq[idx]], np.rint(counts))
+
+def test_pruning_keeps_the_tree_under_the_cap():
+    bot = VexBot(0, seed=1, max_nodes=2000)
+    sizes = list()
+    add_actions = bot.add_actions
+    def learn(*args):
+        add_actions(*args)
+        sizes.append(bot.n_nodes)
+    bot.add_actions = learn
+    play(bot, 300)
+    assert max(sizes) <= 2000 and min(sizes[200:]) < max(sizes[200:])
+    n_nodes = bot.n_nodes
+    bot.count_nodes()
+    assert bot.n_nodes == n_nodes
+
+def test_pruned_showdowns_go_to_the_parent():
+    bot = VexBot(0, seed=1)
+    state = showdown_game(1)
+    bot.add_branch_to_tree(state)
+    for _ in range(3):
+        bot.add_actions(state.start_player, state.game_actions[:2] + [('fold', state.start_player)], 1 - state.start_player)
+    leaf = next(node for node in bot.iter_nodes() if isinstance(node, bot.ShowdownLeafNode))
+    hist = leaf.hist.copy()
+    bucket = int(np.argmax(hist))
+    # the line seen once goes whole: from below the shared blinds down to the leaf
+    top = leaf
+    while top.parent.n_visited == 1:
+        top = top.parent
+    parent = top.parent
+    bot.ev_context = (bucket, 100, 20, 0)
+    before = bot.unexplored_ev(parent, top.parent_action)
+    n_nodes = bot.n_nodes
+    bot.max_nodes = n_nodes - 1
+    bot.prune()
+    assert parent.children[top.parent_action] is None and top.parent_action != 2
+    assert np.array_equal(parent.pruned_hist, hist)
+    bot.count_nodes()
+    assert bot.n_nodes < n_nodes
+    coarse = bot.coarse_abstraction[min(bot.get_coarse_statistics(parent), len(bot.coarse_abstraction) - 1)]
+    after = bot.unexplored_ev(parent, top.parent_action)
+    assert after != before
+    assert after == bot.get_ev_from_hist(hist + bot.showdown_prior_weight * coarse / np.sum(coarse))
+
+def test_chance_node_ev_after_pruning_deals_matches_a_fresh_one():
+    bot = VexBot(0, seed=1, max_nodes=1000)
+    play(bot, 200)
+    games = random_games(400, 5)
+    bot.ev_context = (5, 120, 40, 0)
+    # fill the EV caches, then learn until a prune removes deals from chance nodes
+    for root in bot.roots:
+        bot.dfs(root)
+    pruned = list()
+    for game in games:
+        explored = {id(node): node.n_explored for node in bot.iter_nodes() if isinstance(node, bot.ChanceNode)}
+        bot.add_branch_to_tree(game)
+        pruned = [node for node in bot.iter_nodes() if isinstance(node, bot.ChanceNode) and node.n_explored < explored.get(id(node), 0)]
+        if pruned:
+            break
+    assert pruned
+    evs = [bot.dfs(node) for node in pruned]
+    for node in pruned:
+        assert node.n_explored == sum(multiplicity for _, _, multiplicity in node.children_and_freqs.values())
+    for node in bot.iter_nodes():
+        node.ev_cache.clear()
+    assert [bot.dfs(node) for node in pruned] == evs
+
+def test_pruned_histograms_survive_merge_and_warn_on_save(tmp_path):
+    bot = VexBot(0, seed=1, max_nodes=1000)
+    play(bot, 200)
+    pruned = bot.pruned_hists()
+    assert pruned
+    other = VexBot(0, seed=5)
+    play(other, 50, seed=9)
+    bot.merge_tree(ArrayTree.from_vexbot(other))
+    assert [(path, hist.tolist()) for path, hist in bot.pruned_hists()] == [(path, hist.tolist()) for path, hist in pruned]
+    with pytest.warns(UserWarning, match='pruned'):
+        bot.save_model(str(tmp_path / 'model.vxt'))
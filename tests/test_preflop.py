@@ -0,0 +1,25 @@
+from collections import Counter
+from itertools import combinations
+from card import CARDS
+from preflop import (SAMPLES, _NAME_TO_INDEX, _monte_carlo_equity, load_table, starting_hand_cards, starting_hand_combos,
+                     starting_hand_index, starting_hand_name)
+
+def test_starting_hands_cover_every_combo():
+    classes = Counter(starting_hand_index(card_1, card_2) for card_1, card_2 in combinations(CARDS, 2))
+    assert len(classes) == 169
+    assert all(classes[index] == starting_hand_combos(index) for index in range(169))
+    assert sum(classes.values()) == 1326
+    for index in range(169):
+        assert starting_hand_index(*starting_hand_cards(index)) == index
+        assert _NAME_TO_INDEX[starting_hand_name(index)] == index
+
+def test_table_orders_obvious_hands():
+    table = load_table()
+    pairs = [table[_NAME_TO_INDEX[rank * 2], 0] for rank in 'AKQJT98765432']
+    assert pairs == sorted(pairs, reverse=True)
+    assert table[_NAME_TO_INDEX['AKs'], 0] > table[_NAME_TO_INDEX['AKo'], 0] > table[_NAME_TO_INDEX['72o'], 0]
+    assert table[_NAME_TO_INDEX['AA'], 1] > 0.99 and table[_NAME_TO_INDEX['32o'], 1] < 0.01
+
+def test_defaults_reproduce_the_shipped_table():
+    index = _NAME_TO_INDEX['T9s']
+    assert round(_monte_carlo_equity((index, SAMPLES, 0))[1], 5) == load_table()[index, 0]
@@ -0,0 +1,60 @@
+import random
+import pytest
+from evaluation import GameResults
+from game import MatchSimulator
+from player import VexBot, RandomPlayer
+from profiling import HOOKS, Profiler
+
+class Toy:
+    def walk(self, depth):
+        return 0 if depth == 0 else 1 + self.walk(depth - 1)
+
+    def ping(self, hit):
+        return hit
+
+def ping_probe(toy, hit):
+    return 'toy.ping_hit' if hit else 'toy.ping_miss'
+
+def hooked_methods(hooks):
+    return [owner.__dict__[name] for owner, name, _, _ in hooks]
+
+def test_installed_restores_every_hook_after_an_exception():
+    originals = hooked_methods(HOOKS)
+    profiler = Profiler()
+    with pytest.raises(RuntimeError):
+        with profiler.installed():
+            assert all(hooked is not original for hooked, original in zip(hooked_methods(HOOKS), originals))
+            raise RuntimeError()
+    assert hooked_methods(HOOKS) == originals
+    # a hook that cannot be installed leaves the ones before it uninstalled too
+    with pytest.raises(KeyError):
+        with Profiler(hooks=HOOKS + [(Toy, 'missing', 'toy.missing', None)]).installed():
+            pass
+    assert hooked_methods(HOOKS) == originals
+
+def test_counts_match_the_calls_made():
+    profiler = Profiler(trace_every=1, hooks=[(Toy, 'walk', 'toy.walk', None), (Toy, 'ping', None, ping_probe)])
+    toy = Toy()
+    with profiler.installed():
+        assert toy.walk(4) == 4
+        for hit in (True, True, False):
+            toy.ping(hit)
+    toy.walk(3)
+    summary = profiler.summary()
+    # a depth 4 walk is 5 calls, of which only the outermost counts towards inclusive time
+    assert summary['phases']['toy.walk']['calls'] == 5 == len(profiler.trace)
+    assert summary['phases']['toy.walk']['inclusive_s'] <= profiler.wall_time
+    assert summary['counters'] == {'toy.ping_hit': 2, 'toy.ping_miss': 1}
+    assert summary['hit_rates'] == {'toy.ping': 2 / 3}
+
+def test_match_profile_counts_actions_and_nodes():
+    bot = VexBot(0, seed=1)
+    results = GameResults()
+    sim = MatchSimulator([bot, RandomPlayer(1, seed=2)], n_games=50, initial_players_chips=[20000, 20000], variant='FL',
+                         rng=random.Random(3), reset_chips=True, profiler=Profiler(), sink=results)
+    sim.run()
+    actions = [action for game in results.games for action, _ in game['state'].game_actions if action in ('bet', 'call', 'fold')]
+    assert sim.profile['phases']['game.act']['calls'] == len(actions)
+    # the two roots are made with the bot, before the profiler is installed
+    assert sim.profile['counters']['vexbot.nodes_created'] == bot.n_nodes - 2
+    assert sim.profile['counters']['vexbot.player_0.tree_nodes'] == bot.n_nodes
@@ -0,0 +1,12 @@
+from player import VexBot, RandomPlayer, CallPlayer
+from tournament import run_tournament
+
+def test_results_do_not_depend_on_the_process_count():
+    pairings = [((VexBot, dict(equity_samples=500)), RandomPlayer), (CallPlayer, RandomPlayer)]
+    runs = [run_tournament(pairings, 4, n_games=25, seed=7, processes=processes) for processes in (1, 3)]
+    assert runs[0] == runs[1]
+    summary, results = runs[0]
+    assert [result['match_id'] for result in results] == list(range(8))
+    assert [row['matches'] for row in summary] == [4, 4]
+    # odd matches swap seats
+    assert [result['names'][0] for result in results[:2]] == ['VexBot(equity_samples=500)', 'RandomPlayer']
@@ -0,0 +1,32 @@
+import numpy as np
+from batch_game import BatchGames
+from hand_history import HandHistoryWriter
+from player import VexBot, RandomPlayer, RaisePlayer
+from test_tree_store import path_stats
+from tree_store import ArrayTree
+from training import train, pretrain
+
+def write_log(path, n_games=3000, seed=7):
+    results = BatchGames(256, [RandomPlayer, RaisePlayer], (2000, 2000), seed=seed).run(n_games)
+    with HandHistoryWriter(path, block_size=200) as history:
+        history.write_batch(results)
+    return len(results['deltas'])
+
+def test_training_is_the_same_for_any_number_of_processes(tmp_path):
+    path = str(tmp_path / 'games.vhh')
+    n_games = write_log(path)
+    tree, n_trained = train([path], 0, processes=1, equity_samples=200)
+    assert n_trained == n_games
+    for processes in (2, 3):
+        sharded, n_trained = train([path], 0, processes=processes, equity_samples=200)
+        assert n_trained == n_games
+        assert path_stats(sharded) == path_stats(tree)
+
+def test_pretrain_gives_both_stores_the_same_tree(tmp_path):
+    path = str(tmp_path / 'games.vhh')
+    n_games = write_log(path, 1000)
+    bots = [VexBot(0, seed=1, equity_samples=200, store=store) for store in ('array', 'objects')]
+    for bot in bots:
+        pretrain(bot, [path], processes=2)
+    assert path_stats(ArrayTree.from_vexbot(bots[1])) == path_stats(bots[0].tree)
+    assert int(bots[0].tree.n_visited[bots[0].tree.roots].sum()) == n_games
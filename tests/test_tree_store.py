@@ -0,0 +1,131 @@
+import random
+import numpy as np
+from game import MatchSimulator
+from player import VexBot, RandomPlayer
+import pytest
+from tree_store import ArrayTree, SHOWDOWN, encode_game, read_header, read_journal
+
+def path_stats(tree):
+    # {path from the root: counts} of every node with visits, independent of node ids
+    paths = dict()
+    stats = dict()
+    for idx in range(tree.n_nodes):
+        parent = int(tree.parent[idx])
+        if parent < 0:
+            paths[idx] = (tree.roots.index(idx),)
+        else:
+            step = (int(tree.parent_action[idx]), int(tree.chance_key[idx]) if tree.parent_action[idx] == 3 else 0)
+            paths[idx] = paths[parent] + (step,)
+        if tree.n_visited[idx] == 0:
+            continue
+        hist = tuple(tree.hists[tree.hist_row[idx]]) if tree.node_type[idx] == SHOWDOWN else None
+        stats[paths[idx]] = (int(tree.node_type[idx]), int(tree.n_visited[idx]), tuple(tree.act_freqs[idx]), int(tree.showdown_freq[idx]),
+                             int(tree.chance_freq[idx]), int(tree.multiplicity[idx]), hist)
+    return stats
+
+def play(bot, n_games, seed=3):
+    MatchSimulator([bot, RandomPlayer(1, seed=2)], n_games=n_games, initial_players_chips=[20000, 20000], variant='FL',
+                   rng=random.Random(seed), reset_chips=True).run()
+    return bot
+
+def learned_tree(n_games=300):
+    bot = play(VexBot(0, seed=1, store='array'), n_games)
+    return bot.tree, bot.coarse_abstraction
+
+def test_subtree_backup_matches_full_backup():
+    tree, coarse_abstraction = learned_tree()
+    full = tree.backup(5, 120, 40, coarse_abstraction, 2.0)
+    rng = np.random.default_rng(0)
+    for node in list(tree.roots) + rng.integers(0, tree.n_nodes, 50).tolist():
+        evs = tree.backup(5, 120, 40, coarse_abstraction, 2.0, node)
+        below = tree.subtree(node) & (tree.depth[:tree.n_nodes] >= tree.depth[node])
+        assert np.array_equal(evs[below], full[below])
+
+def test_read_only_model_is_not_written(tmp_path):
+    path = str(tmp_path / 'model.vxt')
+    play(VexBot(0, seed=1, store='array'), 100).save_model(path)
+    with open(path, 'rb') as f:
+        saved = f.read()
+    for store in ('array', 'objects'):
+        bot = VexBot(0, seed=1, store=store)
+        bot.load_model(path, mode='r')
+        play(bot, 50, seed=4)
+    with open(path, 'rb') as f:
+        assert f.read() == saved
+    tree, _ = ArrayTree.load(path, mode='r')
+    assert tree.read_only and tree.n_nodes > 2
+
+def test_journal_replays_learned_games(tmp_path):
+    path = str(tmp_path / 'model.vxt')
+    play(VexBot(0, seed=1, store='array'), 100).save_model(path)
+    bot = VexBot(0, seed=1, store='array')
+    bot.load_model(path, journal=True)
+    play(bot, 50, seed=4)
+    tree, _ = ArrayTree.load(path)
+    assert tree.n_nodes == bot.tree.n_nodes
+    for name in ('n_visited', 'act_freqs', 'chance_freq', 'showdown_freq'):
+        assert np.array_equal(getattr(tree, name)[:tree.n_nodes], getattr(bot.tree, name)[:tree.n_nodes])
+
+def test_truncated_journal_game_is_skipped_and_cut(tmp_path):
+    path = str(tmp_path / 'model.vxt')
+    play(VexBot(0, seed=1, store='array'), 100).save_model(path)
+    bot = VexBot(0, seed=1, store='array')
+    bot.load_model(path, journal=True)
+    play(bot, 20, seed=4)
+    journal_offset = read_header(path)['journal_offset']
+    games, end = read_journal(path, journal_offset)
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert len(games) > 1 and end == len(data)
+    last = end - len(encode_game(*games[-1]))
+    with open(path, 'wb') as f:
+        f.write(data[:last])
+    expected = path_stats(ArrayTree.load(path)[0])
+    # cut inside the header, inside an action's argument and at action boundaries alike
+    for cut in range(last + 1, len(data)):
+        with open(path, 'wb') as f:
+            f.write(data[:cut])
+        assert read_journal(path, journal_offset) == (games[:-1], last)
+        assert path_stats(ArrayTree.load(path)[0]) == expected
+    bot = VexBot(0, seed=1, store='array')
+    bot.load_model(path, journal=True)
+    play(bot, 10, seed=5)
+    learned, end = read_journal(path, journal_offset)
+    with open(path, 'rb') as f:
+        assert learned[:len(games) - 1] == games[:-1] and len(learned) >= len(games) and end == len(f.read())
+    assert path_stats(ArrayTree.load(path)[0]) == path_stats(bot.tree)
+
+def test_read_only_load_needs_the_journal_folded_in(tmp_path):
+    path = str(tmp_path / 'model.vxt')
+    play(VexBot(0, seed=1, store='array'), 100).save_model(path)
+    bot = VexBot(0, seed=1, store='array')
+    bot.load_model(path, journal=True)
+    play(bot, 20, seed=4)
+    with pytest.raises(ValueError):
+        ArrayTree.load(path, mode='r')
+    bot.save_model(path)
+    tree, _ = ArrayTree.load(path, mode='r')
+    assert isinstance(tree.n_visited.base, np.memmap)
+    assert path_stats(tree) == path_stats(bot.tree)
+
+def test_split_shards_merge_back_to_the_tree():
+    tree, _ = learned_tree()
+    stats = path_stats(tree)
+    shards = tree.split(3)
+    for order in (shards, shards[::-1]):
+        merged = ArrayTree(0)
+        for shard in order:
+            merged.merge(shard)
+        assert path_stats(merged) == stats
+
+def test_merge_is_the_same_for_both_stores_and_either_order():
+    other = play(VexBot(0, seed=5, store='array'), 150, seed=6).tree
+    merged = dict()
+    for store in ('array', 'objects'):
+        bot = play(VexBot(0, seed=1, store=store), 150)
+        bot.merge_tree(other)
+        merged[store] = path_stats(bot.tree if store == 'array' else ArrayTree.from_vexbot(bot))
+    assert merged['array'] == merged['objects']
+    swapped = play(VexBot(0, seed=5, store='array'), 150, seed=6).tree
+    swapped.merge(play(VexBot(0, seed=1, store='array'), 150).tree)
+    assert path_stats(swapped) == merged['array']
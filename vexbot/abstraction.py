@@ -0,0 +1,92 @@
+import pickle
+import time
+from collections import OrderedDict
+import numpy as np
+from card import canonicalize
+from equity import estimate_equity, expected_hs2
+from preflop import load_table, starting_hand_index
+
+# Card abstraction
+#
+# Hands are grouped into n_buckets equal-width buckets of a strength metric in
+# [0, 1], per street:
+#   'hs'   - equity against a random hand (exact on the river)
+#   'ehs2' - E[HS^2], the mean squared river equity over runouts of the board
+# Strengths are stored in one table per street keyed by the suit-isomorphism
+# class of (hole, board). The preflop table for 'hs' is filled from
+# preflop_equity.csv; the others fill up as hands are seen and can be saved and
+# reloaded with save_tables/load_tables. There are millions of flop, turn and
+# river classes, far too many to ship, so each of those tables keeps the
+# table_size classes used most recently and a class evicted from it is rated
+# again when it comes back.
+# strength() can be given a deadline, which cuts the Monte Carlo estimate short;
+# an estimate that ran into its deadline is returned but not stored.
+
+STREETS = {0: 'preflop', 3: 'flop', 4: 'turn', 5: 'river'}
+
+class HandAbstraction:
+    def __init__(self, n_buckets=10, metric='hs', n_samples=2000, tolerance=0.02, n_rollouts=32, rng=None, table_size=100000):
+        if metric not in ('hs', 'ehs2'):
+            raise ValueError(f"Unknown hand strength metric: {metric}")
+        self.n_buckets = n_buckets
+        self.metric = metric
+        self.n_samples = n_samples
+        self.tolerance = tolerance
+        self.n_rollouts = n_rollouts
+        self.rng = np.random.default_rng() if rng is None else rng
+        # street -> {canonical (hole, board) class -> strength}, least recently used first
+        self.table_size = table_size
+        self.tables = {street: OrderedDict() for street in STREETS.values()}
+        if metric == 'hs':
+            self.preflop_strengths = load_table()[:, 0]
+        else:
+            self.preflop_strengths = None
+
+    def key(self, hole, board):
+        canonical, _ = canonicalize([hole, board] if board else [hole])
+        return tuple(tuple(card.code for card in group) for group in canonical)
+
+    def strength(self, hole, board, deadline=None):
+        if self.preflop_strengths is not None and len(board) == 0:
+            return self.preflop_strengths[starting_hand_index(hole[0], hole[1])]
+        table = self.tables[STREETS[len(board)]]
+        key = self.key(hole, board)
+        if key in table:
+            table.move_to_end(key)
+            return table[key]
+        if self.metric == 'hs':
+            strength = estimate_equity(hole, board, max_samples=self.n_samples, tolerance=self.tolerance, rng=self.rng, deadline=deadline)[0]
+        else:
+            strength = expected_hs2(hole, board, n_rollouts=self.n_rollouts, rng=self.rng, deadline=deadline)
+        if deadline is not None and time.perf_counter() > deadline:
+            return strength
+        table[key] = strength
+        self.trim(table)
+        return strength
+
+    def trim(self, table):
+        while len(table) > self.table_size:
+            table.popitem(last=False)
+
+    def bucket_of(self, strength):
+        return min((int)(strength * self.n_buckets), self.n_buckets - 1)
+
+    def bucket(self, hole, board):
+        return self.bucket_of(self.strength(hole, board))
+
+    def record_showdown(self, hist, hole, board):
+        # add a hand revealed at showdown to a leaf histogram
+        hist[self.bucket(hole, board)] += 1
+
+    def save_tables(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump({'metric': self.metric, 'tables': self.tables}, f)
+
+    def load_tables(self, path):
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if saved['metric'] != self.metric:
+            raise ValueError(f"Tables were built for metric {saved['metric']}, not {self.metric}")
+        for street, table in saved['tables'].items():
+            self.tables[street].update(table)
+            self.trim(self.tables[street])
@@ -0,0 +1,276 @@
+import argparse
+import time
+import numpy as np
+from card import CARDS, evaluate_batch
+from player import RandomPlayer, RaisePlayer, CallPlayer
+
+# Batched heads-up games
+#
+# BatchGames plays n independent fixed-limit heads-up games in lockstep, with
+# every per-game field of GameState held as a NumPy array over the games. Each
+# step() makes one action in every game at once; all games whose betting round
+# ends are settled together, and every showdown of the step goes through one
+# evaluate_batch call. A finished game is recorded and its slot immediately
+# starts a new deal (stacks reset, blinds alternating), so all slots stay busy.
+#
+# The rules are GameState's for variant 'FL' step for step: blinds, three bets
+# per player per round, bet sizes doubling on the turn and river, all-ins and
+# the same pot collection and payout. Agents are tables of action
+# probabilities, which covers the baseline players: POLICY_TABLES maps their
+# classes to their tables, or a (bet, call, fold) triple can be given directly.
+#
+# Results hold the cards, the actions (codes as in VexBot: 0 bet, 1 call,
+# 2 fold), who made them and in which round, the starting stacks, the chips won
+# per seat and the final pot; game_actions() turns one game back into
+# GameState.game_actions form.
+
+# (bet, call, fold) probabilities
+POLICY_TABLES = {
+    CallPlayer: (0.0, 1.0, 0.0),
+    RaisePlayer: (1.0, 0.0, 0.0),
+    RandomPlayer: (0.4, 0.4, 0.2),
+}
+ACTION_NAMES = ['bet', 'call', 'fold']
+STREETS = [(1, 'flop', 3), (2, 'turn', 1), (3, 'river', 1)]
+
+class BatchGames:
+    def __init__(self, n_games, policies, chips=(2000, 2000), small_blind=20, big_blind=40, n_bets=3, seed=None, max_actions=64):
+        self.n = n_games
+        self.tables = np.array([POLICY_TABLES[policy] if policy in POLICY_TABLES else policy for policy in policies], dtype=np.float64)
+        self.cum_tables = np.cumsum(self.tables, axis=1)
+        self.start_chips = np.array(chips, dtype=np.int64)
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+        self.n_bets = n_bets
+        self.max_actions = max_actions
+        self.rng = np.random.default_rng(seed)
+        self.idx = np.arange(n_games)
+
+        n = n_games
+        self.decks = np.zeros((n, 52), dtype=np.int32)
+        self.chips = np.zeros((n, 2), dtype=np.int64)
+        self.bets = np.zeros((n, 2), dtype=np.int64)
+        self.pot = np.zeros(n, dtype=np.int64)
+        # pot of each slot's last finished game
+        self.final_pot = np.zeros(n, dtype=np.int64)
+        self.is_set = np.zeros((n, 2), dtype=bool)
+        self.all_in = np.zeros((n, 2), dtype=bool)
+        self.folded = np.zeros((n, 2), dtype=bool)
+        self.bets_left = np.zeros((n, 2), dtype=np.int64)
+        self.current = np.zeros(n, dtype=np.int64)
+        self.round = np.zeros(n, dtype=np.int64)
+        # small blind of the next deal in each slot
+        self.next_small_blind = np.zeros(n, dtype=np.int64)
+        self.small_blind_player = np.zeros(n, dtype=np.int64)
+        self.n_actions = np.zeros(n, dtype=np.int64)
+        self.actions = np.full((n, max_actions), -1, dtype=np.int8)
+        self.actors = np.full((n, max_actions), -1, dtype=np.int8)
+        self.rounds = np.full((n, max_actions), -1, dtype=np.int8)
+
+        self.results = list()
+        self.n_finished = 0
+        self.new_games(self.idx)
+
+    def new_games(self, games):
+        # shuffle, reset stacks and post the blinds in the given slots
+        n = len(games)
+        self.decks[games] = np.argsort(self.rng.random((n, 52)), axis=1)
+        self.chips[games] = self.start_chips
+        self.pot[games] = 0
+        self.is_set[games] = False
+        self.all_in[games] = False
+        self.folded[games] = False
+        self.bets_left[games] = self.n_bets
+        self.round[games] = 0
+        self.n_actions[games] = 0
+        self.actions[games] = -1
+        self.actors[games] = -1
+        self.rounds[games] = -1
+        small = self.next_small_blind[games]
+        big = 1 - small
+        self.small_blind_player[games] = small
+        self.next_small_blind[games] = big
+        self.bets[games] = 0
+        for player, amount in ((small, self.small_blind), (big, self.small_blind + self.small_blind)):
+            chips = self.chips[games, player]
+            self.bets[games, player] = np.minimum(amount, chips)
+            self.all_in[games, player] = amount >= chips
+        # heads-up: the small blind acts first preflop
+        self.current[games] = small
+
+    def hands(self, games=None):
+        games = self.idx if games is None else games
+        # dealt as GameState does: two cards to player 0, two to player 1, then the board
+        return self.decks[games, :4].reshape(-1, 2, 2)
+
+    def boards(self, games=None):
+        games = self.idx if games is None else games
+        return self.decks[games, 4:9]
+
+    def step(self):
+        idx = self.idx
+        cur = self.current
+        opp = 1 - cur
+        prev_bet = self.bets[idx, opp]
+        chips = self.chips[idx, cur]
+
+        # sample each game's action from the acting seat's table
+        action = (self.rng.random(self.n)[:, None] >= self.cum_tables[cur]).sum(axis=1)
+        action = np.minimum(action, 2)
+        # a bet with no bets left, or facing a bet we cannot cover, is a call
+        action[(action == 0) & ((prev_bet >= chips) | (self.bets_left[idx, cur] == 0))] = 1
+
+        bet = action == 0
+        desired = prev_bet + self.big_blind + self.big_blind * (self.round >= 2)
+        amount = np.where(bet, desired, prev_bet)
+        new_bet = np.minimum(amount, chips)
+        betting = action < 2
+        self.all_in[idx[betting], cur[betting]] |= amount[betting] >= chips[betting]
+        self.bets[idx[betting], cur[betting]] = new_bet[betting]
+        self.bets_left[idx[bet], cur[bet]] -= 1
+        raised = bet & (new_bet > prev_bet)
+        self.is_set[raised] = False
+        fold = action == 2
+        self.folded[idx[fold], cur[fold]] = True
+        self.is_set[idx, cur] = True
+
+        slot = np.minimum(self.n_actions, self.max_actions - 1)
+        self.actions[idx, slot] = action
+        self.actors[idx, slot] = cur
+        self.rounds[idx, slot] = self.round
+        self.n_actions += 1
+
+        # the other player acts next unless they folded or are all-in
+        other_out = self.folded[idx, opp] | self.all_in[idx, opp]
+        self.current = np.where(other_out, cur, opp)
+
+        any_folded = self.folded.any(axis=1)
+        all_set = any_folded | (self.is_set | self.all_in).all(axis=1)
+        showdown = all_set & ~any_folded & (((~self.all_in).sum(axis=1) < 2) | (self.round == 3))
+        if all_set.any():
+            self.end_rounds(np.flatnonzero(all_set), showdown[all_set], any_folded[all_set])
+
+    def end_rounds(self, games, showdown, folded):
+        # GameState.update_round for every game whose betting round is over
+        finished = list()
+        fold_games = games[folded]
+        if len(fold_games):
+            self.pot[fold_games] += self.bets[fold_games].sum(axis=1)
+            self.chips[fold_games] -= self.bets[fold_games]
+            self.bets[fold_games] = 0
+            winner = np.argmin(self.folded[fold_games], axis=1)
+            self.chips[fold_games, winner] += self.pot[fold_games]
+            self.final_pot[fold_games] = self.pot[fold_games]
+            self.pot[fold_games] = 0
+            finished.append(fold_games)
+
+        rest = games[~folded]
+        if len(rest):
+            bets = self.bets[rest]
+            # bets are matched down to the smallest bet above 0
+            min_bet = np.where(bets > 0, bets, np.iinfo(np.int64).max).min(axis=1)
+            bets = np.minimum(bets, min_bet[:, None])
+            self.pot[rest] += bets.sum(axis=1)
+            self.chips[rest] -= bets
+            self.bets[rest] = 0
+
+            showdown_games = rest[showdown[~folded]]
+            if len(showdown_games):
+                boards = self.boards(showdown_games)
+                hands = self.hands(showdown_games)
+                strengths = np.stack([evaluate_batch(np.concatenate([hands[:, player], boards], axis=1)) for player in range(2)], axis=1)
+                winners = strengths == strengths.max(axis=1, keepdims=True)
+                prize = self.pot[showdown_games] // winners.sum(axis=1)
+                self.chips[showdown_games] += winners * prize[:, None]
+                self.final_pot[showdown_games] = self.pot[showdown_games]
+                self.pot[showdown_games] = 0
+                finished.append(showdown_games)
+
+            next_round = rest[~showdown[~folded]]
+            self.is_set[next_round] = False
+            self.all_in[next_round] = False
+            self.folded[next_round] = False
+            self.bets_left[next_round] = self.n_bets
+            self.round[next_round] += 1
+
+        if finished:
+            finished = np.concatenate(finished)
+            self.record(finished)
+            self.new_games(finished)
+
+    def record(self, games):
+        self.results.append({
+            'hands': self.hands(games).copy(),
+            'boards': self.boards(games).copy(),
+            'small_blind_player': self.small_blind_player[games].copy(),
+            'n_actions': self.n_actions[games].copy(),
+            'actions': self.actions[games].copy(),
+            'actors': self.actors[games].copy(),
+            'rounds': self.rounds[games].copy(),
+            'last_round': self.round[games].copy(),
+            'showdown': ~self.folded[games].any(axis=1),
+            'chips': np.tile(self.start_chips, (len(games), 1)),
+            'deltas': self.chips[games] - self.start_chips,
+            'pots': self.final_pot[games].copy(),
+            # still the finished games' current players: new deals start after record()
+            'current_better': self.current[games].copy(),
+        })
+        self.n_finished += len(games)
+
+    def run(self, n_finished):
+        # step until at least n_finished games are done; returns them as one dict of arrays
+        while self.n_finished < n_finished:
+            self.step()
+        return self.collect()
+
+    def collect(self):
+        results = {key: np.concatenate([batch[key] for batch in self.results]) for key in self.results[0]}
+        self.results = list()
+        self.n_finished = 0
+        if (results['n_actions'] > self.max_actions).any():
+            raise ValueError("A game had more actions than max_actions; raise it")
+        return results
+
+def game_actions(results, i):
+    # game i of a results dict as GameState.game_actions (blinds and deals included)
+    small = int(results['small_blind_player'][i])
+    board = [CARDS[code] for code in results['boards'][i]]
+    sequence = [('bet', small), ('bet', 1 - small)]
+    round_ = 0
+    for k in range(results['n_actions'][i]):
+        while results['rounds'][i, k] > round_:
+            round_ += 1
+            sequence.append(deal_action(round_, board))
+        sequence.append((ACTION_NAMES[results['actions'][i, k]], int(results['actors'][i, k])))
+    if results['showdown'][i]:
+        # cards dealt after an all-in are not logged by GameState either
+        sequence.append(('showdown', None))
+    return sequence
+
+def deal_action(round_, board):
+    for street_round, name, n_cards in STREETS:
+        if street_round == round_:
+            end = {1: 3, 2: 4, 3: 5}[round_]
+            return (name, tuple(board[end - n_cards:end]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched self-play between table-driven agents')
+    parser.add_argument('--players', nargs=2, default=['RandomPlayer', 'CallPlayer'])
+    parser.add_argument('--slots', type=int, default=4096, help='games played in lockstep')
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--chips', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history', default=None, help='append the games to this binary hand history')
+    args = parser.parse_args()
+    classes = {cls.__name__: cls for cls in POLICY_TABLES}
+    batch = BatchGames(args.slots, [classes[name] for name in args.players], (args.chips, args.chips), seed=args.seed)
+    start = time.perf_counter()
+    results = batch.run(args.games)
+    elapsed = time.perf_counter() - start
+    deltas = results['deltas']
+    print(f"{len(deltas)} games in {elapsed:.2f}s ({len(deltas) / elapsed:.0f} games/sec); "
+          f"seat 0 {deltas[:, 0].mean():+.2f} chips/game, showdowns {results['showdown'].mean():.1%}")
+    if args.history is not None:
+        from hand_history import HandHistoryWriter
+        with HandHistoryWriter(args.history) as history:
+            history.write_batch(results)
@@ -0,0 +1,184 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import numpy as np
+from card import Deck, evaluate, evaluate_batch
+from game import GameState, MatchSimulator
+from player import RandomPlayer, RaisePlayer, CallPlayer, VexBot
+from tree_store import ArrayTree
+
+# Benchmark suite
+#
+# Fixed seeds and fixed workloads, so two runs on the same machine measure the
+# same work:
+#   evaluator - hands/sec through GameState.determine_winners, evaluate() and
+#               evaluate_batch()
+#   engine    - games/sec through MatchSimulator for each baseline agent in
+#               self-play (stacks reset every game, so every run plays the same
+#               number of games)
+#   vexbot    - VexBot.policy latency percentiles at growing tree sizes, the
+#               tree learned against RandomPlayer
+# Results are printed or written as JSON; --compare reports the change against
+# an earlier result file and flags regressions beyond --threshold.
+
+BASELINE_AGENTS = [RandomPlayer, RaisePlayer, CallPlayer]
+
+def timed(fn, repeat):
+    # best of repeat runs, in seconds
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def random_deals(n, seed):
+    # n (board, [hand 0, hand 1]) deals from seeded shuffles
+    deck = Deck(random.Random(seed))
+    deals = list()
+    for _ in range(n):
+        deck.shuffle()
+        hands = [deck.deal(2), deck.deal(2)]
+        deals.append((deck.deal(5), hands))
+    return deals
+
+def bench_evaluator(n_hands=20000, seed=0, repeat=3):
+    deals = random_deals(n_hands, seed)
+    game_state = GameState(2, 0, [2000, 2000], 'FL', rng=random.Random(seed))
+
+    def showdowns():
+        for board, hands in deals:
+            game_state.board = board
+            game_state.players_hands = hands
+            game_state.determine_winners([0, 1])
+    seven_card_hands = [board + hands[0] for board, hands in deals]
+    def scalar():
+        for cards in seven_card_hands:
+            evaluate(cards)
+    codes = np.array([[card.code for card in cards] for cards in seven_card_hands], dtype=np.int32)
+    def batch():
+        evaluate_batch(codes)
+
+    # determine_winners evaluates both players
+    return {
+        'determine_winners_hands_per_sec': 2 * n_hands / timed(showdowns, repeat),
+        'evaluate_hands_per_sec': n_hands / timed(scalar, repeat),
+        'evaluate_batch_hands_per_sec': n_hands / timed(batch, repeat),
+    }
+
+def bench_engine(n_games=2000, seed=0, repeat=3):
+    results = dict()
+    for agent in BASELINE_AGENTS:
+        def match():
+            players = [agent(0, seed=seed), agent(1, seed=seed + 1)]
+            MatchSimulator(players, n_games=n_games, initial_players_chips=[20000, 20000], variant='FL',
+                           rng=random.Random(seed), reset_chips=True).run()
+        results[agent.__name__ + '_games_per_sec'] = n_games / timed(match, repeat)
+    return results
+
+def tree_size(bot):
+    if bot.store == 'array':
+        return bot.tree.n_nodes
+    return ArrayTree.from_vexbot(bot).n_nodes
+
+def bench_vexbot(checkpoints=(0, 100, 400, 1600), n_measure=100, seed=0, store='objects', time_budget=None, processes=1):
+    # Train one bot up to each checkpoint (in games), then time every policy call of the next n_measure games.
+    # Timed games keep training the bot, as in a real match.
+    bot = VexBot(0, seed=seed, store=store, time_budget=time_budget, processes=processes)
+    sim = MatchSimulator([bot, RandomPlayer(1, seed=seed + 1)], n_games=0, initial_players_chips=[20000, 20000],
+                         variant='FL', rng=random.Random(seed), reset_chips=True)
+    latencies = list()
+    policy = bot.policy
+    def timed_policy(match_state):
+        start = time.perf_counter()
+        decision = policy(match_state)
+        latencies.append(time.perf_counter() - start)
+        return decision
+
+    results = list()
+    for checkpoint in checkpoints:
+        bot.policy = policy
+        sim.n_games = max(checkpoint, sim.current_game + 1)
+        sim.run()
+        n_nodes = tree_size(bot)
+        games_trained = sim.current_game + 1
+        latencies.clear()
+        bot.policy = timed_policy
+        sim.n_games += n_measure
+        sim.run()
+        ms = np.array(latencies) * 1000
+        results.append({'games_trained': games_trained, 'tree_nodes': n_nodes, 'decisions': len(ms),
+                        'p50_ms': float(np.percentile(ms, 50)), 'p90_ms': float(np.percentile(ms, 90)),
+                        'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max()), 'mean_ms': float(ms.mean())})
+    bot.policy = policy
+    bot.close()
+    return results
+
+def run_suite(suites, quick=False, seed=0, store='objects', time_budget=None, processes=1):
+    report = {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                       'seed': seed, 'quick': quick, 'store': store, 'time_budget': time_budget, 'processes': processes}}
+    if 'evaluator' in suites:
+        report['evaluator'] = bench_evaluator(2000 if quick else 20000, seed, 1 if quick else 3)
+    if 'engine' in suites:
+        report['engine'] = bench_engine(200 if quick else 2000, seed, 1 if quick else 3)
+    if 'vexbot' in suites:
+        checkpoints = (0, 50, 200) if quick else (0, 100, 400, 1600)
+        report['vexbot'] = bench_vexbot(checkpoints, 20 if quick else 100, seed, store, time_budget, processes)
+    return report
+
+def flatten(report):
+    # metric name -> value, vexbot rows keyed by their checkpoint
+    metrics = dict()
+    for suite, values in report.items():
+        if suite == 'meta' or suite == 'comparison':
+            continue
+        if isinstance(values, dict):
+            for name, value in values.items():
+                metrics[f"{suite}.{name}"] = value
+        else:
+            for row in values:
+                for name, value in row.items():
+                    if name != 'games_trained':
+                        metrics[f"{suite}.{row['games_trained']}.{name}"] = value
+    return metrics
+
+def compare(old, new, threshold=0.1):
+    # Relative change per metric; throughput (*_per_sec) should not drop, latency (*_ms) should not rise
+    rows = list()
+    old_metrics = flatten(old)
+    for name, value in flatten(new).items():
+        if name not in old_metrics or not old_metrics[name]:
+            continue
+        change = value / old_metrics[name] - 1
+        regression = (name.endswith('_per_sec') and change < -threshold) or (name.endswith('_ms') and change > threshold)
+        rows.append({'metric': name, 'old': old_metrics[name], 'new': value, 'change': change, 'regression': regression})
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the evaluator, game engine and VexBot decisions')
+    parser.add_argument('suites', nargs='*', default=['evaluator', 'engine', 'vexbot'], help='evaluator, engine and/or vexbot')
+    parser.add_argument('--quick', action='store_true', help='smaller workloads')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--store', choices=['objects', 'array'], default='objects', help='VexBot tree store')
+    parser.add_argument('--time-budget', type=float, default=None, help='VexBot seconds per decision (anytime search)')
+    parser.add_argument('--processes', type=int, default=1, help='VexBot worker processes for parallel tree evaluation')
+    parser.add_argument('--out', default=None, help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', default=None, help='earlier JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args()
+
+    report = run_suite(args.suites, args.quick, args.seed, args.store, args.time_budget, args.processes)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            report['comparison'] = compare(json.load(f), report, args.threshold)
+    if args.out is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None and any(row['regression'] for row in report['comparison']):
+        sys.exit(1)
@@ -1,7 +1,10 @@
 
 import random
 import enum
+import numpy as np
 from copy import deepcopy
+from functools import lru_cache
+from itertools import combinations, permutations
 
 handtype_to_str = {0:'Straight Flush', 1:'Four of a Kind', 2:'Full House', 3:'Flush', 4:'Straight', 5:'Three of a Kind', 6:'Two Pair', 7:'Pair', 8:'High Card'}
 class Suit(enum.Enum):
@@ -10,10 +13,39 @@ class Suit(enum.Enum):
     Heart =  'h'
     Spade = 's'
 
+# Cards are encoded as integers 0-51: code = (value - 2) * 4 + suit index, so
+# code >> 2 is the rank (0 = deuce, 12 = ace) and code & 3 the suit. Only 52 Card
+# objects ever exist; Card(suit, value) returns the interned instance.
 class Card:
-    def __init__(self,suit,value):
-        self.suit = suit
-        self.value = value
+    __slots__ = ('code', 'suit', 'value')
+
+    def __new__(cls, suit, value):
+        return CARDS[(value - 2) * 4 + _SUIT_INDEX[suit]]
+
+    @classmethod
+    def _make(cls, code):
+        card = object.__new__(cls)
+        object.__setattr__(card, 'code', code)
+        object.__setattr__(card, 'suit', _SUITS[code & 3])
+        object.__setattr__(card, 'value', (code >> 2) + 2)
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card is immutable")
+
+    def __hash__(self):
+        return self.code
+
+    # interned, so copies and pickles resolve back to the same instance
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (card_from_code, (self.code,))
+
     def __repr__(self):
         v = self.value
         if v == 11:
@@ -26,30 +58,287 @@ class Card:
             v = 'A'
         return repr(str(v) + str(self.suit.value))
 
+_SUITS = tuple(Suit)
+_SUIT_INDEX = {suit: i for i, suit in enumerate(Suit)}
+CARDS = tuple(Card._make(code) for code in range(52))
+
+def card_from_code(code):
+    return CARDS[code]
+
 class Deck:
-    def __init__(self):
-        self.deck = list()
-        i = 0
-        for suit in Suit:
-            for value in range(2,15):
-                self.deck.append(Card(suit,value))
-        self.out = list()
+    # All 52 cards live in one preallocated list; dealing advances self.top
+    # instead of removing cards, so self.deck[:self.top] are the cards already out.
+    def __init__(self, rng=None):
+        self.deck = list(CARDS)
+        self.top = 0
+        # anything with random.shuffle's interface, e.g. a seeded random.Random; None for the random module
+        self.rng = rng
+        # True while self.deck is shared with a snapshot; it is copied before being reordered
+        self.shared = False
     
     def shuffle(self):
-        random.shuffle(self.deck)
+        self.own()
+        (random if self.rng is None else self.rng).shuffle(self.deck)
+        self.top = 0
+
+    def own(self):
+        if self.shared:
+            self.deck = list(self.deck)
+            self.shared = False
+
+    def snapshot(self):
+        # a deck dealing from the same order; the list is only copied if either one reorders it
+        clone = Deck.__new__(Deck)
+        clone.deck = self.deck
+        clone.top = self.top
+        clone.rng = self.rng
+        clone.shared = self.shared = True
+        return clone
+
+    @property
+    def out(self):
+        return self.deck[:self.top]
 
     def deal(self,numCards):
-        try:
-            # draw = random.sample(self.deck,numCards)
-            draw = [self.deck[i] for i in range(numCards)]
-            for card in draw:
-                self.deck.remove(card)
-                self.out.append(card)
-            return draw
-
-        except ValueError:
+        end = self.top + numCards
+        if end > len(self.deck):
             raise ValueError("Unable to draw cards: Deck does not have enough cards")
+        draw = self.deck[self.top:end]
+        self.top = end
+        return draw
+
+# Hand evaluation
+#
+# evaluate() maps 5, 6 or 7 cards to a single integer strength in one pass over
+# the cards; a larger strength is a better poker hand. The hand category lives in
+# bits 20-23 (8 = straight flush, ..., 0 = high card) and the ranks that break
+# ties are packed 4 bits each below it. Straights and kickers come from tables
+# indexed by 13-bit rank masks (bit 0 = deuce, bit 12 = ace), built once at import.
+
+_STRAIGHT_FLUSH = 8 << 20
+_FOUR_OAK = 7 << 20
+_FULL_HOUSE = 6 << 20
+_FLUSH = 5 << 20
+_STRAIGHT = 4 << 20
+_THREE_OAK = 3 << 20
+_TWO_PAIR = 2 << 20
+_PAIR = 1 << 20
+
+def _build_tables():
+    n = 1 << 13
+    popcount = [0] * n
+    straight_high = [-1] * n
+    top = [[0] * n for _ in range(6)]
+    for mask in range(1, n):
+        popcount[mask] = popcount[mask >> 1] + (mask & 1)
+        for high in range(12, 3, -1):
+            window = 0b11111 << (high - 4)
+            if mask & window == window:
+                straight_high[mask] = high
+                break
+        else:
+            # wheel: A-2-3-4-5 plays as a five-high straight
+            if mask & 0x100F == 0x100F:
+                straight_high[mask] = 3
+        # top[k][mask] packs the k highest ranks of mask, highest first
+        ranks = [r for r in range(12, -1, -1) if mask & (1 << r)]
+        for k in range(1, 6):
+            packed = 0
+            for i in range(k):
+                packed = packed << 4 | (ranks[i] if i < len(ranks) else 0)
+            top[k][mask] = packed
+    return popcount, straight_high, top[1], top[2], top[3], top[5]
+
+_POPCOUNT, _STRAIGHT_HIGH, _TOP1, _TOP2, _TOP3, _TOP5 = _build_tables()
+
+def evaluate(cards):
+    # rank masks by multiplicity: m1 = ranks held at least once, ..., m4 = quads
+    suit_masks = [0, 0, 0, 0]
+    m1 = m2 = m3 = m4 = 0
+    for card in cards:
+        code = card.code
+        bit = 1 << (code >> 2)
+        suit_masks[code & 3] |= bit
+        if m1 & bit:
+            if m2 & bit:
+                if m3 & bit:
+                    m4 |= bit
+                else:
+                    m3 |= bit
+            else:
+                m2 |= bit
+        else:
+            m1 |= bit
+
+    flush = 0
+    for suit_mask in suit_masks:
+        if _POPCOUNT[suit_mask] >= 5:
+            high = _STRAIGHT_HIGH[suit_mask]
+            if high >= 0:
+                return _STRAIGHT_FLUSH | high << 16
+            flush = _FLUSH | _TOP5[suit_mask]
+            break
+
+    if m4:
+        quad = m4.bit_length() - 1
+        return _FOUR_OAK | quad << 16 | _TOP1[m1 & ~(1 << quad)] << 12
+    if m3:
+        trips = m3.bit_length() - 1
+        pairs = m2 & ~(1 << trips)
+        if pairs:
+            return _FULL_HOUSE | trips << 16 | (pairs.bit_length() - 1) << 12
+    if flush:
+        return flush
+    high = _STRAIGHT_HIGH[m1]
+    if high >= 0:
+        return _STRAIGHT | high << 16
+    if m3:
+        trips = m3.bit_length() - 1
+        return _THREE_OAK | trips << 16 | _TOP2[m1 & ~(1 << trips)] << 8
+    if m2:
+        high_pair = m2.bit_length() - 1
+        low_pairs = m2 & ~(1 << high_pair)
+        if low_pairs:
+            low_pair = low_pairs.bit_length() - 1
+            kickers = m1 & ~(1 << high_pair | 1 << low_pair)
+            return _TWO_PAIR | high_pair << 16 | low_pair << 12 | _TOP1[kickers] << 8
+        return _PAIR | high_pair << 16 | _TOP3[m1 & ~m2] << 4
+    return _TOP5[m1]
+
+def hand_type_of(strength):
+    # strength -> hand type index used by handtype_to_str (0 = straight flush, ..., 8 = high card)
+    return 8 - (strength >> 20)
+
+def best_five_cards(cards):
+    # Only needed for display; showdowns compare evaluate() directly
+    best = max(combinations(cards, 5), key=evaluate)
+    counts = dict()
+    for card in best:
+        counts[card.value] = counts.get(card.value, 0) + 1
+    return sorted(best, key=lambda x: (counts[x.value], x.value), reverse=True)
+
+# Suit isomorphism
+#
+# Relabelling suits does not change how strong any hand is, so boards that differ
+# only by a suit permutation can share statistics. canonicalize() takes card groups
+# in dealing order (e.g. [flop, turn], or [hole, flop]) and returns the same
+# representative for every suit-isomorphic input: each group sorted by code and
+# the suits chosen to make the tuple of groups as small as possible. Earlier groups
+# take priority, so a turn card is canonicalized relative to its (canonical) flop.
+#
+# The multiplicity is how many raw choices of the last group, given the earlier
+# groups, fall into the same class: 24 / |stabilizer| for the first group, and the
+# ratio of the stabilizer sizes of the prefix and the full sequence after that.
+# Over the full deck the 22100 flops form 1755 classes.
+
+_SUIT_PERMUTATIONS = tuple(permutations(range(4)))
+
+@lru_cache(maxsize=1 << 16)
+def _canonicalize_codes(groups):
+    best = None
+    n_best = 0
+    n_prefix = 0
+    for perm in _SUIT_PERMUTATIONS:
+        mapped = tuple(tuple(sorted(((code & ~3) | perm[code & 3] for code in group), reverse=True)) for group in groups)
+        if best is None or mapped < best:
+            best = mapped
+            n_best = 0
+        if mapped == best:
+            n_best += 1
+    for perm in _SUIT_PERMUTATIONS:
+        mapped = tuple(tuple(sorted(((code & ~3) | perm[code & 3] for code in group), reverse=True)) for group in groups[:-1])
+        if mapped == best[:-1]:
+            n_prefix += 1
+    return best, n_prefix // n_best
+
+def canonicalize(groups):
+    # Returns (canonical groups as tuples of Cards, multiplicity of the last group)
+    codes, multiplicity = _canonicalize_codes(tuple(tuple(card.code for card in group) for group in groups))
+    return tuple(tuple(CARDS[code] for code in group) for group in codes), multiplicity
+
+# Batch evaluation
+#
+# evaluate_batch() is the NumPy counterpart of evaluate(): it takes an (N, k) int
+# array of card codes (k = 5, 6 or 7) and returns the (N,) strengths evaluate()
+# would give each row. The same rank-mask tables are used as lookup arrays, and
+# rows are processed in chunks so the temporaries stay small.
+
+_NP_POPCOUNT = np.array(_POPCOUNT, dtype=np.int32)
+_NP_STRAIGHT_HIGH = np.array(_STRAIGHT_HIGH, dtype=np.int32)
+_NP_TOP1 = np.array(_TOP1, dtype=np.int32)
+_NP_TOP2 = np.array(_TOP2, dtype=np.int32)
+_NP_TOP3 = np.array(_TOP3, dtype=np.int32)
+_NP_TOP5 = np.array(_TOP5, dtype=np.int32)
+
+_BATCH_CHUNK = 1 << 15
+
+def cards_to_codes(cards):
+    return np.array([card.code for card in cards], dtype=np.int32)
+
+def evaluate_batch(codes, out=None):
+    codes = np.asarray(codes)
+    if out is None:
+        out = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), _BATCH_CHUNK):
+        end = start + _BATCH_CHUNK
+        out[start:end] = _evaluate_chunk(codes[start:end])
+    return out
+
+def _evaluate_chunk(codes):
+    n = len(codes)
+    zero = np.zeros(n, dtype=np.int32)
+    m1, m2, m3, m4 = zero.copy(), zero.copy(), zero.copy(), zero.copy()
+    # one 52-bit mask per row, 13 rank bits per suit
+    suited = np.zeros(n, dtype=np.int64)
+    for column in codes.T:
+        rank = column >> 2
+        bit = np.left_shift(1, rank, dtype=np.int32)
+        m4 |= m3 & bit
+        m3 |= m2 & bit
+        m2 |= m1 & bit
+        m1 |= bit
+        suited |= np.left_shift(1, (column & 3) * 13 + rank, dtype=np.int64)
+
+    flush_mask = zero.copy()
+    for suit in range(4):
+        suit_mask = ((suited >> (13 * suit)) & 0x1FFF).astype(np.int32)
+        flush_mask = np.where(_NP_POPCOUNT[suit_mask] >= 5, suit_mask, flush_mask)
+
+    one = np.int32(1)
+    trips = _NP_TOP1[m3]
+    pairs_under_trips = m2 & ~(one << trips)
+    high_pair = _NP_TOP1[m2]
+    high_pair_bit = one << high_pair
+    low_pair = _NP_TOP1[m2 & ~high_pair_bit]
+    two_pair_bits = high_pair_bit | (one << low_pair)
+    flush_straight = _NP_STRAIGHT_HIGH[flush_mask]
+    straight = _NP_STRAIGHT_HIGH[m1]
+
+    conditions = [
+        (flush_mask != 0) & (flush_straight >= 0),
+        m4 != 0,
+        (m3 != 0) & (pairs_under_trips != 0),
+        flush_mask != 0,
+        straight >= 0,
+        m3 != 0,
+        _NP_POPCOUNT[m2] >= 2,
+        m2 != 0,
+    ]
+    choices = [
+        _STRAIGHT_FLUSH | flush_straight << 16,
+        _FOUR_OAK | _NP_TOP1[m4] << 16 | _NP_TOP1[m1 & ~m4] << 12,
+        _FULL_HOUSE | trips << 16 | _NP_TOP1[pairs_under_trips] << 12,
+        _FLUSH | _NP_TOP5[flush_mask],
+        _STRAIGHT | straight << 16,
+        _THREE_OAK | trips << 16 | _NP_TOP2[m1 & ~m3] << 8,
+        _TWO_PAIR | high_pair << 16 | low_pair << 12 | _NP_TOP1[m1 & ~two_pair_bits] << 8,
+        _PAIR | high_pair << 16 | _NP_TOP3[m1 & ~m2] << 4,
+    ]
+    return np.select(conditions, choices, default=_NP_TOP5[m1])
 
+# Original per-hand-type checks on a sorted 5-card list. The showdown and VexBot
+# paths use evaluate() instead; these are kept as a slow reference implementation
+# that tests/test_card.py checks the evaluators against.
 class Hand:
 
     @staticmethod
@@ -0,0 +1,177 @@
+import time
+from itertools import combinations
+from math import comb
+import numpy as np
+from card import evaluate, evaluate_batch, cards_to_codes
+
+# Monte Carlo hand strength
+#
+# The equity of a hand is the probability it wins at showdown (ties count half)
+# against one opponent whose hole cards are drawn from a range, with the rest of
+# the board dealt at random. Rollouts are run in batches through evaluate_batch,
+# and sampling stops early once the confidence interval is narrower than the
+# requested tolerance. With a deadline (a time.perf_counter() value) a batch
+# that would not finish in time at the last measured rollout rate is cut down,
+# or dropped; batches that fit are the same as without a deadline.
+
+# All 1326 two-card combinations as (low code, high code); a range is a weight per row
+COMBOS = np.array([(low, high) for high in range(52) for low in range(high)], dtype=np.int32)
+_COMBO_INDEX = np.full((52, 52), -1, dtype=np.int32)
+_COMBO_INDEX[COMBOS[:, 0], COMBOS[:, 1]] = np.arange(len(COMBOS))
+_COMBO_INDEX[COMBOS[:, 1], COMBOS[:, 0]] = np.arange(len(COMBOS))
+
+def combo_index(card_1, card_2):
+    return _COMBO_INDEX[card_1.code, card_2.code]
+
+def uniform_range():
+    return np.ones(len(COMBOS))
+
+def _range_weights(opponent_range, known_codes):
+    weights = uniform_range() if opponent_range is None else np.array(opponent_range, dtype=np.float64)
+    # the opponent cannot hold any card we can see
+    weights[np.isin(COMBOS, known_codes).any(axis=1)] = 0
+    total = weights.sum()
+    if total <= 0:
+        raise ValueError("Opponent range is empty once the known cards are removed")
+    return weights / total
+
+def estimate_equity(hole, board, opponent_range=None, max_samples=2000, min_samples=500, batch_size=250, tolerance=0.02, z=1.96, rng=None,
+                    deadline=None):
+    # Returns (equity, half width of the confidence interval, number of rollouts)
+    if rng is None:
+        rng = np.random.default_rng()
+    hole_codes = cards_to_codes(hole)
+    board_codes = cards_to_codes(board)
+    known_codes = np.concatenate([hole_codes, board_codes])
+    weights = _range_weights(opponent_range, known_codes)
+    n_missing = 5 - len(board_codes)
+
+    if n_missing == 0:
+        # river: every opponent hand can be enumerated exactly
+        valid = np.nonzero(weights)[0]
+        ours = evaluate(list(hole) + list(board))
+        theirs = evaluate_batch(np.concatenate([COMBOS[valid], np.broadcast_to(board_codes, (len(valid), 5))], axis=1))
+        scores = (ours > theirs) + 0.5 * (ours == theirs)
+        return float(np.dot(scores, weights[valid])), 0.0, len(valid)
+
+    live = np.setdiff1d(np.arange(52, dtype=np.int32), known_codes)
+    position = np.full(52, -1, dtype=np.int32)
+    position[live] = np.arange(len(live))
+
+    total = 0.0
+    total_sq = 0.0
+    n = 0
+    half_width = np.inf
+    start = time.perf_counter()
+    while n < max_samples:
+        b = min(batch_size, max_samples - n)
+        if deadline is not None:
+            b = batch_within(b, n, start, deadline, 'equity')
+            if b == 0:
+                break
+        opp = COMBOS[rng.choice(len(COMBOS), size=b, p=weights)]
+        # random keys over the live cards; the opponent's cards sort last so they are never dealt
+        keys = rng.random((b, len(live)))
+        keys[np.arange(b)[:, None], position[opp]] = 2.0
+        runout = live[np.argpartition(keys, n_missing - 1, axis=1)[:, :n_missing]]
+        boards = np.concatenate([np.broadcast_to(board_codes, (b, len(board_codes))), runout], axis=1)
+        ours = evaluate_batch(np.concatenate([np.broadcast_to(hole_codes, (b, 2)), boards], axis=1))
+        theirs = evaluate_batch(np.concatenate([opp, boards], axis=1))
+        scores = (ours > theirs) + 0.5 * (ours == theirs)
+
+        total += scores.sum()
+        total_sq += np.dot(scores, scores)
+        n += b
+        mean = total / n
+        variance = max(total_sq / n - mean * mean, 0.0)
+        half_width = z * np.sqrt(variance / n)
+        if n >= min_samples and half_width < tolerance:
+            break
+    return float(total / n), float(half_width), n
+
+# seconds per rollout last measured by each estimator, for batch_within
+ROLLOUT_SECONDS = dict()
+
+def batch_within(b, n, start, deadline, estimator, first=None):
+    # rollouts, at most b, that fit before deadline: at the rate of the n run since start,
+    # or the one measured by an earlier call (at most first, or b, if there has been none).
+    # An estimate needs at least one rollout, so the first batch is never empty.
+    now = time.perf_counter()
+    if n > 0:
+        ROLLOUT_SECONDS[estimator] = (now - start) / n
+    if estimator not in ROLLOUT_SECONDS:
+        return b if first is None else min(b, first)
+    return max(min(b, int((deadline - now) / ROLLOUT_SECONDS[estimator])), 1 if n == 0 else 0)
+
+def hand_strength(hole, board, opponent_range=None, max_samples=2000, tolerance=0.02, rng=None):
+    return estimate_equity(hole, board, opponent_range, max_samples=max_samples, tolerance=tolerance, rng=rng)[0]
+
+def river_strengths(hole, boards):
+    # Exact equity of hole against every opponent hand on each complete board.
+    # boards is an (R, 5) array of card codes; returns an (R,) array.
+    hole_codes = cards_to_codes(hole)
+    boards = np.asarray(boards, dtype=np.int32)
+    n = len(boards)
+    ours = evaluate_batch(np.concatenate([np.broadcast_to(hole_codes, (n, 2)), boards], axis=1))
+    opp = np.broadcast_to(COMBOS, (n, len(COMBOS), 2))
+    rows = np.concatenate([opp, np.broadcast_to(boards[:, None, :], (n, len(COMBOS), 5))], axis=2)
+    theirs = evaluate_batch(rows.reshape(-1, 7)).reshape(n, len(COMBOS))
+    # opponent hands that share a card with ours or the board are impossible
+    dead = np.zeros((n, 52), dtype=bool)
+    dead[np.arange(n)[:, None], boards] = True
+    dead[:, hole_codes] = True
+    live = ~(dead[:, COMBOS[:, 0]] | dead[:, COMBOS[:, 1]])
+    scores = (ours[:, None] > theirs) + 0.5 * (ours[:, None] == theirs)
+    return (scores * live).sum(axis=1) / live.sum(axis=1)
+
+def expected_hs2(hole, board, n_rollouts=32, rng=None, deadline=None):
+    # E[HS^2]: mean squared river hand strength over random runouts of the board.
+    # Squaring rewards hands whose strength varies a lot (draws) over ones that
+    # stay mediocre, which plain equity does not tell apart. With a deadline
+    # fewer runouts may be used.
+    if rng is None:
+        rng = np.random.default_rng()
+    board_codes = cards_to_codes(board)
+    n_missing = 5 - len(board_codes)
+    if n_missing == 0:
+        return float(river_strengths(hole, board_codes[None, :])[0] ** 2)
+    live = np.setdiff1d(np.arange(52, dtype=np.int32), np.concatenate([cards_to_codes(hole), board_codes]))
+    keys = rng.random((n_rollouts, len(live)))
+    runouts = live[np.argpartition(keys, n_missing - 1, axis=1)[:, :n_missing]]
+    boards = np.concatenate([np.broadcast_to(board_codes, (n_rollouts, len(board_codes))), runouts], axis=1)
+    if deadline is None:
+        return float(np.mean(river_strengths(hole, boards) ** 2))
+    strengths = list()
+    n = 0
+    start = time.perf_counter()
+    while n < n_rollouts:
+        b = batch_within(n_rollouts - n, n, start, deadline, 'hs2', first=1)
+        if b == 0:
+            break
+        strengths.append(river_strengths(hole, boards[n:n + b]))
+        n += b
+    return float(np.mean(np.concatenate(strengths) ** 2))
+
+def showdown_equity(hands, board, max_runouts=20000, rng=None):
+    # Equity of each hand in hands against the others over the rest of the board:
+    # every runout is enumerated if there are at most max_runouts, else that many are sampled.
+    # Ties split the pot. Returns an array with one equity per hand.
+    board_codes = cards_to_codes(board)
+    hand_codes = [cards_to_codes(hand) for hand in hands]
+    n_missing = 5 - len(board_codes)
+    if n_missing == 0:
+        runouts = np.zeros((1, 0), dtype=np.int32)
+    else:
+        live = np.setdiff1d(np.arange(52, dtype=np.int32), np.concatenate(hand_codes + [board_codes]))
+        if comb(len(live), n_missing) <= max_runouts:
+            runouts = live[np.array(list(combinations(range(len(live)), n_missing)), dtype=np.int32)]
+        else:
+            if rng is None:
+                rng = np.random.default_rng()
+            keys = rng.random((max_runouts, len(live)))
+            runouts = live[np.argpartition(keys, n_missing - 1, axis=1)[:, :n_missing]]
+    n = len(runouts)
+    boards = np.concatenate([np.broadcast_to(board_codes, (n, len(board_codes))), runouts], axis=1)
+    strengths = np.stack([evaluate_batch(np.concatenate([np.broadcast_to(codes, (n, 2)), boards], axis=1)) for codes in hand_codes])
+    best = strengths == strengths.max(axis=0)
+    return (best / best.sum(axis=0)).mean(axis=1)
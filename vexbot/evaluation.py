@@ -0,0 +1,131 @@
+import argparse
+import random
+from math import ceil, sqrt
+from statistics import NormalDist
+import numpy as np
+import player
+from events import EventSink
+from equity import showdown_equity
+from game import MatchSimulator
+from tournament import agent_name, make_player
+
+# Duplicate evaluation
+#
+# Card luck swamps the skill difference between two agents, so comparing them
+# over independent hands needs a huge number of hands. Here every deal is played
+# twice: once with the agent in seat 0 and once, from the same shuffled deck,
+# with the seats swapped, so each agent gets the other's cards and position.
+# The score of a deal is the agent's average result over both seatings, in
+# milli-big-blinds per hand (mbb/hand); most of the luck cancels out.
+#
+# Games are played with stacks reset to the starting chips, in blocks of deals.
+# After each block the confidence interval of the mean is checked and the run
+# stops once it is narrower than target_width or, with stop_on_significance,
+# no longer contains 0. Each check spends a share of alpha (Bonferroni over the
+# planned checks), so stopping early does not overstate the confidence.
+#
+# scoring='allin' replaces the result of a game that went to showdown before
+# the river with each player's share of the pot by equity over the remaining
+# cards, so the runout of an all-in adds no variance.
+
+class GameResults(EventSink):
+    # keeps the 'game_end' event of every finished game
+    def __init__(self):
+        self.games = list()
+
+    def emit(self, event, **fields):
+        if event == 'game_end':
+            self.games.append(fields)
+
+def game_score(game, seat, scoring='chips', rng=None):
+    # chips won by seat in a finished game, all-in adjusted with scoring='allin'
+    state = game['state']
+    if scoring == 'allin' and state.showdown_board is not None and len(state.showdown_board) < 5:
+        equities = showdown_equity(state.players_hands, state.showdown_board, rng=rng)
+        # in a heads-up showdown both players have put in half the pot
+        return equities[seat] * state.showdown_pot - state.showdown_pot / 2
+    return game['deltas'][seat]
+
+def confidence_interval(scores, z):
+    n = len(scores)
+    mean = float(np.mean(scores))
+    half_width = z * float(np.std(scores, ddof=1)) / sqrt(n) if n > 1 else np.inf
+    return mean, half_width
+
+def duplicate_seatings(agent, opponent, deck_seed, agent_seed, opponent_seed, chips=20000, variant='FL'):
+    # seating 0: agent in seat 0; seating 1: same decks, agent in seat 1. Each agent
+    # keeps its random stream across seatings, so its random choices line up as well.
+    # Returns one MatchSimulator per seating, with no games yet and a GameResults sink.
+    sims = list()
+    for seating in range(2):
+        seats = ((agent, agent_seed), (opponent, opponent_seed))
+        if seating == 1:
+            seats = seats[::-1]
+        players = [make_player(seats[seat][0], seat, seats[seat][1]) for seat in range(2)]
+        sims.append(MatchSimulator(players, n_games=0, initial_players_chips=[chips, chips], variant=variant,
+                                   sink=GameResults(), rng=random.Random(deck_seed), reset_chips=True))
+    return sims
+
+def evaluate_duplicate(agent, opponent, max_deals=5000, block=100, min_deals=None, scoring='chips', target_width=None,
+                       stop_on_significance=True, alpha=0.05, seed=0, chips=20000, variant='FL'):
+    # agent and opponent are player classes or (class, kwargs), as in tournament.py
+    if scoring not in ('chips', 'allin'):
+        raise ValueError(f"Unknown scoring: {scoring}")
+    min_deals = block if min_deals is None else min_deals
+    deck_seed, agent_seed, opponent_seed, score_seed = [int(s.generate_state(1, np.uint64)[0]) for s in np.random.SeedSequence(seed).spawn(4)]
+    score_rng = np.random.default_rng(score_seed)
+    sims = duplicate_seatings(agent, opponent, deck_seed, agent_seed, opponent_seed, chips, variant)
+    n_checks = max(ceil((max_deals - min_deals) / block), 0) + 1
+    z = NormalDist().inv_cdf(1 - alpha / (2 * n_checks))
+    deal_scores = list()
+    hand_scores = list()
+    stopped = 'max_deals'
+    while len(deal_scores) < max_deals:
+        n = min(block, max_deals - len(deal_scores))
+        for sim in sims:
+            sim.n_games += n
+            sim.run()
+        for k in range(len(deal_scores), len(deal_scores) + n):
+            games = [sims[seating].sink.games[k] for seating in range(2)]
+            big_blind = games[0]['state'].big_blind
+            results = [1000 * game_score(games[seating], seating, scoring, score_rng) / big_blind for seating in range(2)]
+            deal_scores.append((results[0] + results[1]) / 2)
+            hand_scores.extend(results)
+        if len(deal_scores) >= min_deals:
+            mean, half_width = confidence_interval(deal_scores, z)
+            if target_width is not None and half_width <= target_width:
+                stopped = 'width'
+                break
+            if stop_on_significance and abs(mean) > half_width:
+                stopped = 'significant'
+                break
+
+    mean, half_width = confidence_interval(deal_scores, z)
+    # what the same number of hands would give without pairing them up
+    _, naive_half_width = confidence_interval(hand_scores, z)
+    return dict(agent=agent_name(agent), opponent=agent_name(opponent), deals=len(deal_scores), hands=len(hand_scores),
+                scoring=scoring, mbb_per_hand=mean, half_width=half_width, ci=(mean - half_width, mean + half_width),
+                naive_half_width=naive_half_width, variance_reduction=(naive_half_width / half_width) ** 2 if half_width > 0 else np.inf,
+                stopped=stopped, z=z)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Duplicate evaluation of one agent against another')
+    parser.add_argument('--agent', default='VexBot', help='player class from player.py')
+    parser.add_argument('--opponent', default='RaisePlayer')
+    parser.add_argument('--max-deals', type=int, default=5000)
+    parser.add_argument('--block', type=int, default=100, help='deals between confidence interval checks')
+    parser.add_argument('--scoring', choices=['chips', 'allin'], default='chips')
+    parser.add_argument('--target-width', type=float, default=None, help='stop once the CI half width is below this (mbb/hand)')
+    parser.add_argument('--no-significance-stop', action='store_true', help='do not stop as soon as the CI excludes 0')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--chips', type=int, default=20000)
+    parser.add_argument('--variant', default='FL')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    result = evaluate_duplicate(getattr(player, args.agent), getattr(player, args.opponent), args.max_deals, args.block,
+                                scoring=args.scoring, target_width=args.target_width, stop_on_significance=not args.no_significance_stop,
+                                alpha=args.alpha, seed=args.seed, chips=args.chips, variant=args.variant)
+    print(f"{result['agent']} vs {result['opponent']}: {result['mbb_per_hand']:+.1f} mbb/hand "
+          f"({result['ci'][0]:+.1f}, {result['ci'][1]:+.1f}) over {result['deals']} duplicate deals ({result['hands']} hands), "
+          f"stopped on {result['stopped']}; unpaired hands would give +/- {result['naive_half_width']:.1f} "
+          f"({result['variance_reduction']:.1f}x fewer hands needed)")
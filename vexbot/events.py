@@ -0,0 +1,87 @@
+# Match event sinks
+#
+# MatchSimulator and GameState report what happens in a match through a sink
+# instead of printing it. Events are a name plus keyword fields:
+#   'game_start' - game, chips, bets
+#   'action'     - game, round, player, chips, action
+#   'showdown'   - board, winners, hand_type, hands, and best_five (one per
+#                  player in the pot) only if the sink sets wants_best_five
+#   'pay'        - winners, pot_idx, prize
+#   'game_end'   - game, chips, deltas (chips won or lost per player), state
+#                  (the finished GameState)
+#   'profile'    - profile (Profiler.summary() at the end of a profiled run)
+# Callers skip building events entirely when sink.active is False, so the
+# NullSink (the default) costs nothing.
+
+class EventSink:
+    active = True
+    wants_best_five = False
+
+    def emit(self, event, **fields):
+        pass
+
+class NullSink(EventSink):
+    active = False
+
+class RecordSink(EventSink):
+    # keeps every event as a dict: {'event': name, **fields}
+    def __init__(self, wants_best_five=False):
+        self.records = list()
+        self.wants_best_five = wants_best_five
+
+    def emit(self, event, **fields):
+        fields['event'] = event
+        self.records.append(fields)
+
+class TextSink(EventSink):
+    # the match log as text lines, kept in self.lines or written straight to stream
+    wants_best_five = True
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.lines = list()
+
+    def emit(self, event, **fields):
+        for line in self.format(event, fields):
+            self.write(line)
+
+    def write(self, line):
+        if self.stream is None:
+            self.lines.append(line)
+        else:
+            self.stream.write(line + '\n')
+
+    def format(self, event, fields):
+        if event == 'game_start':
+            return [f"Game: {fields['game']}, Chips:{fields['chips']}, Bets:{fields['bets']}"]
+        elif event == 'action':
+            return [f"Game: {fields['game']}, Round:{fields['round']}, Player: {fields['player']}, Chips:{fields['chips']}, Action:{fields['action']}"]
+        elif event == 'showdown':
+            lines = ["Board:" + str(fields['board']) + ", Winners:" + str(fields['winners']) + ", HandType: " + fields['hand_type']]
+            for p_idx, hand in fields['hands'].items():
+                if 'best_five' in fields:
+                    lines.append("Player " + str(p_idx) + " - Hand:" + str(hand) + ", BestFive:" + str(fields['best_five'][p_idx]))
+                else:
+                    lines.append("Player " + str(p_idx) + " - Hand:" + str(hand))
+            return lines
+        elif event == 'pay':
+            return [f"Winners:{fields['winners']}"]
+        elif event == 'game_end':
+            # the next game_start line already shows the chips
+            return []
+        elif event == 'profile':
+            lines = list()
+            for phase, row in fields['profile']['phases'].items():
+                lines.append(f"Profile: {phase}, Calls:{row['calls']}, Self:{row['self_s']:.3f}s, Inclusive:{row['inclusive_s']:.3f}s")
+            for name, rate in fields['profile']['hit_rates'].items():
+                lines.append(f"Profile: {name}, HitRate:{rate:.1%}")
+            return lines
+        return [f"{event}: {fields}"]
+
+    def text(self):
+        return '\n'.join(self.lines)
+
+class PrintSink(TextSink):
+    # the old behaviour: everything printed to stdout
+    def write(self, line):
+        print(line)
@@ -1,7 +1,7 @@
 import numpy as np
-from card import Suit, Card, Deck, Hand, handtype_to_str
+from card import Suit, Card, Deck, handtype_to_str, evaluate, hand_type_of, best_five_cards
 import random
-from copy import deepcopy
+from events import NullSink, PrintSink
 from player import Player, RandomPlayer, RaisePlayer, VexBot
 
 
@@ -10,10 +10,12 @@ class GameState:
     Represents a State in the game
     """
     # round = betting round, game = preflop to river, (match = many games)
-    def __init__(self, num_players, small_blind_player, players_chips, variant):
+    def __init__(self, num_players, small_blind_player, players_chips, variant, sink=None, rng=None):
         self.variant = variant
+        # where showdowns and payouts are reported (see events.py)
+        self.sink = NullSink() if sink is None else sink
         self.betting_round = 0 # 0 = preflop, 1 = postflop, 2 = after turn, 3 = after river,
-        self.deck = Deck()
+        self.deck = Deck(rng)
         self.deck.shuffle()
         self.board = list()
         self.num_players = num_players
@@ -44,6 +46,8 @@ class GameState:
         self.n_bets_left = [v for v in self.n_bets_left_init]
 
         self.game_actions = list()
+        # saved state per apply(), popped by undo()
+        self.undo_stack = list()
 
         self.setting_blinds = True
         self.current_better = self.small_blind_player
@@ -53,7 +57,17 @@ class GameState:
 
         self.should_showdown = False
         self.game_over = False
+        # board and pot when the showdown was reached, before any remaining cards were dealt
+        self.showdown_board = None
+        self.showdown_pot = None
+        # chips paid out of the pots, i.e. the size of the pot once the game is over
+        self.pot_won = 0
         
+    @property
+    def pot(self):
+        # chips already collected into the pots (bets of the current round not included)
+        return sum(self.all_pots)
+
     def deal_cards(self,num):
         return self.deck.deal(num)
     
@@ -62,88 +76,20 @@ class GameState:
         for card in cards:
             self.board.append(card)
     
-    def check_if_hand_type(self, five_cards, hand_type):
-        comp_cards = None
-        if hand_type == 0:
-            comp_cards = Hand.is_straight_flush(five_cards)
-        elif hand_type == 1:
-            comp_cards = Hand.is_four_oak(five_cards)
-        elif hand_type == 2:
-            comp_cards = Hand.is_full_house(five_cards)
-        elif hand_type == 3:
-            comp_cards = Hand.is_flush(five_cards)
-        elif hand_type == 4:
-            comp_cards = Hand.is_straight(five_cards)
-        elif hand_type == 5:
-            comp_cards = Hand.is_three_oak(five_cards)
-        elif hand_type == 6:
-            comp_cards = Hand.is_two_pair(five_cards)
-        elif hand_type == 7:
-            comp_cards = Hand.is_pair(five_cards)
-        elif hand_type == 8:
-            comp_cards = five_cards
-        return comp_cards
-
-    def check_for_hand(self, seven_cards, hand_type):
-        for i in range(5, -1, -1):
-            for j in range(6, i, -1):
-                five_cards = [deepcopy(seven_cards[k]) for k in range(len(seven_cards)) if (k != i and k != j)]
-                comparable_cards = self.check_if_hand_type(five_cards, hand_type)
-                if comparable_cards:
-                    return comparable_cards
-        return None
-
     def determine_winners(self, pot_players):
-        # tuple (hand type, player_idx, best 5 cards) 
-        # hand_types : 0 - straight flush, 1 - four of a kind, 2 - full house, 3 - flush, 4 - straight, 5 - 3 of a kind, 6 - two pair, 7 - pair, 8 - high card
-        best_five_cards_list = list() 
-        best_hand_type = None
-        for hand_type in range(9):
-            for p_idx in pot_players:
-                hand = deepcopy(self.players_hands[p_idx])
-                board = deepcopy(self.board)
-                seven_cards = sorted(board+hand, key=lambda x: x.value, reverse=True)
-                p_best_five_cards = self.check_for_hand(seven_cards, hand_type)
-                if p_best_five_cards:
-                    best_five_cards_list.append((p_idx, p_best_five_cards))
-            if len(best_five_cards_list) > 0:
-                best_hand_type = hand_type
-                break
-                  
-        winners = None
-        if len(best_five_cards_list) == 1:
-            winners = list()
-            winners.append(best_five_cards_list[0][0])
-        else:
-            winners = [best_five_cards_list[i][0] for i in range(len(best_five_cards_list))]
-            
-            for i in range(5):
-                max_level_card_value = -1
-                for (p_idx, p_best_five_cards) in best_five_cards_list:
-                    if p_idx in winners:
-                        card = p_best_five_cards[i]
-                        if card.value > max_level_card_value:
-                            max_level_card_value = card.value
-                for (p_idx, p_best_five_cards) in best_five_cards_list:
-                    if p_idx in winners:
-                        card = p_best_five_cards[i]
-                        if card.value < max_level_card_value:
-                            winners.remove(p_idx)
-                if len(winners) == 1:
-                    break
-        print("Board:" + str(self.board) + ", Winners:"+str(winners)+", HandType: "+handtype_to_str[hand_type])
-        curr_winner = -1
+        # one comparable strength per player (card.evaluate); the highest strength wins the pot
+        strengths = dict()
         for p_idx in pot_players:
-            best_five = []
-            for hand_type in range(9):
-                hand = deepcopy(self.players_hands[p_idx])
-                board = deepcopy(self.board)
-                seven_cards = sorted(board+hand, key=lambda x: x.value, reverse=True)
-                p_best_five_cards = self.check_for_hand(seven_cards, hand_type)
-                if p_best_five_cards:
-                    best_five = p_best_five_cards
-                    break
-            print("Player "+str(p_idx)+" - Hand:" + str(self.players_hands[p_idx])+ ", BestFive:" + str(best_five))            
+            strengths[p_idx] = evaluate(self.board + self.players_hands[p_idx])
+        best_strength = max(strengths.values())
+        winners = [p_idx for p_idx in pot_players if strengths[p_idx] == best_strength]
+        if self.sink.active:
+            fields = dict(board=list(self.board), winners=winners, hand_type=handtype_to_str[hand_type_of(best_strength)],
+                          hands={p_idx: self.players_hands[p_idx] for p_idx in pot_players})
+            # picking the best five cards is a second evaluation pass, only done for sinks that show it
+            if self.sink.wants_best_five:
+                fields['best_five'] = {p_idx: best_five_cards(self.board + self.players_hands[p_idx]) for p_idx in pot_players}
+            self.sink.emit('showdown', **fields)
 
         # could return hand type and best five cards
         return winners
@@ -152,9 +98,11 @@ class GameState:
         # if want more than 2 players, need to account for side pots
         pot = self.all_pots[pot_idx]
         prize = pot // len(winners)
+        self.pot_won += pot
         for winner in winners:
             self.players_chips[winner] += prize
-        print(f"Winners:{winners}")
+        if self.sink.active:
+            self.sink.emit('pay', winners=winners, pot_idx=pot_idx, prize=prize)
         self.all_pots[pot_idx] = 0
 
         # self.winners = winners
@@ -162,6 +110,8 @@ class GameState:
 
     def showdown(self):
         
+        self.showdown_board = list(self.board)
+        self.showdown_pot = self.pot
         num_to_deal = 5 - len(self.board)
         if num_to_deal != 0:
             self.deal_to_board(num_to_deal)
@@ -187,10 +137,9 @@ class GameState:
                 self.all_pots[-1] += self.current_bets[p_idx]
                 self.players_chips[p_idx] -= self.current_bets[p_idx]
                 self.current_bets[p_idx] = 0
+            # no showdown needed; the remaining player takes every pot
             for pot_idx in range(len(self.all_pots)):
-                winners = self.determine_winners(self.pots_players[pot_idx])
                 self.pay_winners(winners, pot_idx)
-            self.pay_winners(winners, 0)
             self.game_over = True
             return
 
@@ -202,7 +151,7 @@ class GameState:
                 min_bet_above_0 = current_bet
         for p_idx in range(self.num_players):
             self.current_bets[p_idx] = min(self.current_bets[p_idx], min_bet_above_0)
-            self.pot += self.current_bets[p_idx]
+            self.all_pots[-1] += self.current_bets[p_idx]
             self.players_chips[p_idx] -= self.current_bets[p_idx]
             self.current_bets[p_idx] = 0    
 
@@ -335,7 +284,8 @@ class GameState:
             if self.current_better == just_betted:
                 break
         
-        if self.is_all_set():
+        # a fold ends the game without a showdown (update_round pays the remaining player)
+        if self.is_all_set() and not any(self.folded):
             num_not_all_in = 0
             for p_all_in in self.is_player_all_in:
                 if not p_all_in:
@@ -348,20 +298,89 @@ class GameState:
     def is_termination_state(self):
         return self.game_over
 
+    # Search support
+    #
+    # apply() plays one action and, like MatchSimulator, closes the betting round
+    # once everyone is set (dealing the next street or settling the game); undo()
+    # takes back the last apply(). Only the per-player lists, a few scalars and
+    # the lengths of the append-only lists (board, game_actions, dealt cards) are
+    # saved, so a line of play can be explored and unwound without copying the
+    # state. snapshot() is a cheap independent copy for search to work on:
+    # lists are copied shallowly, hands and cards are shared, and the deck's
+    # card order is shared until either side reorders it (determinize).
+
+    def apply(self, action):
+        self.undo_stack.append((
+            list(self.current_bets), list(self.players_chips), list(self.all_pots), list(self.is_player_set),
+            list(self.is_player_all_in), list(self.folded), list(self.n_bets_left), len(self.board), len(self.game_actions),
+            self.deck.top, self.betting_round, self.current_better, self.should_showdown, self.game_over,
+            self.showdown_board, self.showdown_pot, self.pot_won))
+        self.act(action)
+        while self.is_all_set() and not self.game_over:
+            self.update_round()
+
+    def undo(self):
+        (self.current_bets, players_chips, self.all_pots, self.is_player_set, self.is_player_all_in, self.folded,
+         self.n_bets_left, n_board, n_actions, self.deck.top, self.betting_round, self.current_better, self.should_showdown,
+         self.game_over, self.showdown_board, self.showdown_pot, self.pot_won) = self.undo_stack.pop()
+        # players_chips may be the MatchState's list, so it is restored in place
+        self.players_chips[:] = players_chips
+        del self.board[n_board:]
+        del self.game_actions[n_actions:]
+
+    def snapshot(self):
+        clone = GameState.__new__(GameState)
+        clone.__dict__.update(self.__dict__)
+        for name in ('current_bets', 'players_chips', 'all_pots', 'is_player_set', 'is_player_all_in', 'folded',
+                     'n_bets_left', 'board', 'game_actions', 'players_hands'):
+            setattr(clone, name, list(getattr(self, name)))
+        clone.deck = self.deck.snapshot()
+        clone.undo_stack = list()
+        # search lines are not reported
+        clone.sink = NullSink()
+        return clone
+
+    def determinize(self, player_idx, rng=None):
+        # Resample everything player_idx cannot see: the other players' hole cards and
+        # the undealt cards, uniformly from the cards not in player_idx's hand or on the board.
+        # Hole cards are the first cards dealt, two per player in seat order.
+        if rng is None:
+            rng = random if self.deck.rng is None else self.deck.rng
+        self.deck.own()
+        cards = self.deck.deck
+        hidden = [p_idx for p_idx in range(self.num_players) if p_idx != player_idx]
+        positions = [2 * p_idx + k for p_idx in hidden for k in range(2)]
+        unknown = [cards[i] for i in positions] + cards[self.deck.top:]
+        rng.shuffle(unknown)
+        for i, card in zip(positions, unknown):
+            cards[i] = card
+        cards[self.deck.top:] = unknown[len(positions):]
+        for p_idx in hidden:
+            self.players_hands[p_idx] = cards[2 * p_idx:2 * p_idx + 2]
+
 class MatchState:
-    def __init__(self, num_players, initial_small_blind_player, initial_players_chips, variant):
+    def __init__(self, num_players, initial_small_blind_player, initial_players_chips, variant, sink=None, rng=None, reset_chips=False):
         self.num_players = num_players
+        self.sink = sink
+        # shuffles every deck of the match; the global random module if None
+        self.rng = rng
+        # with reset_chips every game starts from the initial stacks instead of the previous game's
+        self.reset_chips = reset_chips
+        self.initial_players_chips = list(initial_players_chips)
         self.small_blind_player = initial_small_blind_player
         self.players_chips = initial_players_chips
         self.current_game = 0
         self.variant = variant
-        self.current_game_state = GameState(self.num_players, self.small_blind_player, self.players_chips, self.variant)
+        self.current_game_state = GameState(self.num_players, self.small_blind_player, self.players_chips, self.variant, self.sink, self.rng)
     
     def update_game(self):
         
         self.small_blind_player = (self.small_blind_player + 1) % self.num_players
-        self.players_chips = [chips for chips in self.current_game_state.players_chips]
-        self.current_game_state = GameState(self.num_players, self.small_blind_player, self.players_chips, self.variant)
+        if self.reset_chips:
+            self.players_chips = list(self.initial_players_chips)
+        else:
+            self.players_chips = [chips for chips in self.current_game_state.players_chips]
+        self.current_game_state = GameState(self.num_players, self.small_blind_player, self.players_chips, self.variant, self.sink, self.rng)
         self.current_game += 1
 
     def is_termination_state(self):
@@ -374,38 +393,71 @@ class MatchState:
         return True
 
 class MatchSimulator:
-    def __init__(self, players, initial_small_blind_player=0, initial_players_chips=[2000,2000], n_games=100, variant='NL'):
+    def __init__(self, players, initial_small_blind_player=0, initial_players_chips=[2000,2000], n_games=100, variant='NL', sink=None, rng=None, reset_chips=False, profiler=None, history=None):
         self.num_players = len(players)
+        # a hand_history.HandHistoryWriter that every finished game is written to
+        self.history = history
+        # a profiling.Profiler, installed while run() plays; its summary is kept in self.profile
+        self.profiler = profiler
+        self.profile = None
         self.variant = variant
-        self.match_state = MatchState(self.num_players, initial_small_blind_player, initial_players_chips, variant)
+        # headless unless given a sink, e.g. PrintSink() for the old stdout log (see events.py)
+        self.sink = NullSink() if sink is None else sink
+        self.match_state = MatchState(self.num_players, initial_small_blind_player, initial_players_chips, variant, self.sink, rng, reset_chips)
         self.current_game = -1
         self.players = players
         self.n_games = n_games
 
     def run(self):
+        if self.profiler is None:
+            return self.play()
+        with self.profiler.installed():
+            result = self.play()
+        self.profiler.record_players(self.players)
+        self.profile = self.profiler.summary()
+        if self.sink.active:
+            self.sink.emit('profile', profile=self.profile)
+        return result
+
+    def play(self):
 
         while self.current_game < self.n_games - 1 and not self.match_state.is_termination_state():
             self.current_game += 1
 
             game_state = self.match_state.current_game_state
+            start_chips = list(game_state.players_chips)
             
-            print(f"Game: {self.current_game}, Chips:{game_state.players_chips}, Bets:{game_state.current_bets}")
+            if self.sink.active:
+                self.sink.emit('game_start', game=self.current_game, chips=list(game_state.players_chips), bets=list(game_state.current_bets))
             while not game_state.is_termination_state():
 
                 while not game_state.is_all_set():
                     current_better = game_state.current_better
                     action, value = self.players[current_better].policy( self.match_state )
                     
-                    print(f"Game: {self.current_game}, Round:{game_state.betting_round}, Player: {current_better}, Chips:{game_state.players_chips[current_better]-game_state.current_bets[current_better]}, Action:{action}")
+                    if self.sink.active:
+                        self.sink.emit('action', game=self.current_game, round=game_state.betting_round, player=current_better,
+                                       chips=game_state.players_chips[current_better]-game_state.current_bets[current_better], action=action)
 
                     game_state.act(action)
                 
                 game_state.update_round()
             
-
+            if self.sink.active:
+                self.sink.emit('game_end', game=self.current_game, chips=list(game_state.players_chips),
+                               deltas=[end - start for end, start in zip(game_state.players_chips, start_chips)], state=game_state)
+            if self.history is not None:
+                self.history.write_game(game_state, start_chips, self.current_game)
 
             self.match_state.update_game()
 
+        if self.history is not None:
+            self.history.flush()
+        # worker processes (VexBot and MCTSPlayer with processes > 1) would otherwise outlive
+        # the match; they are started again if the players play on
+        for player in self.players:
+            player.close()
+
         max_chips = -1
         winner = -1
         for p_idx, chips in enumerate(self.match_state.players_chips):
@@ -416,7 +468,7 @@ class MatchSimulator:
 
 if __name__ == '__main__':
     players = [RaisePlayer(0), RaisePlayer(1)]
-    sim = MatchSimulator(players, n_games=3,initial_players_chips=[2000, 2000])
+    sim = MatchSimulator(players, n_games=3,initial_players_chips=[2000, 2000], sink=PrintSink())
     sim.run()
     # x = np.linspace(0,100,10000)
     # y = np.log(x)
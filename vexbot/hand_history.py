@@ -0,0 +1,318 @@
+import argparse
+import os
+import struct
+import numpy as np
+from card import CARDS
+from tree_store import JOURNAL_ACTIONS
+
+# Binary hand histories
+#
+# An append-only log of finished games. The file is a 16 byte header (magic,
+# version, number of players) followed by blocks of up to block_size games;
+# each block is b'BLK0', its number of games and action bytes, then one column
+# per field of BLOCK_COLUMNS for all its games, then the offsets of every
+# game's actions and the action bytes themselves. Games are buffered by the
+# writer and a block goes to disk in one write, so a block is either there
+# entirely or, after a crash, a truncated tail that readers skip (and that the
+# next writer opening the file cuts off). MatchSimulator(history=...) writes
+# every game it plays; write_batch() writes BatchGames results a whole block at
+# a time without going through Python per game.
+#
+# Per game: its index in the match, the small blind seat, hole cards and board
+# as card codes (255 for cards not dealt), the stacks at the start, the chips
+# won or lost by each seat, the total pot paid out, whether it went to a
+# showdown and the seat left to act at the end. An action is one byte: its index in JOURNAL_ACTIONS (bet, call,
+# fold, flop, turn, river, showdown) in the low 3 bits, the seat that made it
+# above them. The cards of a deal are not repeated, they are on the board.
+#
+# iter_blocks() reads the file a block at a time into NumPy arrays, so scanning
+# a log of millions of games never holds more than one block in memory;
+# iter_games() turns blocks back into per-game records with GameState-style
+# game_actions.
+
+FILE_MAGIC = b'VEXHH\0\0\0'
+FILE_VERSION = 2
+HEADER_SIZE = 16
+BLOCK_MAGIC = b'BLK0'
+NO_CARD = 255
+DEAL_ACTIONS = {'flop': (0, 3), 'turn': (3, 4), 'river': (4, 5)}
+STREET_NAMES = {1: 'flop', 2: 'turn', 3: 'river'}
+
+# (name, dtype, trailing shape given the number of players)
+BLOCK_COLUMNS = [
+    ('game', '<u4', lambda n_players: ()),
+    ('small_blind_player', 'u1', lambda n_players: ()),
+    ('hands', 'u1', lambda n_players: (n_players, 2)),
+    ('board', 'u1', lambda n_players: (5,)),
+    ('chips', '<i4', lambda n_players: (n_players,)),
+    ('deltas', '<i4', lambda n_players: (n_players,)),
+    ('pot', '<i4', lambda n_players: ()),
+    ('showdown', 'u1', lambda n_players: ()),
+    # GameState.current_better once the game is over, which VexBot's tree walk needs
+    ('current_better', 'u1', lambda n_players: ()),
+]
+
+def encode_action(action, arg):
+    code = JOURNAL_ACTIONS.index(action)
+    if action in ('bet', 'call', 'fold'):
+        code |= arg << 3
+    return code
+
+def encode_actions(game_actions):
+    return bytes(encode_action(action, arg) for action, arg in game_actions)
+
+def decode_actions(codes, board):
+    # codes as written by encode_actions, board as card codes; returns GameState.game_actions
+    game_actions = list()
+    for code in codes:
+        action = JOURNAL_ACTIONS[code & 7]
+        if action in DEAL_ACTIONS:
+            start, end = DEAL_ACTIONS[action]
+            game_actions.append((action, tuple(CARDS[c] for c in board[start:end])))
+        elif action == 'showdown':
+            game_actions.append((action, None))
+        else:
+            game_actions.append((action, int(code) >> 3))
+    return game_actions
+
+def batch_action_codes(results):
+    # The action bytes of every game of a BatchGames results dict as an (n_games, width) array, -1 past
+    # each game's end; the same bytes as encode_actions(batch_game.game_actions(results, i)).
+    # A game's sequence is the two blinds, its actions with a deal before the first action of every
+    # later round (rounds go up one at a time until the game ends) and a showdown at the end.
+    n_games, width = results['actions'].shape
+    n_actions = results['n_actions']
+    rounds = results['rounds'].astype(np.int64)
+    codes = np.full((n_games, width + 6), -1, dtype=np.int16)
+    small = results['small_blind_player'].astype(np.int16)
+    codes[:, 0] = small << 3
+    codes[:, 1] = (1 - small) << 3
+    rows, ks = np.nonzero(np.arange(width) < n_actions[:, None])
+    codes[rows, 2 + ks + rounds[rows, ks]] = results['actions'][rows, ks] | (results['actors'][rows, ks].astype(np.int16) << 3)
+    n_deals = np.zeros(n_games, dtype=np.int64)
+    valid = np.arange(width) < n_actions[:, None]
+    for round_ in (1, 2, 3):
+        in_round = (rounds == round_) & valid
+        dealt = in_round.any(axis=1)
+        first = in_round.argmax(axis=1)
+        codes[dealt, 2 + first[dealt] + round_ - 1] = JOURNAL_ACTIONS.index(STREET_NAMES[round_])
+        n_deals += dealt
+    showdown = results['showdown'].astype(bool)
+    codes[showdown, 2 + n_actions[showdown] + n_deals[showdown]] = JOURNAL_ACTIONS.index('showdown')
+    return codes
+
+def card_codes(cards, n):
+    return [card.code for card in cards] + [NO_CARD] * (n - len(cards))
+
+def read_header(f):
+    raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or raw[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise ValueError("Not a hand history file")
+    version, n_players = struct.unpack('<II', raw[len(FILE_MAGIC):])
+    if version != FILE_VERSION:
+        raise ValueError(f"Unsupported hand history version {version}")
+    return n_players
+
+class HandHistoryWriter:
+    # Appends to path (created if missing). Games are buffered and written a block at a time;
+    # call close() (or use it as a context manager) so the last block is written.
+    def __init__(self, path, n_players=2, block_size=4096):
+        self.path = path
+        self.n_players = n_players
+        self.block_size = block_size
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.f = open(path, 'r+b')
+            if read_header(self.f) != n_players:
+                self.f.close()
+                raise ValueError(f"{path} holds games with a different number of players")
+            # drop an unfinished block left by a crash, so new blocks follow the last complete one
+            self.f.truncate(end_of_blocks(self.f, n_players))
+            self.f.seek(0, os.SEEK_END)
+        else:
+            self.f = open(path, 'wb')
+            self.f.write(FILE_MAGIC + struct.pack('<II', FILE_VERSION, n_players))
+        self.n_written = 0
+        self.clear()
+
+    def clear(self):
+        self.columns = {name: list() for name, _, _ in BLOCK_COLUMNS}
+        self.actions = list()
+
+    def write_game(self, game_state, start_chips, game=0):
+        # a finished GameState; start_chips are the stacks before the blinds
+        columns = self.columns
+        columns['game'].append(game)
+        columns['small_blind_player'].append(game_state.small_blind_player)
+        columns['hands'].append([card_codes(hand, 2) for hand in game_state.players_hands])
+        columns['board'].append(card_codes(game_state.board, 5))
+        columns['chips'].append(list(start_chips))
+        columns['deltas'].append([end - start for end, start in zip(game_state.players_chips, start_chips)])
+        columns['pot'].append(game_state.pot_won)
+        columns['showdown'].append(game_state.showdown_board is not None)
+        columns['current_better'].append(game_state.current_better)
+        self.actions.append(encode_actions(game_state.game_actions))
+        if len(self.actions) >= self.block_size:
+            self.flush()
+
+    def write_batch(self, results, start_game=0):
+        # the results dict of batch_game.BatchGames.run()/collect(), games numbered from start_game
+        self.flush()
+        n_games = len(results['deltas'])
+        # a folded game only dealt the board of its last round; a showdown deals all five cards
+        n_board = np.where(results['showdown'], 5, np.array([0, 3, 4, 5])[results['last_round']])
+        boards = np.where(np.arange(5) < n_board[:, None], results['boards'], NO_CARD)
+        columns = {'game': start_game + np.arange(n_games), 'small_blind_player': results['small_blind_player'],
+                   'hands': results['hands'], 'board': boards, 'chips': results['chips'], 'deltas': results['deltas'],
+                   'pot': results['pots'], 'showdown': results['showdown'], 'current_better': results['current_better']}
+        codes = batch_action_codes(results)
+        present = codes >= 0
+        lengths = present.sum(axis=1)
+        offsets = np.zeros(n_games + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        flat = codes[present].astype(np.uint8)
+        for start in range(0, n_games, self.block_size):
+            end = min(start + self.block_size, n_games)
+            self.write_block({name: column[start:end] for name, column in columns.items()}, lengths[start:end],
+                             flat[offsets[start]:offsets[end]].tobytes())
+
+    def flush(self):
+        if self.actions:
+            self.write_block(self.columns, [len(codes) for codes in self.actions], b''.join(self.actions))
+            self.clear()
+
+    def write_block(self, columns, lengths, action_bytes):
+        n_games = len(lengths)
+        offsets = np.zeros(n_games + 1, dtype='<u4')
+        np.cumsum(lengths, out=offsets[1:])
+        parts = [BLOCK_MAGIC, struct.pack('<II', n_games, len(action_bytes))]
+        for name, dtype, shape in BLOCK_COLUMNS:
+            column = np.asarray(columns[name]).astype(dtype)
+            if column.shape != (n_games,) + shape(self.n_players):
+                raise ValueError(f"Column {name} has shape {column.shape}")
+            parts.append(column.tobytes())
+        parts.append(offsets.tobytes())
+        parts.append(action_bytes)
+        self.f.write(b''.join(parts))
+        self.f.flush()
+        self.n_written += n_games
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def block_layout(n_players, n_games, n_action_bytes):
+    # (name, dtype, shape) of every array of a block, in file order
+    layout = [(name, np.dtype(dtype), (n_games,) + shape(n_players)) for name, dtype, shape in BLOCK_COLUMNS]
+    layout.append(('offsets', np.dtype('<u4'), (n_games + 1,)))
+    layout.append(('actions', np.dtype('u1'), (n_action_bytes,)))
+    return layout
+
+def block_nbytes(layout):
+    return sum(dtype.itemsize * int(np.prod(shape)) for _, dtype, shape in layout)
+
+def end_of_blocks(f, n_players):
+    # offset just past the last complete block, skipping over the blocks from just after the header
+    size = f.seek(0, os.SEEK_END)
+    pos = HEADER_SIZE
+    while pos + len(BLOCK_MAGIC) + 8 <= size:
+        f.seek(pos)
+        head = f.read(len(BLOCK_MAGIC) + 8)
+        if head[:len(BLOCK_MAGIC)] != BLOCK_MAGIC:
+            break
+        n_games, n_action_bytes = struct.unpack('<II', head[len(BLOCK_MAGIC):])
+        end = pos + len(head) + block_nbytes(block_layout(n_players, n_games, n_action_bytes))
+        if end > size:
+            break
+        pos = end
+    return pos
+
+def iter_blocks(path, shard=0, n_shards=1):
+    # Yields one dict of arrays per block: the BLOCK_COLUMNS, 'offsets' (n_games + 1) and 'actions' (action bytes).
+    # With n_shards, only every n_shards-th block starting at block shard is read; the others are skipped over.
+    with open(path, 'rb') as f:
+        n_players = read_header(f)
+        block_idx = -1
+        while True:
+            head = f.read(len(BLOCK_MAGIC) + 8)
+            if len(head) < len(BLOCK_MAGIC) + 8:
+                return
+            if head[:len(BLOCK_MAGIC)] != BLOCK_MAGIC:
+                raise ValueError(f"Corrupt block at offset {f.tell() - len(head)}")
+            n_games, n_action_bytes = struct.unpack('<II', head[len(BLOCK_MAGIC):])
+            layout = block_layout(n_players, n_games, n_action_bytes)
+            n_bytes = block_nbytes(layout)
+            block_idx += 1
+            if block_idx % n_shards != shard:
+                if f.seek(n_bytes, os.SEEK_CUR) > os.fstat(f.fileno()).st_size:
+                    return
+                continue
+            data = f.read(n_bytes)
+            if len(data) < n_bytes:
+                # an unfinished block at the end of the file
+                return
+            block = dict()
+            pos = 0
+            for name, dtype, shape in layout:
+                count = int(np.prod(shape))
+                block[name] = np.frombuffer(data, dtype, count, pos).reshape(shape)
+                pos += dtype.itemsize * count
+            yield block
+
+def block_game(block, i):
+    # game i of a block as a dict of plain values, with its game_actions
+    board = [int(code) for code in block['board'][i] if code != NO_CARD]
+    return {
+        'game': int(block['game'][i]),
+        'small_blind_player': int(block['small_blind_player'][i]),
+        'hands': [[CARDS[code] for code in hand] for hand in block['hands'][i]],
+        'board': [CARDS[code] for code in board],
+        'chips': block['chips'][i].tolist(),
+        'deltas': block['deltas'][i].tolist(),
+        'pot': int(block['pot'][i]),
+        'showdown': bool(block['showdown'][i]),
+        'current_better': int(block['current_better'][i]),
+        'game_actions': decode_actions(block['actions'][block['offsets'][i]:block['offsets'][i + 1]], board),
+    }
+
+def iter_games(path, shard=0, n_shards=1):
+    for block in iter_blocks(path, shard, n_shards):
+        for i in range(len(block['game'])):
+            yield block_game(block, i)
+
+def summarize(path):
+    # totals over a whole log, one block at a time
+    n_games = 0
+    n_showdowns = 0
+    n_actions = 0
+    deltas = None
+    pot = 0
+    for block in iter_blocks(path):
+        n_games += len(block['game'])
+        n_showdowns += int(block['showdown'].sum())
+        n_actions += len(block['actions'])
+        pot += int(block['pot'].sum(dtype=np.int64))
+        block_deltas = block['deltas'].sum(axis=0, dtype=np.int64)
+        deltas = block_deltas if deltas is None else deltas + block_deltas
+    return {'games': n_games, 'showdowns': n_showdowns, 'actions': n_actions, 'mean_pot': pot / n_games if n_games else 0.0,
+            'deltas': [] if deltas is None else deltas.tolist()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize or print a binary hand history')
+    parser.add_argument('path')
+    parser.add_argument('--show', type=int, default=0, help='also print the first SHOW games')
+    args = parser.parse_args()
+    if args.show:
+        for k, game in enumerate(iter_games(args.path)):
+            if k == args.show:
+                break
+            print(f"Game: {game['game']}, Hands:{game['hands']}, Board:{game['board']}, Pot:{game['pot']}, Deltas:{game['deltas']}")
+            print(f"  Actions:{game['game_actions']}")
+    summary = summarize(args.path)
+    print(f"{summary['games']} games, {summary['showdowns']} showdowns, {summary['actions']} actions, "
+          f"mean pot {summary['mean_pot']:.1f}, chips won per seat {summary['deltas']}")
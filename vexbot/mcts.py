@@ -0,0 +1,204 @@
+import argparse
+import math
+import time
+from multiprocessing import Pool
+import numpy as np
+import player
+from evaluation import evaluate_duplicate
+from player import Player
+from tree_store import ArrayTree, PROGRAM, OPPONENT, CHANCE
+
+# Monte Carlo tree search agent
+#
+# MCTSPlayer searches the game from the current state with UCT. Every
+# iteration starts from a copy of the game with the cards we cannot see
+# resampled (GameState.snapshot + determinize), walks the search tree and adds
+# one node, then plays the rest of the game out by calling down, so the
+# showdown goes through the fast evaluator. The reward is our chip change.
+#
+# The search tree has VexBot's node types: at our decision nodes actions are
+# picked by UCB1, at opponent nodes they are sampled from the opponent model
+# (the act_freqs of an ArrayTree at the same line, plus prior_weight
+# pseudo-counts per action), and chance nodes branch on the cards dealt. The
+# model learns from every finished game like VexBot's array tree and can be
+# started from a trained tree (training.py).
+#
+# With processes > 1 the iterations are split over a pool of worker processes
+# (root parallelism): each searches its own tree from differently seeded
+# determinizations, and the root statistics are summed. The workers get the
+# model's subtree below the current line only.
+
+ACTION_NAMES = ['bet', 'call', 'fold']
+
+class SearchNode:
+    __slots__ = ('node_type', 'children', 'n_visits', 'total', 'prior')
+
+    def __init__(self, node_type, prior=None):
+        self.node_type = node_type
+        # action (decision nodes) or dealt card codes (chance nodes) -> SearchNode
+        self.children = dict()
+        self.n_visits = 0
+        self.total = 0.0
+        # opponent nodes: probability of each action
+        self.prior = prior
+
+def legal_actions(game_state):
+    # bets that would only call are left out, and so is folding when there is nothing to call
+    p_idx = game_state.current_better
+    to_call = max(game_state.current_bets) - game_state.current_bets[p_idx]
+    actions = [1]
+    if to_call > 0:
+        actions.append(2)
+    if game_state.n_bets_left[p_idx] > 0 and to_call < game_state.players_chips[p_idx] - game_state.current_bets[p_idx]:
+        actions.append(0)
+    return actions
+
+def opponent_prior(model, game_state, prior_weight):
+    freqs = np.zeros(3)
+    if model is not None:
+        node = model.find(game_state.start_player, game_state.game_actions)
+        if node >= 0 and model.node_type[node] == OPPONENT:
+            freqs = model.act_freqs[node].astype(np.float64)
+    freqs = freqs + prior_weight
+    return freqs / freqs.sum()
+
+def search(root_state, player_idx, model, iterations, exploration, prior_weight, rng):
+    # UCT from root_state; returns {action: (visits, total reward)} at the root
+    root = SearchNode(PROGRAM)
+    root_chips = root_state.players_chips[player_idx]
+    # spread of the rewards seen, which scales the exploration term
+    low = high = 0.0
+    for _ in range(iterations):
+        state = root_state.snapshot()
+        state.determinize(player_idx, rng)
+        node = root
+        path = [root]
+        expanded = False
+        while not state.game_over and not expanded:
+            if node.node_type == PROGRAM:
+                action = select_action(node, legal_actions(state), exploration * max(high - low, 1.0))
+            else:
+                action = int(rng.choice(3, p=node.prior))
+            n_board = len(state.board)
+            state.apply((ACTION_NAMES[action], None))
+            dealt = len(state.board) > n_board and not state.game_over
+            child = node.children.get(action)
+            if child is None:
+                child = SearchNode(CHANCE) if dealt else new_decision_node(state, player_idx, model, prior_weight)
+                node.children[action] = child
+                expanded = True
+            path.append(child)
+            node = child
+            if dealt:
+                cards = tuple(card.code for card in state.board[n_board:])
+                child = node.children.get(cards)
+                if child is None:
+                    child = new_decision_node(state, player_idx, model, prior_weight)
+                    node.children[cards] = child
+                    expanded = True
+                path.append(child)
+                node = child
+        # rollout: both players call down to the showdown
+        while not state.game_over:
+            state.apply(('call', None))
+        reward = state.players_chips[player_idx] - root_chips
+        low = min(low, reward)
+        high = max(high, reward)
+        for node in path:
+            node.n_visits += 1
+            node.total += reward
+    return {action: (child.n_visits, child.total) for action, child in root.children.items()}
+
+def new_decision_node(state, player_idx, model, prior_weight):
+    if state.game_over or state.current_better == player_idx:
+        return SearchNode(PROGRAM)
+    return SearchNode(OPPONENT, opponent_prior(model, state, prior_weight))
+
+def select_action(node, actions, exploration):
+    # untried actions first, then UCB1
+    best = None
+    best_score = -np.inf
+    log_n = math.log(max(node.n_visits, 1))
+    for action in actions:
+        child = node.children.get(action)
+        if child is None:
+            return action
+        score = child.total / child.n_visits + exploration * math.sqrt(log_n / child.n_visits)
+        if score > best_score:
+            best = action
+            best_score = score
+    return best
+
+def search_job(job):
+    return search(job['state'], job['player_idx'], job['model'], job['iterations'], job['exploration'],
+                  job['prior_weight'], np.random.default_rng(job['seed']))
+
+class MCTSPlayer(Player):
+    def __init__(self, player_idx, iterations=1000, exploration=1.0, prior_weight=1.0, processes=1, model=None, seed=None):
+        super().__init__(None, seed)
+        self.player_idx = player_idx
+        self.iterations = iterations
+        self.exploration = exploration
+        self.prior_weight = prior_weight
+        self.processes = processes
+        # opponent model: an ArrayTree for our seat, learned from our games
+        self.model = ArrayTree(player_idx) if model is None else model
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(self.seed_sequence.spawn(1)[0])
+        self.pool = None
+        self.game_state = None
+        # root statistics of the last decision: {action name: (visits, mean reward)}
+        self.root_stats = None
+
+    def policy(self, match_state):
+        game_state = match_state.current_game_state
+        prev_game_state = self.game_state
+        if prev_game_state is not None and prev_game_state is not game_state and prev_game_state.game_over:
+            self.model.add_game(prev_game_state)
+        self.game_state = game_state
+
+        root_state = game_state.snapshot()
+        if self.processes == 1:
+            totals = search(root_state, self.player_idx, self.model, self.iterations, self.exploration, self.prior_weight, self.rng)
+        else:
+            totals = self.parallel_search(root_state)
+        action = max(totals, key=lambda a: (totals[a][0], totals[a][1]))
+        self.root_stats = {ACTION_NAMES[a]: (n, total / n) for a, (n, total) in totals.items()}
+        return (ACTION_NAMES[action], None), totals[action][1] / totals[action][0]
+
+    def parallel_search(self, root_state):
+        if self.pool is None:
+            self.pool = Pool(self.processes)
+        node = self.model.find(root_state.start_player, root_state.game_actions)
+        model = self.model.select(self.model.subtree(node)) if node >= 0 else None
+        seeds = self.seed_sequence.spawn(self.processes)
+        counts = [self.iterations // self.processes + (k < self.iterations % self.processes) for k in range(self.processes)]
+        jobs = [dict(state=root_state, player_idx=self.player_idx, model=model, iterations=count, exploration=self.exploration,
+                     prior_weight=self.prior_weight, seed=seed) for count, seed in zip(counts, seeds)]
+        totals = dict()
+        for result in self.pool.map(search_job, jobs):
+            for action, (n, total) in result.items():
+                old_n, old_total = totals.get(action, (0, 0.0))
+                totals[action] = (old_n + n, old_total + total)
+        return totals
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Duplicate evaluation of MCTSPlayer against a baseline agent')
+    parser.add_argument('--opponent', default='RandomPlayer', choices=['RandomPlayer', 'RaisePlayer', 'CallPlayer'])
+    parser.add_argument('--deals', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    agent = (MCTSPlayer, dict(iterations=args.iterations, processes=args.processes))
+    start = time.perf_counter()
+    result = evaluate_duplicate(agent, getattr(player, args.opponent), args.deals, block=args.deals, stop_on_significance=False, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{result['agent']} vs {result['opponent']}: {result['mbb_per_hand']:+.1f} mbb/hand "
+          f"({result['ci'][0]:+.1f}, {result['ci'][1]:+.1f}) over {result['hands']} hands in {elapsed:.1f}s")
@@ -1,17 +1,54 @@
+import gc
+import multiprocessing
 import random 
+import time
+import warnings
+from collections import deque
 import numpy as np
-from copy import deepcopy
+from abstraction import HandAbstraction
+from card import canonicalize
+from tree_store import ArrayTree, append_game, trim_journal
+
+class SearchTimeout(Exception):
+    # raised inside an anytime search when the decision's time budget runs out
+    pass
+
+def search_worker(connection, replica):
+    # Worker side of VexBot's parallel search: replica is a copy of the bot taken when the
+    # worker started. Each request brings the tree operations the bot has done since, which
+    # are replayed to keep the copy in step, the EV context, and the paths of the subtrees
+    # to evaluate; the worker answers with their dfs EVs. None stops it.
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        operations, evaluator, paths = request
+        for name, args in operations:
+            getattr(replica, name)(*args)
+        replica.__dict__.update(evaluator)
+        connection.send([replica.dfs(replica.node_at(path)) for path in paths])
+    connection.close()
 
 class Player:
-    def __init__(self,policy_fnc):
+    def __init__(self,policy_fnc, seed=None):
         self.policy_fnc = policy_fnc
+        # random choices go through rand(): a private stream if seeded, else the global random module
+        self.random = None if seed is None else random.Random(seed)
+
+    def rand(self):
+        return random.random() if self.random is None else self.random.random()
     
     def policy(self, match_state):
         pass
 
+    def close(self):
+        # release what the player holds between decisions (e.g. worker processes); called by
+        # MatchSimulator when it finishes playing, and the player may be used again afterwards
+        pass
+
 class RandomPlayer(Player):
-    def __init__(self, player_idx):
-        super().__init__(None)
+    def __init__(self, player_idx, seed=None):
+        super().__init__(None, seed)
         self.player_idx = player_idx
     def policy(self, match_state):
         # This player selects a random action
@@ -23,7 +60,7 @@ class RandomPlayer(Player):
         chips = game_state.players_chips[self.player_idx]
 
         action = None
-        rand = random.random()
+        rand = self.rand()
         if rand < 0.2:
             action = ('fold', None)
         else: 
@@ -35,7 +72,7 @@ class RandomPlayer(Player):
                     amount = min(chips, prev_bet + game_state.big_blind)
                     action = ('bet', None)
                 elif rand < 0.9:
-                    amount = min(chips, prev_bet + (int)(abs(random.random()*(chips - prev_bet))) // game_state.big_blind * game_state.big_blind)
+                    amount = min(chips, prev_bet + (int)(abs(self.rand()*(chips - prev_bet))) // game_state.big_blind * game_state.big_blind)
                     action = ('bet', None)
                 else:
                     amount = chips
@@ -44,8 +81,8 @@ class RandomPlayer(Player):
         return action, value
     
 class RaisePlayer(Player):
-    def __init__(self, player_idx):
-        super().__init__(None)
+    def __init__(self, player_idx, seed=None):
+        super().__init__(None, seed)
         self.player_idx = player_idx
         
     def policy(self, match_state):
@@ -56,7 +93,7 @@ class RaisePlayer(Player):
 
         action = None
         prev_bet = game_state.current_bets[(self.player_idx - 1) % game_state.num_players]
-        rand = random.random()
+        rand = self.rand()
         
         # 50% min bet
         # 40% random bet
@@ -67,7 +104,7 @@ class RaisePlayer(Player):
             action = ('bet', amount)
         elif rand < 0.9:
             # random bet
-            amount = min(chips, prev_bet + (int)(abs(random.random()*(chips - prev_bet))) // game_state.big_blind * game_state.big_blind)
+            amount = min(chips, prev_bet + (int)(abs(self.rand()*(chips - prev_bet))) // game_state.big_blind * game_state.big_blind)
             action = ('bet', amount)
         else:
             # all in
@@ -78,8 +115,8 @@ class RaisePlayer(Player):
         return action, value
 
 class CallPlayer(Player):
-    def __init__(self, player_idx):
-        super().__init__(None)
+    def __init__(self, player_idx, seed=None):
+        super().__init__(None, seed)
         self.player_idx = player_idx
 
     def policy(self, match_state):
@@ -89,19 +126,78 @@ class CallPlayer(Player):
         return action, value
 
 class VexBot(Player):
-    def __init__(self, player_idx):
-        super().__init__(None)
+    def __init__(self, player_idx, equity_samples=2000, equity_tolerance=0.02, metric='hs', showdown_prior_weight=2.0, store='objects', seed=None, time_budget=None, processes=1, decay=None, window=None, max_nodes=None):
+        super().__init__(None, seed)
         self.player_idx = player_idx
         self.opponent_idx = (player_idx + 1) % 2
 
+        # Hand strength buckets shared by our hand and the opponent hands seen at showdown
+        # (see abstraction.py); equity_samples/equity_tolerance are the Monte Carlo budget
+        self.rng = np.random.default_rng(seed)
+        self.abstraction = HandAbstraction(10, metric, equity_samples, equity_tolerance, rng=self.rng)
+        self.hr_key = None
+        self.hr = None
+        # pseudo-counts of the coarse histogram mixed into observed showdown histograms
+        self.showdown_prior_weight = showdown_prior_weight
+
         # Need to roots; one for player starting, the other is if the player goes second
         self.roots = [None, None]
         self.roots[self.player_idx] = self.ProgramDecisionNode(self.player_idx, None, None)
         self.roots[self.opponent_idx] = self.OpponentNode(self.opponent_idx, None, None)
 
+        # store='array' keeps the tree in a tree_store.ArrayTree instead of node objects; a
+        # decision's EVs come from a vectorized backup of the decision node's subtree, and are
+        # cached per (node, EV context) until the tree changes (see array_child_evs)
+        if store not in ('objects', 'array'):
+            raise ValueError(f"Unknown tree store: {store}")
+        self.store = store
+        self.tree = ArrayTree(self.player_idx) if store == 'array' else None
+        self.tree_evs_version = None
+        self.tree_evs = dict()
+        # tree file whose journal finished games are appended to (save_model/load_model with journal=True)
+        self.model_path = None
+        # seconds per decision; None searches the whole tree. With a budget the tree is searched
+        # progressively deeper and the deepest finished search is used (see anytime_child_evs);
+        # search_stats describes the last decision's search, and search_margin is how much
+        # earlier than the budget searches stop after decisions have overrun it
+        self.time_budget = time_budget
+        self.search_stats = None
+        self.search_margin = 0.0
+        # worker processes for evaluating the object tree's subtrees (see parallel_child_evs),
+        # started once the tree has parallel_min_nodes; the tree operations they have yet to replay
+        self.processes = processes
+        self.parallel_min_nodes = 100000
+        self.workers = None
+        self.operations = list()
+        # (id(unit), EV context) -> index of the worker that evaluated the unit in that context
+        self.unit_workers = dict()
+        # Decaying statistics (see refresh): decay is a half-life and window a length, both in
+        # games learned; clock counts the games learned
+        if (decay is not None or window is not None) and store != 'objects':
+            raise ValueError("decay and window need store='objects'")
+        if decay is not None and window is not None:
+            raise ValueError("Use either decay or window, not both")
+        self.decay = decay
+        self.window = window
+        self.decaying = decay is not None or window is not None
+        self.clock = 0
+        # Bounded memory (see prune): nodes in the object tree, and the cap above which it is
+        # pruned back to prune_target of the cap
+        if max_nodes is not None and store != 'objects':
+            raise ValueError("max_nodes needs store='objects'")
+        self.max_nodes = max_nodes
+        self.prune_target = 0.9
+        self.n_nodes = 2
+
         # Used to track current node in the game
         self.current_node = None
         self.match_state = None
+        self.game_state = None
+
+        # EV memoization (see set_ev_context); at most ev_cache_size contexts per node
+        self.ev_context = None
+        self.coarse_ev_cache = dict()
+        self.ev_cache_size = 32
         
         
         #Init coarse abstraction
@@ -131,6 +227,22 @@ class VexBot(Player):
             self.n_visited = 0
             self.parent = parent
             self.parent_action = parent_action
+            # raises on the path from the root (see get_coarse_statistics), fixed once the node exists
+            self.n_raises = 0
+            if parent is not None:
+                self.n_raises = parent.n_raises
+                if parent_action == 0 and parent.parent_action == 0 and not isinstance(parent, VexBot.ChanceNode):
+                    self.n_raises += 1
+            # EV context -> EV of the subtree, dropped whenever the subtree changes
+            self.ev_cache = dict()
+            # decaying statistics: learning clock the counts were last brought up to (decay),
+            # or the outcomes counted at this node as (clock, key), oldest first (window)
+            self.stamp = 0
+            self.events = None
+            # learning clock of the last game through this node, and the showdown histogram
+            # of the subtrees pruned below it (see prune)
+            self.last_used = 0
+            self.pruned_hist = None
         def __repr__(self):
             class_name = type(self).__name__
             return f"{class_name}(parent={self.parent}, action_to_node={self.parent_action})"
@@ -139,38 +251,52 @@ class VexBot(Player):
         # Deals with board cards
         def __init__(self,player_idx, parent, parent_action, node_type):
             super().__init__(player_idx, parent, parent_action)
-            # card(s) -> [child node, action(card deal) frequency]
+            # canonical card(s) -> [child node, action(card deal) frequency, number of deals in the class]
             self.children_and_freqs = dict()
             self.node_type = node_type
+            # deals over the full deck, the same space card.canonicalize counts multiplicities in
             self.num_outcomes = 1
             if node_type == 'flop':
-                self.num_outcomes = (50 * 49 * 48)/6
+                self.num_outcomes = (52 * 51 * 50)/6
             elif node_type == 'turn':
-                self.num_outcomes = 47
+                self.num_outcomes = 49
             elif node_type == 'river':
-                self.num_outcomes = 46
-        
-    def add_chance_outcome(self, chance_node, cards):
-        node_after_chance = None
-        
-        if self.match_state.current_game_state.start_player == self.player_idx:
-            node_after_chance = self.ProgramDecisionNode(self.player_idx, chance_node, 3)
-        else:
-            node_after_chance = self.OpponentNode(self.opponent_idx, chance_node, 3)
-        if len(cards) == 3:
-            sorted_cards = sorted(cards, key=lambda x: x.suit.value, reverse=True)
-            sorted_cards = sorted(sorted_cards, key=lambda x: x.value, reverse=True)
-
-            if tuple(sorted_cards) not in chance_node.children_and_freqs:
-                chance_node.children_and_freqs[tuple(sorted_cards)] = [node_after_chance,0]
-            chance_node.children_and_freqs[tuple(sorted_cards)][1] += 1
-        else:
-            card = cards[0]
-            if card not in chance_node.children_and_freqs:
-                chance_node.children_and_freqs[card] = [node_after_chance, 0]
-            chance_node.children_and_freqs[card][1] += 1
+                self.num_outcomes = 48
+            # deals covered by the children
+            self.n_explored = 0
+            # key -> learning clock of the key's frequency (decay)
+            self.freq_stamps = dict()
 
-            
+        def add_child(self, key, child, freq, multiplicity):
+            self.children_and_freqs[key] = [child, freq, multiplicity]
+            self.n_explored += multiplicity
+
+        def remove_child(self, key):
+            _, _, multiplicity = self.children_and_freqs[key]
+            self.n_explored -= multiplicity
+            del self.children_and_freqs[key]
+            self.freq_stamps.pop(key, None)
+            if self.events:
+                # the deal's windowed visits still expire from n_visited, but not from a later child
+                self.events = deque((stamp, None if k == key else k) for stamp, k in self.events)
+
+    def add_chance_outcome(self, chance_node, streets, actor):
+        # streets holds every card group dealt so far this game, newest last. Children are
+        # keyed on the suit-isomorphism class of the newest group, so e.g. the 22100 flops
+        # share 1755 children, each remembering how many deals it stands for.
+        canonical, multiplicity = canonicalize(streets)
+        key = canonical[-1]
+        if key not in chance_node.children_and_freqs:
+            node_after_chance = self.new_decision_node(actor, chance_node, 3)
+            chance_node.add_child(key, node_after_chance, 0, multiplicity)
+            self.n_nodes += 1
+            self.invalidate(chance_node)
+        return key
+
+    def new_decision_node(self, actor, parent, parent_action):
+        if actor == self.player_idx:
+            return self.ProgramDecisionNode(self.player_idx, parent, parent_action)
+        return self.OpponentNode(self.opponent_idx, parent, parent_action)
         
     class OpponentNode(Node):
         def __init__(self,player_idx, parent, parent_action):
@@ -203,141 +329,81 @@ class VexBot(Player):
             self.hist = np.zeros(10)
     
     def get_coarse_statistics(self, curr_node):
-        opp_bets = 0
-        player_bets = 0
-        opp_raises = 0
-        player_raises = 0
-        n_actions = 0
-        while curr_node is not None:
-            parent = curr_node.parent
-            if curr_node.parent_action == 0:
-                if parent is not None and parent.parent_action == 0:
-                    if isinstance(parent, self.ProgramDecisionNode):
-                        player_raises += 1
-                    elif isinstance(parent, self.OpponentNode):
-                        opp_raises += 1
-                else:
-                    if isinstance(parent, self.ProgramDecisionNode):
-                        player_bets += 1
-                    elif isinstance(parent, self.OpponentNode):
-                        opp_bets += 1
-            if not isinstance(parent, self.ChanceNode):
-                n_actions += 1
-            curr_node = parent
-        
-        # return opp_bets + opp_raises
-        # return (opp_bets, opp_raises)
-        return player_raises + opp_raises
-    
-    def get_hr_from_cards(self, cards, hand_type):
-        
-        # hr ranges from 0 to 1.0 indicating the strength of the hand, relative to other hands
-        hr = 0
-        if hand_type == 0:
-            hr = 0.95
-        elif hand_type == 1:
-            hr = 0.95
-        elif hand_type == 2:
-            hr = 0.85
-        elif hand_type == 3:
-            hr = 0.75
-        elif hand_type == 4:
-            hr = 0.75
-        elif hand_type == 5:
-            hr = 0.65
-        elif hand_type == 6:
-            hr = 0.55
-        elif hand_type == 7:
-            hr = 0.45
-        elif hand_type == 8:
-            if cards[0].value > 10:
-                hr = 0.35
-            elif cards[0].value > 8:
-                hr = 0.25
-            elif cards[0].value > 5:
-                hr = 0.15
-            else:
-                hr = 0.05
-        return hr
+        # number of raises from the root to curr_node, counted when the node was created
+        return curr_node.n_raises
 
+    def coarse_ev(self, n_raises):
+        # EV from the coarse histogram for a raise count; only depends on the EV context
+        n_raises = min(n_raises, len(self.coarse_abstraction) - 1)
+        if n_raises not in self.coarse_ev_cache:
+            hist_pdf = self.coarse_abstraction[n_raises]
+            self.coarse_ev_cache[n_raises] = self.get_ev_from_hist(hist_pdf)
+        return self.coarse_ev_cache[n_raises]
 
+    def unexplored_ev(self, curr_node, a):
+        # EV of an action never taken from curr_node (a=None: a deal never seen at a chance node)
+        n_raises = self.get_coarse_statistics(curr_node)
+        if a == 0:
+            n_raises += 1
+        if curr_node.pruned_hist is not None:
+            # opponent hands seen in the subtrees pruned here, smoothed like a showdown leaf
+            hist_pdf = self.coarse_abstraction[min(n_raises, len(self.coarse_abstraction) - 1)]
+            return self.get_ev_from_hist(curr_node.pruned_hist + self.showdown_prior_weight * hist_pdf / np.sum(hist_pdf))
+        return self.coarse_ev(n_raises)
 
+    def set_ev_context(self, match_state, deadline=None):
+        # Every EV in the tree is a function of our hand bucket, the pot and our current bet,
+        # and with decaying statistics of the learning clock.
+        # Cached EVs are stored per context so they can be reused whenever it comes back.
+        # A deadline cuts the hand strength estimate short (see HandAbstraction.strength).
+        self.match_state = match_state
+        game_state = match_state.current_game_state
+        hr = self.get_hand_strength(match_state, self.player_idx, deadline)
+        context = (self.abstraction.bucket_of(hr), game_state.pot, game_state.current_bets[self.player_idx], self.clock if self.decaying else 0)
+        if context != self.ev_context:
+            self.ev_context = context
+            self.coarse_ev_cache = dict()
 
-    def get_ev_from_hist(self, hist_pdf, match_state, player_idx):
+    def invalidate(self, node):
+        # the statistics below node changed: drop cached EVs from node up to the root
+        while node is not None:
+            node.ev_cache.clear()
+            node = node.parent
+    
+    def get_hand_strength(self, match_state, player_idx, deadline=None):
+        # hr ranges from 0 to 1.0: the abstraction's strength metric for the hand.
+        # It only changes when the cards do, so it is looked up once per street.
         game_state = match_state.current_game_state
-        board = deepcopy(game_state.board)
-        hand = deepcopy(game_state.players_hands[player_idx])
-        cards = board+hand
-        cards = sorted(cards, key=lambda x: x.value, reverse=True)
-
-        # Evaluate strength of hand if no board is present (preflop)
-
-
-        selected_cards= None
-        if len(cards) == 2:
-            # Human set hr values
-            # if none of the below-> 0.1
-            # if within range ->0.2
-            # if same value -> 0.5
-            # if high value (>10) -> +0.1
-            # if one ace (14) -> +0.1
-            # if same suit -> +0.1
-            card_1 = cards[0]
-            card_2 = cards[1]
-            ev = 0.1
-            if card_1.value - card_2.value < 5:
-                ev = 0.2
-            if card_1.value == card_2.value:
-                ev = 0.5
-            if card_1.suit == card_2.suit:
-                ev += 0.1
-            if card_1.value >= 10 or card_2.value >= 10:
-                ev += 0.2
-            if card_1.value == 14 or card_2.value == 14:
-                ev += 0.1
-            return ev*game_state.pot
-        elif len(cards) == 7:
-            for hand_type in range(9):
-                for i in range(5, -1, -1):
-                    for j in range(6, i, -1):
-                        if i == 5 and j == 6:
-                            continue
-                        five_cards = [deepcopy(cards[k]) for k in range(len(cards)) if (k != i and k != j)]
-                        comparable_cards = game_state.check_if_hand_type(five_cards, hand_type)
-                        if comparable_cards:
-
-                            hr = self.get_hr_from_cards(comparable_cards, hand_type)
-                            hr_idx = ((int)(hr * 10) - 1 )
-                            ev = (np.sum(hist_pdf[0:max(hr_idx-1,0)])+0.5*hist_pdf[hr_idx])/np.sum(hist_pdf)*game_state.pot
-                            return ev
-            return 0
-        elif len(cards) == 6:
-            for hand_type in range(9):
-                for i in range(5, -1, -1):
-                    five_cards = [deepcopy(cards[k]) for k in range(len(cards)) if (k != i)]
-                    comparable_cards = game_state.check_if_hand_type(five_cards, hand_type)
-                    if comparable_cards:
-                        hr = self.get_hr_from_cards(comparable_cards, hand_type)
-                        hr_idx = ((int)(hr * 10) - 1 )
-                        ev = (np.sum(hist_pdf[0:max(hr_idx-1,0)])+0.5*hist_pdf[hr_idx])/np.sum(hist_pdf)*game_state.pot
-                        return ev
-                    
-            return 0
-        elif len(cards) == 5:
-            for hand_type in range(9):
-                five_cards = [deepcopy(cards[k]) for k in range(len(cards))]
-                comparable_cards = game_state.check_if_hand_type(five_cards, hand_type)
-                if comparable_cards:
-                    hr = self.get_hr_from_cards(comparable_cards, hand_type)
-                    hr_idx = ((int)(hr * 10) - 1 )
-                    ev = (np.sum(hist_pdf[0:max(hr_idx-1,0)])+0.5*hist_pdf[hr_idx])/np.sum(hist_pdf)*game_state.pot
-                    return ev
-            return 0
+        hole = game_state.players_hands[player_idx]
+        key = (tuple(hole), tuple(game_state.board))
+        if key != self.hr_key:
+            self.hr_key = key
+            self.hr = self.abstraction.strength(hole, game_state.board, deadline)
+        return self.hr
+
+    def get_ev_from_hist(self, hist_pdf):
+        # hist_pdf is over the opponent's hand buckets: we beat the buckets below ours and split our own.
+        # Our bucket and the pot come from the EV context, so evaluation needs no game state.
+        hr_idx, pot = self.ev_context[:2]
+        ev = (np.sum(hist_pdf[0:hr_idx])+0.5*hist_pdf[hr_idx])/np.sum(hist_pdf)*pot
+        return ev
 
 
     
     
     def dfs(self,curr_node):
+        ev = curr_node.ev_cache.get(self.ev_context)
+        if ev is None:
+            ev = self.node_ev(curr_node)
+            if len(curr_node.ev_cache) >= self.ev_cache_size:
+                curr_node.ev_cache.clear()
+            curr_node.ev_cache[self.ev_context] = ev
+        return ev
+
+    def node_ev(self,curr_node, evaluate_child=None):
+        # evaluate_child(child) gives the EV of an explored child: dfs unless a search bounds it
+        if evaluate_child is None:
+            evaluate_child = self.dfs
 
         if isinstance(curr_node, self.ProgramDecisionNode):
             child_evs = list()
@@ -345,42 +411,37 @@ class VexBot(Player):
                 child = curr_node.children[a]
                 child_ev = 0
                 if child is None:
-                    child_coarse_stats = self.get_coarse_statistics(curr_node)
-                    if a == 0:
-                        child_coarse_stats += 1                                                             
-                    hist_pdf = self.coarse_abstraction[child_coarse_stats]
-                    child_ev = self.get_ev_from_hist(hist_pdf, self.match_state, self.player_idx,)
+                    child_ev = self.unexplored_ev(curr_node, a)
                 else:
-                    child_ev = self.dfs(child)
+                    child_ev = evaluate_child(child)
                 child_evs.append(child_ev)
             return max(child_evs)
         elif isinstance(curr_node,self.OpponentNode):
+            # decay scales all of a node's counts alike, which the frequencies cancel out
+            if self.window is not None:
+                self.refresh(curr_node)
             child_evs = list()
             for a in range(len(curr_node.children)):
                 child = curr_node.children[a]
                 child_ev = 0
                 if child is None:
-                    child_coarse_stats = self.get_coarse_statistics(curr_node)
-                    if a == 0:
-                        child_coarse_stats += 1                                                             
-                    hist_pdf = self.coarse_abstraction[child_coarse_stats]
-                    child_ev = self.get_ev_from_hist(hist_pdf, self.match_state, self.player_idx)
+                    child_ev = self.unexplored_ev(curr_node, a)
                 else:
-                    child_ev = self.dfs(child)
+                    child_ev = evaluate_child(child)
                 child_evs.append(child_ev)
+            if sum(curr_node.act_freqs) == 0:
+                # reached on this game's path but not observed yet
+                return np.mean(child_evs)
             return np.dot(child_evs, curr_node.act_freqs)/sum(curr_node.act_freqs)
         elif isinstance(curr_node,self.ChanceNode):
-            child_evs = list()
-            for k in curr_node.children_and_freqs:
-                child, act_freq = curr_node.children_and_freqs[k]
-                child_ev = self.dfs(child)
-                child_evs.append(child_ev)
-            net_ev = sum(child_evs)/curr_node.num_outcomes
+            # each child is a class of deals, weighted by its multiplicity
+            net_ev = 0
+            for child, _, multiplicity in curr_node.children_and_freqs.values():
+                net_ev += multiplicity * evaluate_child(child)
+            net_ev = net_ev/curr_node.num_outcomes
             
-            coarse_stats = self.get_coarse_statistics(curr_node)
-            hist_pdf = self.coarse_abstraction[coarse_stats]
-            unexplored_children_ev = self.get_ev_from_hist(hist_pdf, self.match_state, self.player_idx)
-            net_ev += (curr_node.num_outcomes - len(child_evs)) / curr_node.num_outcomes * unexplored_children_ev
+            unexplored_children_ev = self.unexplored_ev(curr_node, None)
+            net_ev += (curr_node.num_outcomes - curr_node.n_explored) / curr_node.num_outcomes * unexplored_children_ev
             return net_ev
 
         elif isinstance(curr_node,self.FoldLeafNode):
@@ -390,11 +451,18 @@ class VexBot(Player):
             #          return -1*(self.match_state.current_bets(self.player_idx) + self.match_state.pot/2)
             #     elif isinstance(curr_node.parent, self.OpponentNode):
             #         return self.match_state.current_bets(self.opponent_idx) + self.match_state.pot/2
-            return curr_node.p_win * self.match_state.current_game_state.pot - self.match_state.current_game_state.current_bets[self.player_idx]
+            pot, bet = self.ev_context[1:3]
+            return curr_node.p_win * pot - bet
         elif isinstance(curr_node,self.ShowdownLeafNode):
-            # Leaf node represents a showdown
-            hist_pdf = self.coarse_abstraction[self.get_coarse_statistics(curr_node)]
-            return self.get_ev_from_hist(hist_pdf,self.match_state,self.player_idx)
+            # Leaf node represents a showdown; opponent hands seen here, smoothed by the coarse prior
+            hist = curr_node.hist
+            if self.window is not None:
+                self.refresh(curr_node)
+            elif self.decay is not None:
+                hist = hist * self.decay_factor(curr_node.stamp)
+            hist_pdf = self.coarse_abstraction[min(self.get_coarse_statistics(curr_node), len(self.coarse_abstraction) - 1)]
+            hist_pdf = hist + self.showdown_prior_weight * hist_pdf / np.sum(hist_pdf)
+            return self.get_ev_from_hist(hist_pdf)
             
                 
                 
@@ -413,117 +481,382 @@ class VexBot(Player):
             
             
 
-    def add_branch_to_tree(self, prev_game_state):
-        prev_node = None
-        curr_node = self.roots[prev_game_state.start_player]
-        game_actions = prev_game_state.game_actions
-        i = 0
-        while i < len(game_actions):
-            outcome = game_actions[i]
-            # select
-            next_node = None
-            action_num = self.action_to_num(outcome)
-            if action_num == 0 or action_num == 1 or action_num == 2:
-                next_node = curr_node.children[action_num]
-                curr_node.act_freqs[action_num] += 1
-            elif action_num == 3:
-                next_node = None if outcome[1] not in curr_node.children_and_freqs else curr_node.children_and_freqs[outcome[1]][0]
-                curr_node.children_and_freqs[outcome[1]][1] += 1
-            elif action_num == 4:
-                next_node = curr_node.showdown_node
-                curr_node.showdown_freq += 1
-            
+    def next_actor(self, game_actions, i, current_better):
+        # player to act after game_actions[i]; the current better if nobody has acted since
+        for outcome in game_actions[i+1:]:
+            if self.action_to_num(outcome) < 3:
+                return outcome[1]
+        return current_better
+
+    def step(self, curr_node, game_actions, i, streets, current_better):
+        # Follow game_actions[i] from curr_node, expanding the tree if the branch is new.
+        # streets collects the board cards dealt so far for the chance-node keys.
+        # Returns the next node and the key of the outcome taken at curr_node.
+        outcome = game_actions[i]
+        action_num = self.action_to_num(outcome)
+        if action_num == 0 or action_num == 1 or action_num == 2:
+            next_node = curr_node.children[action_num]
             if next_node is None:
-                # expand
                 if action_num == 2:
-                    next_node = self.FoldLeafNode(curr_node, action_num, outcome[1])
-                    curr_node[action_num] = next_node
-                elif action_num == 4:
-                    next_node = self.ShowdownLeafNode(curr_node, action_num)
-                    curr_node.showdown_node = next_node
-                elif action_num == 3:
-                    self.add_chance_outcome(curr_node, outcome[1])
-                    next_node = curr_node.children_and_freqs[outcome[1]][0]
-                elif action_num == 0:
-                    next_node = self.OpponentNode(self.opponent_idx, curr_node,action_num) if outcome[1] == self.player_idx else self.ProgramDecisionNode(self.player_idx, curr_node, action_num)
-                    curr_node[action_num] = next_node
-                elif action_num == 1:
-                    next_action_num = self.action_to_num(game_actions[i+1])
-                    if next_action_num == 3:
-                        next_node = self.ChanceNode(None, curr_node, action_num, outcome[0])
-                    else:
-                        next_node = self.OpponentNode(self.opponent_idx, curr_node,action_num) if outcome[1] == self.player_idx else self.ProgramDecisionNode(self.player_idx, curr_node, action_num)
-                    curr_node[action_num] = next_node
+                    next_node = self.FoldLeafNode(curr_node, action_num, 1 if outcome[1] == self.opponent_idx else 0)
+                elif i + 1 < len(game_actions) and self.action_to_num(game_actions[i+1]) == 3:
+                    next_node = self.ChanceNode(None, curr_node, action_num, game_actions[i+1][0])
+                else:
+                    next_node = self.new_decision_node(self.next_actor(game_actions, i, current_better), curr_node, action_num)
+                curr_node.children[action_num] = next_node
+                self.n_nodes += 1
+                self.invalidate(curr_node)
+            return next_node, action_num
+        elif action_num == 3:
+            streets.append(outcome[1])
+            key = self.add_chance_outcome(curr_node, streets, self.next_actor(game_actions, i, current_better))
+            return curr_node.children_and_freqs[key][0], key
+        else:
+            if curr_node.showdown_node is None:
+                curr_node.showdown_node = self.ShowdownLeafNode(curr_node, action_num)
+                self.n_nodes += 1
+                self.invalidate(curr_node)
+            return curr_node.showdown_node, action_num
 
-            curr_node = next_node 
-            i += 1
-                
+    def walk(self, start_player, game_actions, current_better):
+        # (node reached by the actions of a game in progress, expanding as needed, its path)
+        if self.workers is not None:
+            self.operations.append(('walk', (start_player, list(game_actions), current_better)))
+        curr_node = self.roots[start_player]
+        path = [start_player]
+        streets = list()
+        for i in range(len(game_actions)):
+            curr_node, key = self.step(curr_node, game_actions, i, streets, current_better)
+            path.append(key)
+        return curr_node, path
 
-    def printTree(self,leaf_node):
-        temp = leaf_node
-        while(temp.parent is not None):
-            print(temp)
-            temp = leaf_node.parent
+    def nodes_on(self, path):
+        # the nodes a path from walk passes: a root, then the node after each key
+        curr_node = self.roots[path[0]]
+        yield curr_node
+        for key in path[1:]:
+            if isinstance(curr_node, self.ChanceNode):
+                curr_node = curr_node.children_and_freqs[key][0]
+            elif key == 4:
+                curr_node = curr_node.showdown_node
+            else:
+                curr_node = curr_node.children[key]
+            yield curr_node
 
+    def node_at(self, path):
+        # the node a path from walk leads to
+        for curr_node in self.nodes_on(path):
+            pass
+        return curr_node
 
-        
-        
+    def add_branch_to_tree(self, prev_game_state):
+        # the opponent's cards are revealed at a showdown
+        showdown_bucket = self.showdown_bucket(prev_game_state)
+        self.add_actions(prev_game_state.start_player, prev_game_state.game_actions, prev_game_state.current_better, showdown_bucket)
+        if self.model_path is not None:
+            append_game(self.model_path, prev_game_state.start_player, prev_game_state.game_actions, prev_game_state.current_better, showdown_bucket)
 
-    def policy(self, match_state):
-        prev_match_state = self.match_state
-        if prev_match_state is not None:
-            prev_game_state = prev_match_state.current_game_state
-            # If the game ended last turn, update the tree
-            if prev_game_state.game_over:
-                self.add_branch_to_tree(prev_game_state)
+    def add_actions(self, start_player, game_actions, current_better, showdown_bucket=None):
+        # count a finished game along its path, from what the journal keeps of it (see tree_store.py)
+        if self.workers is not None:
+            self.operations.append(('add_actions', (start_player, list(game_actions), current_better, showdown_bucket)))
+        self.clock += 1
+        curr_node = self.roots[start_player]
+        streets = list()
+        for i in range(len(game_actions)):
+            next_node, key = self.step(curr_node, game_actions, i, streets, current_better)
+            self.count(curr_node, key)
+            curr_node = next_node
+        self.count(curr_node, showdown_bucket)
+        # every frequency on the path changed
+        self.invalidate(curr_node)
+        if self.max_nodes is not None and self.n_nodes > self.max_nodes:
+            self.prune()
 
+    # Decaying statistics
+    #
+    # With decay (a half-life) or window (a length), both in games learned, the
+    # counts of the object tree follow an opponent who changes: n_visited,
+    # act_freqs, showdown_freq, the chance frequencies and the showdown
+    # histograms. Learning a game touches only its path. With decay each node
+    # keeps its counts as of its stamp, the clock when it was last counted:
+    # reading them means scaling by 0.5 ** (games since the stamp / half-life),
+    # and refresh() stores the scaled counts when the node is counted again.
+    # Reads never store, so EVs do not depend on when nodes happened to be
+    # read. With a window, refresh() takes back the node's outcomes that are
+    # window or more games old, both when the node is counted and when node_ev
+    # reads it. The clock is part of the EV context, so EVs cached before a
+    # game was learned are not reused.
 
+    def count(self, node, key):
+        # count one game at node: its outcome key there (an action, 4 for a showdown or a
+        # chance key), or at a showdown leaf the opponent's bucket (None if not revealed)
+        if self.decaying:
+            self.refresh(node)
+        node.n_visited += 1
+        node.last_used = self.clock
+        if isinstance(node, self.ChanceNode):
+            entry = node.children_and_freqs[key]
+            if self.decay is not None:
+                entry[1] *= self.decay_factor(node.freq_stamps.get(key, self.clock))
+                node.freq_stamps[key] = self.clock
+            entry[1] += 1
+        elif isinstance(node, self.ShowdownLeafNode):
+            if key is not None:
+                node.hist[key] += 1
+        elif isinstance(node, self.FoldLeafNode):
+            pass
+        elif key == 4:
+            node.showdown_freq += 1
+        else:
+            node.act_freqs[key] += 1
+        if self.window is not None:
+            if node.events is None:
+                node.events = deque()
+            node.events.append((self.clock, key))
 
-        
-        self.match_state = match_state
-        game_state = match_state.current_game_state
-        self.current_node = self.roots[game_state.start_player]
+    def decay_factor(self, stamp):
+        return 0.5 ** ((self.clock - stamp) / self.decay)
 
-        action_sequence = game_state.game_actions
-        for actions in action_sequence:
-            
-            act = actions[0]
-            task = actions[1]
-
-            action_index = 0 if act =="bet" else 1 if act =="call" else 2 if act =="fold" else 3
-            if action_index < 3:
-                if task == self.opponent_idx and self.current_node.children[action_index] is None:
-                    self.current_node.children[action_index] = self.ProgramDecisionNode(self.player_idx, self.current_node,action_index)
-                elif task == self.player_idx and self.current_node.children[action_index] is None:
-                    self.current_node.children[action_index] = self.OpponentNode(self.opponent_idx,self.current_node,action_index)
-                # move to next node
-                self.current_node = self.current_node.children[action_index]
+    def refresh(self, node):
+        # bring node's counts up to the learning clock
+        if self.decay is not None:
+            if node.stamp == self.clock:
+                return
+            factor = self.decay_factor(node.stamp)
+            node.stamp = self.clock
+            node.n_visited *= factor
+            if isinstance(node, (self.ProgramDecisionNode, self.OpponentNode)):
+                node.act_freqs = [f * factor for f in node.act_freqs]
+                node.showdown_freq *= factor
+            elif isinstance(node, self.ShowdownLeafNode):
+                node.hist *= factor
+        elif self.window is not None and node.events:
+            events = node.events
+            while events and events[0][0] <= self.clock - self.window:
+                _, key = events.popleft()
+                node.n_visited -= 1
+                if isinstance(node, self.ChanceNode):
+                    if key is not None:
+                        node.children_and_freqs[key][1] -= 1
+                elif isinstance(node, self.ShowdownLeafNode):
+                    if key is not None:
+                        node.hist[key] -= 1
+                elif isinstance(node, self.FoldLeafNode):
+                    pass
+                elif key == 4:
+                    node.showdown_freq -= 1
+                else:
+                    node.act_freqs[key] -= 1
+
+    def iter_nodes(self):
+        stack = list(self.roots)
+        while stack:
+            node = stack.pop()
+            yield node
+            if isinstance(node, self.ChanceNode):
+                stack.extend(child for child, _, _ in node.children_and_freqs.values())
+            elif isinstance(node, (self.ProgramDecisionNode, self.OpponentNode)):
+                stack.extend(child for child in node.children if child is not None)
+                if node.showdown_node is not None:
+                    stack.append(node.showdown_node)
+
+    def refresh_tree(self):
+        # every count up to the clock, before the tree is copied (save_model, merge_tree)
+        for node in self.iter_nodes():
+            self.refresh(node)
+            if self.decay is not None and isinstance(node, self.ChanceNode):
+                for key, entry in node.children_and_freqs.items():
+                    entry[1] *= self.decay_factor(node.freq_stamps.get(key, self.clock))
+                    node.freq_stamps[key] = self.clock
+
+    # Bounded memory
+    #
+    # With max_nodes, a game that takes the object tree past the cap prunes it
+    # back to prune_target of the cap in one sweep, so the sweep is paid once
+    # per many games. Subtrees are evicted rarest first: fewest visits (decayed
+    # or windowed, if the statistics are), then least recently learned from,
+    # then the shallowest, so a line seen once goes as a whole. The parent keeps
+    # its action frequencies, and the opponent hands seen at the subtree's
+    # showdowns are added to the parent's pruned_hist: its unexplored actions
+    # and deals, the pruned ones included, are then valued from that histogram
+    # smoothed by the coarse one instead of the coarse histogram alone. Only
+    # the EVs cached on the parents' paths to the root are dropped. Pruned
+    # histograms are not decayed further. merge_tree keeps them, but the tree
+    # file has no place for them: save_model warns when it leaves them out.
+
+    def prune(self):
+        nodes = list(self.iter_nodes())
+        depth = {id(root): 0 for root in self.roots}
+        # chance child -> its key in the parent
+        chance_keys = dict()
+        for node in nodes:
+            if self.window is not None:
+                self.refresh(node)
+            if isinstance(node, self.ChanceNode):
+                for key, (child, _, _) in node.children_and_freqs.items():
+                    chance_keys[id(child)] = key
+            if node.parent is not None:
+                depth[id(node)] = depth[id(node.parent)] + 1
+
+        def visits(node):
+            if self.decay is not None:
+                return node.n_visited * self.decay_factor(node.stamp)
+            return node.n_visited
+        candidates = sorted((node for node in nodes if node.parent is not None), key=lambda node: (visits(node), node.last_used, depth[id(node)]))
+        target = int(self.prune_target * self.max_nodes)
+        evicted = set()
+        for node in candidates:
+            if self.n_nodes <= target:
+                break
+            if id(node) in evicted:
+                continue
+            parent = node.parent
+            if parent.pruned_hist is None:
+                parent.pruned_hist = np.zeros(len(self.coarse_abstraction[0]))
+            stack = [node]
+            while stack:
+                curr_node = stack.pop()
+                evicted.add(id(curr_node))
+                self.n_nodes -= 1
+                if curr_node.pruned_hist is not None:
+                    parent.pruned_hist += curr_node.pruned_hist
+                if isinstance(curr_node, self.ShowdownLeafNode):
+                    hist = curr_node.hist
+                    if self.decay is not None:
+                        hist = hist * self.decay_factor(curr_node.stamp)
+                    parent.pruned_hist += hist
+                elif isinstance(curr_node, self.ChanceNode):
+                    stack.extend(child for child, _, _ in curr_node.children_and_freqs.values())
+                elif isinstance(curr_node, (self.ProgramDecisionNode, self.OpponentNode)):
+                    stack.extend(child for child in curr_node.children if child is not None)
+                    if curr_node.showdown_node is not None:
+                        stack.append(curr_node.showdown_node)
+            if isinstance(parent, self.ChanceNode):
+                parent.remove_child(chance_keys[id(node)])
+            elif parent.showdown_node is node:
+                parent.showdown_node = None
             else:
+                parent.children[node.parent_action] = None
+            self.invalidate(parent)
 
-                # Sort task, which should be some cards
-                sorted_cards = sorted(task, key=lambda x: x.suit.value, reverse=True)
-                task = tuple(sorted(sorted_cards, key=lambda x: x.value, reverse=True))
-               
-
-
-                # The current node is mistakenly a programdecision or an opponent
-                # Go to parent and change the node; parent is either a program decision or an opponent node
-                if not isinstance(self.current_node,self.ChanceNode):
-                    index = self.current_node.parent_action
-                    self.current_node = self.current_node.parent
-                    self.current_node.children[index] = self.ChanceNode(None,self.current_node,index,task)
-                    self.current_node = self.current_node.children[index]
-                    self.add_chance_outcome(self.current_node,task)
-                # move to next move
-                self.add_chance_outcome(self.current_node,task)
-
-                 # needed since tuples suck
-                if len(task) == 1:
-                    task = task[0]
-                self.current_node = self.current_node.children_and_freqs[task][0]
-           
-            
-        # self.current_node should point to the current node
+    def pruned_hists(self):
+        # (path as from walk, pruned_hist) of every node subtrees were pruned from
+        found = list()
+        stack = [(root, [i]) for i, root in enumerate(self.roots)]
+        while stack:
+            node, path = stack.pop()
+            if node.pruned_hist is not None:
+                found.append((path, node.pruned_hist))
+            if isinstance(node, self.ChanceNode):
+                stack.extend((child, path + [key]) for key, (child, _, _) in node.children_and_freqs.items())
+            elif isinstance(node, (self.ProgramDecisionNode, self.OpponentNode)):
+                stack.extend((child, path + [a]) for a, child in enumerate(node.children) if child is not None)
+                if node.showdown_node is not None:
+                    stack.append((node.showdown_node, path + [4]))
+        return found
+
+    def count_nodes(self):
+        self.n_nodes = sum(1 for _ in self.iter_nodes())
+
+    def stamp_tree(self):
+        # counts copied into new nodes (load_model, merge_tree) count as current; a window
+        # cannot tell when they were seen, so they stay in it
+        for node in self.iter_nodes():
+            node.stamp = self.clock
+            node.last_used = self.clock
+            if isinstance(node, self.ChanceNode):
+                node.freq_stamps = dict.fromkeys(node.children_and_freqs, self.clock)
+
+    def showdown_bucket(self, prev_game_state):
+        # bucket of the opponent's hand if the game ended in a showdown
+        if prev_game_state.game_actions[-1][0] != 'showdown':
+            return None
+        return self.abstraction.bucket(prev_game_state.players_hands[self.opponent_idx], prev_game_state.board)
+
+    def save_model(self, path, journal=False):
+        # write the tree and coarse abstraction to a tree file (see tree_store.py); with journal
+        # the games learned from now on are appended to the file's journal
+        if self.decaying:
+            self.close()
+            self.refresh_tree()
+        tree = self.tree if self.store == 'array' else ArrayTree.from_vexbot(self)
+        if self.store == 'objects' and self.pruned_hists():
+            warnings.warn("Tree files do not keep the histograms of pruned subtrees: a bot loading this one values the pruned lines from the coarse histogram alone")
+        tree.save(path, self.coarse_abstraction)
+        self.model_path = path if journal else None
+
+    def load_model(self, path, mode='c', journal=False):
+        # With store='array' the tree stays memory-mapped (mode 'r' shares the file read-only and
+        # copies the tree into memory when the bot first learns); otherwise it is rebuilt as node
+        # objects. The file is only written to with journal, which appends the games learned
+        # (after cutting off a game torn by a crash). A file with journaled games cannot be
+        # loaded with mode 'r' until save_model has folded them in.
+        tree, coarse_abstraction = ArrayTree.load(path, mode)
+        if tree.player_idx != self.player_idx:
+            raise ValueError(f"Tree file was learned as player {tree.player_idx}, not {self.player_idx}")
+        self.close()
+        if self.store == 'array':
+            self.tree = tree
+            # build the chance child and level indexes now rather than in the first decision
+            tree.index_chance_children()
+            tree.get_levels()
+        else:
+            tree.to_vexbot(self)
+            self.stamp_tree()
+            self.count_nodes()
+        self.coarse_abstraction = np.array(coarse_abstraction)
+        self.ev_context = None
+        self.coarse_ev_cache = dict()
+        self.tree_evs_version = None
+        self.model_path = path if journal else None
+        if journal:
+            trim_journal(path)
+                
+
+    def add_game_to_array_tree(self, prev_game_state):
+        showdown_bucket = self.showdown_bucket(prev_game_state)
+        self.tree.add_game(prev_game_state, showdown_bucket)
+        if self.model_path is not None:
+            append_game(self.model_path, prev_game_state.start_player, prev_game_state.game_actions, prev_game_state.current_better, showdown_bucket)
+
+    def array_tree_evs(self, node):
+        # EV of every node in node's subtree in the current EV context (indexed by node id)
+        hr_idx, pot, bet = self.ev_context[:3]
+        return self.tree.backup(hr_idx, pot, bet, self.coarse_abstraction, self.showdown_prior_weight, node)
+
+    def cached_array_child_evs(self, node):
+        # child EVs of node from an earlier decision in the same tree version and EV context, or None
+        if self.tree_evs_version != self.tree.version:
+            self.tree_evs_version = self.tree.version
+            self.tree_evs = dict()
+        return self.tree_evs.get((node, self.ev_context))
+
+    def cache_array_child_evs(self, node, child_evs):
+        if len(self.tree_evs) >= self.ev_cache_size:
+            self.tree_evs.clear()
+        self.tree_evs[(node, self.ev_context)] = list(child_evs)
+
+    def array_child_evs(self, game_state):
+        node = self.tree.walk(game_state)
+        child_evs = self.cached_array_child_evs(node)
+        if child_evs is not None:
+            return list(child_evs)
+        evs = self.array_tree_evs(node)
+        child_evs = list()
+        for a in range(3):
+            child = self.tree.children[node, a]
+            if child >= 0:
+                child_evs.append((evs[child], a))
+            else:
+                child_evs.append((self.coarse_ev(self.tree.n_raises[node] + (a == 0)), a))
+        self.cache_array_child_evs(node, child_evs)
+        return child_evs
+
+    def object_child_evs(self, game_state):
+        self.current_node, path = self.walk(game_state.start_player, game_state.game_actions, game_state.current_better)
+        if self.use_workers():
+            return self.parallel_child_evs(self.current_node, path)
         child_evs = list()
         for a in range(len(self.current_node.children)):
             child = self.current_node.children[a]
@@ -531,15 +864,334 @@ class VexBot(Player):
                 child_ev = self.dfs(child)
                 child_evs.append((child_ev,a))
             else:
-                coarse_stats = self.get_coarse_statistics(self.current_node)
-                if a == 0:
-                    coarse_stats += 1                                                             
-                hist_pdf = self.coarse_abstraction[coarse_stats]
-                child_ev = self.get_ev_from_hist(hist_pdf, self.match_state, self.player_idx)
+                child_ev = self.unexplored_ev(self.current_node, a)
                 child_evs.append((child_ev,a))
+        return child_evs
+
+    # Parallel search
+    #
+    # With processes > 1 the object tree below the decision node is cut into
+    # units of work: starting from its children, the most visited unit that is
+    # not a leaf is replaced by its children, so big chance nodes are split over
+    # their deals, until there are a few units per process. Worker processes
+    # evaluate the units without a cached EV with dfs, and every node that was
+    # split is then valued by node_ev from its children's EVs. Each EV is
+    # computed by the same code in the same order as in a sequential dfs, so the
+    # decisions are identical.
+    #
+    # Each worker keeps its own copy of the tree. The workers are started once
+    # the tree has parallel_min_nodes (below that a sequential dfs is faster
+    # than any hand-off) and inherit the tree by fork where the platform has it,
+    # otherwise it is pickled to them once. Afterwards the bot queues what it
+    # does to its tree, walking to a decision node and learning a game
+    # (add_actions, pruning included), and every worker replays the queue before
+    # its next units, so a decision only sends the units' paths (see walk) and
+    # the EV context. Every worker caches the EVs under the units it evaluates,
+    # so a unit below one a worker has evaluated in the same EV context goes to
+    # that worker whole; only the others are split and shared out. Changing the
+    # tree any other way (load_model, merge_tree, save_model with decaying
+    # statistics) stops the workers, to be started on a new copy. close() stops
+    # them too. Inside daemonic processes, such as tournament workers, which
+    # cannot start processes, the search stays sequential.
+
+    def search_children(self, curr_node):
+        # (key, child) of the nodes node_ev reads the EVs of
+        if isinstance(curr_node, self.ChanceNode):
+            return [(key, child) for key, (child, _, _) in curr_node.children_and_freqs.items()]
+        if isinstance(curr_node, (self.ProgramDecisionNode, self.OpponentNode)):
+            return [(a, child) for a, child in enumerate(curr_node.children) if child is not None]
+        return []
+
+    def split_search(self, curr_node, path, units_per_process=4):
+        # (units to evaluate as (path, node, index of the worker that evaluated the node or one
+        # above it in this EV context, or None), ids of the nodes split into units)
+        worker = None
+        for node in self.nodes_on(path):
+            worker = self.unit_workers.get((id(node), self.ev_context), worker)
+        def units_below(path, node, worker):
+            return [(path + [key], child, self.unit_workers.get((id(child), self.ev_context), worker))
+                    for key, child in self.search_children(node)]
+        units = units_below(path, curr_node, worker)
+        split = {id(curr_node)}
+        while len(units) < units_per_process * self.processes:
+            candidates = [unit for unit in units if unit[2] is None and self.ev_context not in unit[1].ev_cache and self.search_children(unit[1])]
+            if not candidates:
+                break
+            unit = max(candidates, key=lambda unit: unit[1].n_visited)
+            units.remove(unit)
+            split.add(id(unit[1]))
+            units.extend(units_below(*unit))
+        return [unit for unit in units if self.ev_context not in unit[1].ev_cache], split
+
+    def use_workers(self):
+        if self.workers is not None:
+            return True
+        if self.processes <= 1 or self.n_nodes < self.parallel_min_nodes or multiprocessing.current_process().daemon:
+            return False
+        self.start_workers()
+        return True
+
+    def start_workers(self):
+        # every worker gets a copy of the bot without what only this process uses
+        replica = VexBot.__new__(VexBot)
+        replica.__dict__.update(self.__dict__)
+        replica.workers = None
+        replica.operations = list()
+        replica.unit_workers = dict()
+        replica.model_path = None
+        replica.match_state = None
+        replica.game_state = None
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        self.workers = list()
+        # a forked worker then shares the tree's pages until it writes to them; moving the
+        # tree out of the collector's reach keeps garbage collection from writing to them all
+        gc.freeze()
+        try:
+            for _ in range(self.processes):
+                connection, worker_connection = context.Pipe()
+                worker = context.Process(target=search_worker, args=(worker_connection, replica), daemon=True)
+                worker.start()
+                worker_connection.close()
+                self.workers.append((worker, connection))
+        finally:
+            gc.unfreeze()
+
+    def evaluate_units(self, units):
+        # EV of every unit, keyed by node id. A unit below one a worker has evaluated in this
+        # EV context goes back to it, where the EV caches of the subtree are; the others are
+        # shared out in contiguous chunks
+        n_workers = len(self.workers)
+        fresh = [unit for unit in units if unit[2] is None]
+        chunks = [[unit for unit in units if unit[2] == k] + fresh[k * len(fresh) // n_workers:(k + 1) * len(fresh) // n_workers]
+                  for k in range(n_workers)]
+        evaluator = dict(ev_context=self.ev_context, coarse_ev_cache=dict(self.coarse_ev_cache))
+        # every worker replays the operations, with units or without
+        for (_, connection), chunk in zip(self.workers, chunks):
+            connection.send((self.operations, evaluator, [path for path, _, _ in chunk]))
+        self.operations = list()
+        if len(self.unit_workers) > self.n_nodes:
+            self.unit_workers.clear()
+        evs = dict()
+        for k, ((_, connection), chunk) in enumerate(zip(self.workers, chunks)):
+            for (_, unit, _), ev in zip(chunk, connection.recv()):
+                evs[id(unit)] = ev
+                self.unit_workers[(id(unit), self.ev_context)] = k
+        return evs
+
+    def parallel_child_evs(self, curr_node, path):
+        units, split = self.split_search(curr_node, path)
+        evs = self.evaluate_units(units) if units else dict()
+        def evaluate_child(child):
+            if id(child) in evs:
+                ev = evs[id(child)]
+            elif id(child) in split:
+                ev = self.node_ev(child, evaluate_child)
+            else:
+                return self.dfs(child)
+            if len(child.ev_cache) >= self.ev_cache_size:
+                child.ev_cache.clear()
+            child.ev_cache[self.ev_context] = ev
+            return ev
+        child_evs = list()
+        for a in range(len(curr_node.children)):
+            child = curr_node.children[a]
+            if child is not None:
+                child_evs.append((evaluate_child(child), a))
+            else:
+                child_evs.append((self.unexplored_ev(curr_node, a), a))
+        return child_evs
+
+    def close(self):
+        # stop the search workers; a later parallel decision starts them on a new copy of the tree
+        if self.workers is not None:
+            for worker, connection in self.workers:
+                connection.send(None)
+                connection.close()
+                worker.join()
+            self.workers = None
+            self.operations = list()
+            self.unit_workers = dict()
+
+    # Anytime search
+    #
+    # With a time budget the decision's deadline covers learning the last game,
+    # rating our hand (given at most half the budget, with fewer equity samples
+    # if need be) and the search. The subtree under the decision node is searched
+    # to a horizon of 1, 2, 4, ... steps. Nodes at the horizon are valued like
+    # unexplored ones, from the coarse histogram of their raise count; subtrees
+    # searched to the end are exact and go into the EV caches, so each deeper
+    # pass only revisits what the last one cut off. The search stops once nothing
+    # was cut off or the deadline passes, and the deepest finished pass decides.
+    # The object search checks the clock at every node. An array backup skips a
+    # vectorized step (at most PART_SIZE nodes of a level) that would not finish
+    # before the deadline at its measured cost, and a finished one is cached like
+    # array_child_evs.
+
+    def bounded_ev(self, curr_node, depth_left, search):
+        # (EV, whether the whole subtree was searched) with at most depth_left more steps
+        ev = curr_node.ev_cache.get(self.ev_context)
+        if ev is not None:
+            return ev, True
+        search['nodes'] += 1
+        if time.perf_counter() > search['deadline']:
+            raise SearchTimeout()
+        if depth_left == 0 and not isinstance(curr_node, (self.FoldLeafNode, self.ShowdownLeafNode)):
+            return self.coarse_ev(self.get_coarse_statistics(curr_node)), False
+        complete = [True]
+        def evaluate_child(child):
+            child_ev, child_complete = self.bounded_ev(child, depth_left - 1, search)
+            complete[0] = complete[0] and child_complete
+            return child_ev
+        ev = self.node_ev(curr_node, evaluate_child)
+        if complete[0]:
+            if len(curr_node.ev_cache) >= self.ev_cache_size:
+                curr_node.ev_cache.clear()
+            curr_node.ev_cache[self.ev_context] = ev
+        return ev, complete[0]
+
+    def anytime_object_child_evs(self, game_state, deadline):
+        self.current_node, _ = self.walk(game_state.start_player, game_state.game_actions, game_state.current_better)
+        node = self.current_node
+        search = {'deadline': deadline, 'nodes': 0}
+        # before any pass: cached EVs, or the coarse estimate of an unsearched child
+        child_evs = list()
+        for a, child in enumerate(node.children):
+            ev = None if child is None else child.ev_cache.get(self.ev_context)
+            if ev is None:
+                ev = self.coarse_ev(self.get_coarse_statistics(child)) if child is not None else self.unexplored_ev(node, a)
+            child_evs.append((ev, a))
+        searched_horizon = 0
+        horizon = 1
+        complete = all(child is None or self.ev_context in child.ev_cache for child in node.children)
+        while not complete:
+            try:
+                evs = list()
+                searched = True
+                for a, child in enumerate(node.children):
+                    if child is None:
+                        evs.append((self.unexplored_ev(node, a), a))
+                    else:
+                        ev, child_complete = self.bounded_ev(child, horizon - 1, search)
+                        searched = searched and child_complete
+                        evs.append((ev, a))
+            except SearchTimeout:
+                break
+            child_evs = evs
+            searched_horizon = horizon
+            complete = searched
+            horizon *= 2
+        return child_evs, {'horizon': searched_horizon, 'nodes': search['nodes'], 'complete': complete}
+
+    def anytime_array_child_evs(self, game_state, deadline):
+        # the same deepening over the array tree: each pass is a backup of the decision node's subtree
+        tree = self.tree
+        node = tree.walk(game_state)
+        hr_idx, pot, bet = self.ev_context[:3]
+        evs = None
+        searched_horizon = 0
+        n_nodes = 0
+        cached = self.cached_array_child_evs(node)
+        if cached is not None:
+            return list(cached), {'horizon': searched_horizon, 'nodes': n_nodes, 'complete': True}
+        complete = False
+        # the deepest level of the tree
+        max_depth = tree.get_levels()[0]['depth']
+        horizon = 1
+        while not complete:
+            limit = int(tree.depth[node]) + horizon
+            result = tree.backup(hr_idx, pot, bet, self.coarse_abstraction, self.showdown_prior_weight, node,
+                                 limit if limit < max_depth else None, deadline)
+            if result is None:
+                break
+            evs = result
+            searched_horizon = horizon
+            n_nodes = tree.backup_nodes
+            complete = limit >= max_depth
+            horizon *= 2
+        child_evs = list()
+        for a in range(3):
+            child = tree.children[node, a]
+            if child < 0:
+                child_evs.append((self.coarse_ev(tree.n_raises[node] + (a == 0)), a))
+            elif evs is None:
+                child_evs.append((self.coarse_ev(tree.n_raises[child]), a))
+            else:
+                child_evs.append((evs[child], a))
+        if complete:
+            self.cache_array_child_evs(node, child_evs)
+        return child_evs, {'horizon': searched_horizon, 'nodes': n_nodes, 'complete': complete}
+
+    def anytime_child_evs(self, game_state, start):
+        deadline = start + self.time_budget - self.search_margin
+        if self.store == 'array':
+            child_evs, stats = self.anytime_array_child_evs(game_state, deadline)
+        else:
+            child_evs, stats = self.anytime_object_child_evs(game_state, deadline)
+        stats['elapsed_s'] = time.perf_counter() - start
+        self.search_stats = stats
+        # a search stops before a step that would not fit, at that step's last measured cost,
+        # so it can still finish a little late; the margin takes the overrun off the next deadline
+        if stats['elapsed_s'] > self.time_budget:
+            self.search_margin += stats['elapsed_s'] - self.time_budget
+        else:
+            self.search_margin *= 0.9
+        return child_evs
+
+    def merge_tree(self, tree):
+        # add the counts and histograms of an ArrayTree learned for the same seat (ArrayTree.merge)
+        if self.store == 'array':
+            self.tree.merge(tree)
+        else:
+            self.close()
+            if self.decaying:
+                self.refresh_tree()
+            pruned = self.pruned_hists()
+            merged = ArrayTree.from_vexbot(self)
+            merged.merge(tree)
+            merged.to_vexbot(self)
+            for path, hist in pruned:
+                self.node_at(path).pruned_hist = hist
+            self.stamp_tree()
+            self.count_nodes()
+        self.ev_context = None
+        self.coarse_ev_cache = dict()
+        self.tree_evs_version = None
+
+    def printTree(self,leaf_node):
+        temp = leaf_node
+        while(temp.parent is not None):
+            print(temp)
+            temp = leaf_node.parent
+
+
+        
+        
+
+    def policy(self, match_state):
+        start = time.perf_counter()
+        game_state = match_state.current_game_state
+        prev_game_state = self.game_state
+        # If the game we last acted in has ended, update the tree
+        if prev_game_state is not None and prev_game_state is not game_state and prev_game_state.game_over:
+            if self.store == 'array':
+                self.add_game_to_array_tree(prev_game_state)
+            else:
+                self.add_branch_to_tree(prev_game_state)
+        
+        self.game_state = game_state
+        if self.time_budget is None:
+            self.set_ev_context(match_state)
+        else:
+            self.set_ev_context(match_state, start + self.time_budget / 2)
+        if self.time_budget is not None:
+            child_evs = self.anytime_child_evs(game_state, start)
+        elif self.store == 'array':
+            child_evs = self.array_child_evs(game_state)
+        else:
+            child_evs = self.object_child_evs(game_state)
         child_evs.sort()
         idx = 0 # this is miximax
-        rand = random.random()
+        rand = self.rand()
         if rand < 0.1: # this is miximix
             idx = 1
         chosen_a = child_evs[idx][1]
@@ -0,0 +1,192 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from card import Deck
+from game import GameState
+from player import VexBot
+from tree_store import ArrayTree
+
+# Per-phase profiling
+#
+# A Profiler times the phases of a match and counts events in them. Nothing is
+# instrumented until it is installed: install() swaps the methods listed in
+# HOOKS for timing wrappers on their classes and uninstall() puts the originals
+# back, so the game loop and VexBot run their plain code whenever no profiler
+# is installed. MatchSimulator(profiler=...) installs it for the length of
+# run() and leaves the summary in sim.profile.
+#
+# Each phase gets its number of calls, its self time (time not spent in other
+# timed phases) and its inclusive time (outermost calls only, so recursion such
+# as VexBot.dfs is not counted twice). Probes count cache hits and misses and
+# nodes created. With trace_every=n, every n-th timed call is also kept as a
+# trace event, written out in Chrome trace format (chrome://tracing, Perfetto).
+#
+# Wrappers are installed on the classes, so every game and bot in the process
+# is profiled while a profiler is installed.
+
+def dfs_probe(bot, node):
+    return 'vexbot.ev_cache_hit' if node.ev_cache.get(bot.ev_context) is not None else 'vexbot.ev_cache_miss'
+
+def coarse_ev_probe(bot, n_raises):
+    n_raises = min(n_raises, len(bot.coarse_abstraction) - 1)
+    return 'vexbot.coarse_ev_cache_hit' if n_raises in bot.coarse_ev_cache else 'vexbot.coarse_ev_cache_miss'
+
+def hand_strength_probe(bot, match_state, player_idx, deadline=None):
+    game_state = match_state.current_game_state
+    key = (tuple(game_state.players_hands[player_idx]), tuple(game_state.board))
+    return 'vexbot.hand_strength_cache_hit' if key == bot.hr_key else 'vexbot.hand_strength_cache_miss'
+
+def node_probe(*args):
+    return 'vexbot.nodes_created'
+
+# (class, method, phase, probe): probe(*args) names a counter to increment on every call.
+# A phase of None only runs the probe.
+HOOKS = [
+    (GameState, 'act', 'game.act', None),
+    (GameState, 'update_round', 'game.update_round', None),
+    (GameState, 'showdown', 'game.showdown', None),
+    (GameState, 'determine_winners', 'game.determine_winners', None),
+    (Deck, 'shuffle', 'game.deal', None),
+    (Deck, 'deal', 'game.deal', None),
+    (VexBot, 'policy', 'vexbot.policy', None),
+    (VexBot, 'step', 'vexbot.tree_expansion', None),
+    (VexBot, 'add_branch_to_tree', 'vexbot.add_branch', None),
+    (VexBot, 'add_game_to_array_tree', 'vexbot.add_branch', None),
+    (VexBot, 'dfs', 'vexbot.dfs', dfs_probe),
+    (VexBot, 'array_tree_evs', 'vexbot.backup', None),
+    (VexBot, 'get_ev_from_hist', 'vexbot.get_ev_from_hist', None),
+    (VexBot, 'coarse_ev', None, coarse_ev_probe),
+    (VexBot, 'get_hand_strength', 'vexbot.hand_strength', hand_strength_probe),
+    (VexBot.Node, '__init__', None, node_probe),
+    (ArrayTree, 'step', 'vexbot.tree_expansion', None),
+    (ArrayTree, 'add_node', None, node_probe),
+]
+
+class Profiler:
+    def __init__(self, trace_every=0, max_trace=100000, hooks=None):
+        self.trace_every = trace_every
+        self.max_trace = max_trace
+        self.hooks = HOOKS if hooks is None else hooks
+        self.originals = list()
+        self.reset()
+
+    def reset(self):
+        self.calls = defaultdict(int)
+        self.self_time = defaultdict(float)
+        self.inclusive_time = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.trace = list()
+        self.n_timed = 0
+        # open timed calls: [phase, start, time spent in timed calls below]
+        self.stack = list()
+        self.active = defaultdict(int)
+        self.origin = time.perf_counter()
+        self.wall_time = 0.0
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def wrap(self, original, phase, probe):
+        profiler = self
+        clock = time.perf_counter
+        if phase is None:
+            def wrapper(*args, **kwargs):
+                profiler.counters[probe(*args, **kwargs)] += 1
+                return original(*args, **kwargs)
+            return wrapper
+
+        def wrapper(*args, **kwargs):
+            if probe is not None:
+                profiler.counters[probe(*args, **kwargs)] += 1
+            frame = [phase, clock(), 0.0]
+            profiler.stack.append(frame)
+            profiler.active[phase] += 1
+            try:
+                return original(*args, **kwargs)
+            finally:
+                end = clock()
+                profiler.stack.pop()
+                profiler.active[phase] -= 1
+                elapsed = end - frame[1]
+                profiler.calls[phase] += 1
+                profiler.self_time[phase] += elapsed - frame[2]
+                if profiler.active[phase] == 0:
+                    profiler.inclusive_time[phase] += elapsed
+                if profiler.stack:
+                    profiler.stack[-1][2] += elapsed
+                profiler.n_timed += 1
+                if profiler.trace_every and profiler.n_timed % profiler.trace_every == 0 and len(profiler.trace) < profiler.max_trace:
+                    profiler.trace.append((phase, frame[1] - profiler.origin, elapsed, len(profiler.stack)))
+        return wrapper
+
+    def install(self):
+        if self.originals:
+            return
+        self.installed_at = time.perf_counter()
+        try:
+            for owner, name, phase, probe in self.hooks:
+                original = owner.__dict__[name]
+                self.originals.append((owner, name, original))
+                setattr(owner, name, self.wrap(original, phase, probe))
+        except Exception:
+            # a hook that cannot be installed leaves none of them in place
+            self.uninstall()
+            raise
+
+    def uninstall(self):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = list()
+        self.wall_time += time.perf_counter() - self.installed_at
+
+    @contextmanager
+    def installed(self):
+        self.install()
+        try:
+            yield self
+        finally:
+            self.uninstall()
+
+    def record_players(self, players):
+        # tree sizes of the VexBots in a match, as counters
+        for player in players:
+            if isinstance(player, VexBot):
+                tree = player.tree if player.store == 'array' else ArrayTree.from_vexbot(player)
+                self.counters[f"vexbot.player_{player.player_idx}.tree_nodes"] = tree.n_nodes
+
+    def summary(self):
+        phases = dict()
+        for phase in sorted(self.calls, key=lambda phase: -self.self_time[phase]):
+            phases[phase] = {'calls': self.calls[phase], 'self_s': self.self_time[phase], 'inclusive_s': self.inclusive_time[phase],
+                             'self_us_per_call': 1e6 * self.self_time[phase] / self.calls[phase]}
+        counters = dict(sorted(self.counters.items()))
+        # hit rate of every cache with both a _hit and a _miss counter
+        hit_rates = dict()
+        for name in counters:
+            if name.endswith('_hit'):
+                base = name[:-len('_hit')]
+                total = counters[name] + counters.get(base + '_miss', 0)
+                hit_rates[base] = counters[name] / total if total else 0.0
+        return {'wall_s': self.wall_time, 'phases': phases, 'counters': counters, 'hit_rates': hit_rates}
+
+    def report(self):
+        summary = self.summary()
+        lines = [f"{'phase':<28}{'calls':>10}{'self s':>10}{'incl s':>10}{'us/call':>10}"]
+        for phase, row in summary['phases'].items():
+            lines.append(f"{phase:<28}{row['calls']:>10}{row['self_s']:>10.3f}{row['inclusive_s']:>10.3f}{row['self_us_per_call']:>10.1f}")
+        lines.append(f"wall time: {summary['wall_s']:.3f} s")
+        for name, value in summary['counters'].items():
+            lines.append(f"{name}: {value}")
+        for name, rate in summary['hit_rates'].items():
+            lines.append(f"{name} hit rate: {rate:.1%}")
+        return '\n'.join(lines)
+
+    def trace_events(self):
+        # sampled calls as Chrome trace 'complete' events, times in microseconds
+        return {'traceEvents': [{'name': phase, 'ph': 'X', 'ts': 1e6 * start, 'dur': 1e6 * duration, 'pid': 0, 'tid': 0,
+                                 'args': {'depth': depth}} for phase, start, duration, depth in self.trace]}
+
+    def write_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.trace_events(), f)
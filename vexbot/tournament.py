@@ -0,0 +1,120 @@
+import argparse
+import random
+from multiprocessing import Pool
+import numpy as np
+import player
+from game import MatchSimulator
+
+# Tournament runner
+#
+# Plays many independent matches between pairs of agents over a process pool.
+# Every match gets its own random streams, derived from the tournament seed and
+# the match id alone (one for the deck, one per player), so a match plays out
+# the same whichever worker runs it and in whatever order: results are
+# reproducible for any number of processes. Results stream back as matches
+# finish and are summarized per pairing, in match id order.
+#
+# An agent is a player class or (player class, keyword arguments); it is built
+# as cls(seat, seed=..., **kwargs) inside the worker.
+
+def agent_name(agent):
+    cls, kwargs = agent if isinstance(agent, tuple) else (agent, dict())
+    if not kwargs:
+        return cls.__name__
+    return cls.__name__ + '(' + ', '.join(f"{k}={v}" for k, v in sorted(kwargs.items())) + ')'
+
+def match_seeds(seed, match_id):
+    # deck seed and one seed per seat
+    return [int(s.generate_state(1, np.uint64)[0]) for s in np.random.SeedSequence([seed, match_id]).spawn(3)]
+
+def make_jobs(pairings, n_matches, n_games=100, variant='FL', chips=(2000, 2000), seed=0, swap_seats=True):
+    # One job per match. With swap_seats, odd matches of a pairing seat the agents the other way round.
+    jobs = list()
+    for pairing_idx, (agent_a, agent_b) in enumerate(pairings):
+        for i in range(n_matches):
+            first_seat = 1 if swap_seats and i % 2 == 1 else 0
+            seats = (agent_a, agent_b) if first_seat == 0 else (agent_b, agent_a)
+            jobs.append(dict(match_id=len(jobs), pairing=pairing_idx, first_seat=first_seat, seats=seats, n_games=n_games,
+                             variant=variant, chips=list(chips), seed=seed))
+    return jobs
+
+def make_player(agent, seat, seed):
+    cls, kwargs = agent if isinstance(agent, tuple) else (agent, dict())
+    return cls(seat, seed=seed, **kwargs)
+
+def play_match(job):
+    deck_seed, *seat_seeds = match_seeds(job['seed'], job['match_id'])
+    players = [make_player(agent, seat, seat_seeds[seat]) for seat, agent in enumerate(job['seats'])]
+    sim = MatchSimulator(players, n_games=job['n_games'], initial_players_chips=list(job['chips']),
+                         variant=job['variant'], rng=random.Random(deck_seed))
+    winner, last_game, final_chips = sim.run()
+    return dict(match_id=job['match_id'], pairing=job['pairing'], first_seat=job['first_seat'], names=[agent_name(agent) for agent in job['seats']],
+                winner=winner, n_games=last_game + 1, chips=final_chips,
+                deltas=[final - initial for final, initial in zip(final_chips, job['chips'])])
+
+def iter_matches(jobs, processes=None, chunksize=1):
+    # yields match results as they finish; processes=1 plays them in this process
+    if processes == 1:
+        for job in jobs:
+            yield play_match(job)
+        return
+    with Pool(processes) as pool:
+        for result in pool.imap_unordered(play_match, jobs, chunksize):
+            yield result
+
+def summarize(results, pairings):
+    # per pairing, from the first agent's point of view: wins, win rate and chip delta per match
+    summary = list()
+    results = sorted(results, key=lambda result: result['match_id'])
+    for pairing_idx, (agent_a, agent_b) in enumerate(pairings):
+        name_a = agent_name(agent_a)
+        wins = 0
+        n_matches = 0
+        n_games = 0
+        deltas = list()
+        for result in results:
+            if result['pairing'] != pairing_idx:
+                continue
+            seat = result['first_seat']
+            wins += result['winner'] == seat
+            n_matches += 1
+            n_games += result['n_games']
+            deltas.append(result['deltas'][seat])
+        deltas = np.array(deltas, dtype=np.float64)
+        summary.append(dict(agent=name_a, opponent=agent_name(agent_b), matches=n_matches, games=n_games, wins=wins,
+                            win_rate=wins / n_matches if n_matches else 0.0,
+                            mean_delta=float(deltas.mean()) if n_matches else 0.0,
+                            delta_stderr=float(deltas.std(ddof=1) / np.sqrt(n_matches)) if n_matches > 1 else 0.0,
+                            delta_per_game=float(deltas.sum() / n_games) if n_games else 0.0))
+    return summary
+
+def run_tournament(pairings, n_matches, n_games=100, variant='FL', chips=(2000, 2000), seed=0, processes=None, swap_seats=True, on_result=None):
+    # on_result is called with every match result as it comes in
+    jobs = make_jobs(pairings, n_matches, n_games, variant, chips, seed, swap_seats)
+    results = list()
+    for result in iter_matches(jobs, processes):
+        if on_result is not None:
+            on_result(result)
+        results.append(result)
+    return summarize(results, pairings), sorted(results, key=lambda result: result['match_id'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play seeded matches between agents over a process pool')
+    parser.add_argument('--agent', default='VexBot', help='player class from player.py')
+    parser.add_argument('--opponents', nargs='+', default=['RandomPlayer', 'RaisePlayer', 'CallPlayer'])
+    parser.add_argument('--matches', type=int, default=20, help='matches per pairing')
+    parser.add_argument('--games', type=int, default=100, help='games per match')
+    parser.add_argument('--chips', type=int, default=2000, help='starting chips per player')
+    parser.add_argument('--variant', default='FL')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: all cores)')
+    args = parser.parse_args()
+    pairings = [(getattr(player, args.agent), getattr(player, name)) for name in args.opponents]
+    done = [0]
+    def progress(result):
+        done[0] += 1
+        print(f"Match {result['match_id']} ({done[0]}/{len(pairings) * args.matches}): {result['names']} winner={result['winner']} deltas={result['deltas']}")
+    summary, _ = run_tournament(pairings, args.matches, args.games, args.variant, (args.chips, args.chips), args.seed, args.processes, on_result=progress)
+    for row in summary:
+        print(f"{row['agent']} vs {row['opponent']}: {row['wins']}/{row['matches']} matches won ({row['win_rate']:.1%}), "
+              f"chip delta {row['mean_delta']:+.1f} +/- {row['delta_stderr']:.1f} per match, {row['delta_per_game']:+.2f} per game")
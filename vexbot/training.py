@@ -0,0 +1,90 @@
+import argparse
+import time
+from multiprocessing import Pool
+import numpy as np
+from abstraction import HandAbstraction
+from hand_history import iter_blocks, block_game
+from player import VexBot
+from tree_store import ArrayTree
+
+# Offline VexBot training
+#
+# Builds VexBot's opponent tree from recorded hand histories (hand_history.py)
+# instead of live play. Each game is added exactly as VexBot adds the games it
+# plays: its actions along the tree from the seat's root, and the opponent's
+# hand bucket at a showdown. Workers each take every n-th block of every log
+# and learn their own ArrayTree; the trees are then merged (ArrayTree.merge) in
+# shard order, so the statistics are the same whatever the number of processes.
+#
+# seat is the seat whose opponent is modelled, i.e. the bot's player_idx. Hand
+# buckets come from a HandAbstraction with the bot's settings; on the river
+# (every showdown board) the 'hs' metric is exact, so workers agree with each
+# other and with a bot that played the games live.
+
+def make_jobs(paths, seat, processes, n_buckets=10, metric='hs', equity_samples=2000, equity_tolerance=0.02, seed=0, tables=None):
+    return [dict(paths=list(paths), shard=shard, n_shards=processes, seat=seat, n_buckets=n_buckets, metric=metric,
+                 equity_samples=equity_samples, equity_tolerance=equity_tolerance, seed=seed + shard, tables=tables)
+            for shard in range(processes)]
+
+def train_shard(job):
+    # the tree of one shard's games, and how many games it learned from
+    abstraction = HandAbstraction(job['n_buckets'], job['metric'], job['equity_samples'], job['equity_tolerance'],
+                                  rng=np.random.default_rng(job['seed']))
+    if job['tables'] is not None:
+        abstraction.load_tables(job['tables'])
+    tree = ArrayTree(job['seat'], n_buckets=job['n_buckets'])
+    opponent_idx = (job['seat'] + 1) % 2
+    n_games = 0
+    for path in job['paths']:
+        for block in iter_blocks(path, job['shard'], job['n_shards']):
+            for i in range(len(block['game'])):
+                game = block_game(block, i)
+                showdown_bucket = None
+                if game['showdown']:
+                    showdown_bucket = abstraction.bucket(game['hands'][opponent_idx], game['board'])
+                # heads-up, the small blind starts the game
+                tree.add_actions(game['small_blind_player'], game['game_actions'], game['current_better'], showdown_bucket)
+                n_games += 1
+    return tree, n_games
+
+def train(paths, seat, processes=1, n_buckets=10, metric='hs', equity_samples=2000, equity_tolerance=0.02, seed=0, tables=None):
+    # Returns (tree, games learned). processes=1 trains in this process.
+    jobs = make_jobs(paths, seat, processes, n_buckets, metric, equity_samples, equity_tolerance, seed, tables)
+    if processes == 1:
+        shards = [train_shard(jobs[0])]
+    else:
+        with Pool(processes) as pool:
+            shards = pool.map(train_shard, jobs)
+    tree, n_games = shards[0]
+    for shard_tree, shard_games in shards[1:]:
+        tree.merge(shard_tree)
+        n_games += shard_games
+    return tree, n_games
+
+def pretrain(bot, paths, processes=1, seed=0, tables=None):
+    # add the games of the logs to a VexBot's tree, learned from the bot's seat
+    abstraction = bot.abstraction
+    tree, n_games = train(paths, bot.player_idx, processes, abstraction.n_buckets, abstraction.metric,
+                          abstraction.n_samples, abstraction.tolerance, seed, tables)
+    bot.merge_tree(tree)
+    return n_games
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train a VexBot opponent tree from binary hand histories')
+    parser.add_argument('histories', nargs='+')
+    parser.add_argument('--seat', type=int, default=0, help="the bot's seat in the logged games")
+    parser.add_argument('--out', required=True, help='tree file to write')
+    parser.add_argument('--model', default=None, help='existing tree file to add the games to')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--metric', default='hs')
+    parser.add_argument('--tables', default=None, help='saved hand strength tables (HandAbstraction.save_tables)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    bot = VexBot(args.seat, metric=args.metric, store='array', seed=args.seed)
+    if args.model is not None:
+        bot.load_model(args.model)
+    start = time.perf_counter()
+    n_games = pretrain(bot, args.histories, args.processes, args.seed, args.tables)
+    elapsed = time.perf_counter() - start
+    bot.save_model(args.out)
+    print(f"{n_games} games in {elapsed:.1f}s ({n_games / elapsed:.0f} games/sec), {bot.tree.n_nodes} nodes written to {args.out}")
@@ -0,0 +1,893 @@
+import os
+import struct
+import time
+import zlib
+import numpy as np
+from card import CARDS, canonicalize
+
+# Array-backed VexBot tree
+#
+# ArrayTree holds the same opponent-model tree as VexBot's node objects, but as
+# a struct of preallocated NumPy arrays indexed by node id, grown by doubling.
+# Chance outcomes are stored on the child: its packed canonical card key, how
+# often it was dealt and the multiplicity of its class. Showdown leaves point
+# into one contiguous (n_leaves, n_buckets) histogram array. A node costs well
+# under 100 bytes instead of a Python object with its own lists and dicts.
+#
+# backup() computes the EV of every node at once, level by level from the
+# deepest, with the same rules as VexBot.node_ev. merge() adds another tree's
+# counts and histograms into this one, so trees learned separately (e.g. by
+# training workers) combine into the tree of all their games. Merging only sums
+# counts, so it is associative and commutative: models can be combined in any
+# grouping and order. With a root, backup() only computes that node's subtree,
+# and with a deadline it works in steps of at most PART_SIZE nodes per level,
+# giving up before a step that its last measured cost says would not finish.
+#
+# Trees shard by path prefix: every node below depth `depth` belongs to the
+# shard its first `depth` steps hash to (prefix_hash), and so does every game
+# (game_shard). split() cuts a tree into per-shard trees holding only the games
+# of their shard, the shallow nodes above the cut carrying that shard's share
+# of the counts; merging the shards gives back the tree. Workers that each
+# learn only the games of their shard grow disjoint subtrees below the cut.
+#
+# save() writes the tree and the coarse abstraction to one binary file: a fixed
+# header, then every array back to back (64-byte aligned, native byte order),
+# then a journal of games added since. ArrayTree.load() memory-maps the arrays,
+# so processes loading the same file share its pages: mode 'c' copies a page
+# only when this process writes to it, and mode 'r' maps the file read-only and
+# copies the whole tree into memory (own()) before its first change. The
+# journal is replayed on load; append_game() adds one finished game to it
+# without rewriting the rest of the file, and save() folds it back into the
+# arrays. Replaying would copy the tree, so a file with a journal can only be
+# loaded read-only once it has been saved again. A record torn by a crash
+# mid-append ends the journal: readers stop before it and trim_journal(), run
+# before a writer's first append_game(), cuts it off, like HandHistoryWriter
+# does with a torn block.
+
+PROGRAM = 0
+OPPONENT = 1
+CHANCE = 2
+FOLD = 3
+SHOWDOWN = 4
+
+ACTIONS = {'bet': 0, 'call': 1, 'fold': 2, 'flop': 3, 'turn': 3, 'river': 3, 'showdown': 4}
+STREET_CARDS = {'flop': 3, 'turn': 4, 'river': 5}
+# deals over the full deck per street, as ChanceNode.num_outcomes
+NUM_OUTCOMES = {3: (52 * 51 * 50) / 6, 4: 49, 5: 48}
+# the same indexed by street
+NUM_OUTCOMES_BY_STREET = np.array([NUM_OUTCOMES.get(street, 1.0) for street in range(6)])
+
+# most node ids of a level a search with a deadline handles in one step (see level_parts)
+PART_SIZE = 4096
+
+# per-node arrays: name, dtype, trailing shape
+NODE_ARRAYS = [
+    ('node_type', np.int8, ()),
+    ('parent', np.int32, ()),
+    ('parent_action', np.int8, ()),
+    ('depth', np.int16, ()),
+    # raises on the path from the root, as VexBot.Node.n_raises
+    ('n_raises', np.int16, ()),
+    ('n_visited', np.int32, ()),
+    ('children', np.int32, (3,)),
+    ('act_freqs', np.int32, (3,)),
+    ('showdown_child', np.int32, ()),
+    ('showdown_freq', np.int32, ()),
+    # chance nodes: cards on the board once dealt (3, 4 or 5)
+    ('street', np.int8, ()),
+    # children of chance nodes: packed canonical cards, times dealt, deals in the class
+    ('chance_key', np.int32, ()),
+    ('chance_freq', np.int32, ()),
+    ('multiplicity', np.int32, ()),
+    # fold leaves: 1 if the opponent folded
+    ('p_win', np.int8, ()),
+    # showdown leaves: row in hists
+    ('hist_row', np.int32, ()),
+]
+
+FILE_MAGIC = b'VEXTREE\0'
+FILE_VERSION = 1
+HEADER_FIELDS = ('version', 'player_idx', 'n_nodes', 'n_leaves', 'n_buckets', 'root_0', 'root_1', 'coarse_rows', 'coarse_cols', 'journal_offset')
+HEADER_SIZE = 128
+JOURNAL_ACTIONS = ['bet', 'call', 'fold', 'flop', 'turn', 'river', 'showdown']
+
+def step_hash(prefix_hash, key):
+    # extend a path hash by one step key (action number, or packed cards for a deal)
+    return zlib.crc32(int(key).to_bytes(8, 'little', signed=True), prefix_hash)
+
+def prefix_hash(start_player, game_actions, depth):
+    # hash of the root and the first `depth` steps of a game, as ArrayTree.prefix_hashes
+    h = step_hash(0, start_player)
+    streets = list()
+    for outcome in game_actions[:depth]:
+        action_num = ACTIONS[outcome[0]]
+        if action_num == 3:
+            streets.append(outcome[1])
+            canonical, _ = canonicalize(streets)
+            h = step_hash(h, (3 << 32) | pack_key(canonical[-1]))
+        else:
+            h = step_hash(h, action_num)
+    return h
+
+def game_shard(start_player, game_actions, n_shards, depth=4):
+    # the shard learning a game; with the default depth that is its first two actions after the blinds
+    return prefix_hash(start_player, game_actions, depth) % n_shards
+
+def pack_key(cards):
+    key = 0
+    for i, card in enumerate(cards):
+        key |= (card.code + 1) << (6 * i)
+    return key
+
+def unpack_key(key):
+    cards = list()
+    while key:
+        cards.append(CARDS[(key & 63) - 1])
+        key >>= 6
+    return tuple(cards)
+
+class ArrayTree:
+    def __init__(self, player_idx, capacity=1024, n_buckets=10):
+        self.player_idx = player_idx
+        self.opponent_idx = (player_idx + 1) % 2
+        self.n_buckets = n_buckets
+        self.n_nodes = 0
+        self.n_leaves = 0
+        self.capacity = 0
+        self.leaf_capacity = 0
+
+        for name, dtype, width in NODE_ARRAYS:
+            setattr(self, name, np.zeros((0,) + width, dtype=dtype))
+        self.hists = np.zeros((0, n_buckets))
+
+        # (chance node, key) -> child, for inserting outcomes
+        self.chance_children = dict()
+        # node ids grouped by depth for backup(); extended as nodes are added
+        self.levels = None
+        # root's filtered levels from the last subtree_levels() call
+        self.last_subtree = None
+        # measured [seconds per level, seconds per node] of a filtering and a backup step (see fits)
+        self.step_seconds = {'filter': [0.0, 0.0], 'backup': [0.0, 0.0]}
+        # bumped on every change, so callers can tell when EVs from backup() are stale
+        self.version = 0
+        # True while the arrays are a read-only mapping (see own)
+        self.read_only = False
+
+        self.grow(capacity)
+        self.roots = [None, None]
+        self.roots[self.player_idx] = self.add_node(PROGRAM, -1, -1)
+        self.roots[self.opponent_idx] = self.add_node(OPPONENT, -1, -1)
+
+    def grow(self, capacity):
+        old = self.capacity
+        self.capacity = capacity
+        for name, _, _ in NODE_ARRAYS:
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:old] = array[:old]
+            setattr(self, name, grown)
+        self.children[old:] = -1
+        self.showdown_child[old:] = -1
+        self.hist_row[old:] = -1
+
+    def own(self):
+        # copy a read-only mapped tree into memory before changing it
+        if self.read_only:
+            for name, _, _ in NODE_ARRAYS:
+                setattr(self, name, np.array(getattr(self, name)))
+            self.hists = np.array(self.hists)
+            self.read_only = False
+
+    def add_node(self, node_type, parent, parent_action):
+        self.own()
+        if self.n_nodes == self.capacity:
+            self.grow(2 * self.capacity)
+        idx = self.n_nodes
+        self.n_nodes += 1
+        self.node_type[idx] = node_type
+        self.parent[idx] = parent
+        self.parent_action[idx] = parent_action
+        if parent >= 0:
+            self.depth[idx] = self.depth[parent] + 1
+            # same raise count as VexBot.Node.n_raises
+            raise_here = parent_action == 0 and self.parent_action[parent] == 0 and self.node_type[parent] != CHANCE
+            self.n_raises[idx] = self.n_raises[parent] + raise_here
+        if node_type == SHOWDOWN:
+            if self.n_leaves == self.leaf_capacity:
+                self.leaf_capacity = max(2 * self.leaf_capacity, 64)
+                grown = np.zeros((self.leaf_capacity, self.n_buckets))
+                grown[:self.n_leaves] = self.hists[:self.n_leaves]
+                self.hists = grown
+            self.hist_row[idx] = self.n_leaves
+            self.n_leaves += 1
+        self.version += 1
+        return idx
+
+    def decision_type(self, actor):
+        return PROGRAM if actor == self.player_idx else OPPONENT
+
+    def next_actor(self, game_actions, i, current_better):
+        for outcome in game_actions[i+1:]:
+            if ACTIONS[outcome[0]] < 3:
+                return outcome[1]
+        return current_better
+
+    def step(self, node, game_actions, i, streets, current_better):
+        # Same walk as VexBot.step over node ids; returns (next node, outcome key)
+        outcome = game_actions[i]
+        action_num = ACTIONS[outcome[0]]
+        if action_num < 3:
+            child = self.children[node, action_num]
+            if child < 0:
+                if action_num == 2:
+                    child = self.add_node(FOLD, node, action_num)
+                    self.p_win[child] = 1 if outcome[1] == self.opponent_idx else 0
+                elif i + 1 < len(game_actions) and ACTIONS[game_actions[i+1][0]] == 3:
+                    child = self.add_node(CHANCE, node, action_num)
+                    self.street[child] = STREET_CARDS[game_actions[i+1][0]]
+                else:
+                    child = self.add_node(self.decision_type(self.next_actor(game_actions, i, current_better)), node, action_num)
+                self.children[node, action_num] = child
+            return child, action_num
+        elif action_num == 3:
+            streets.append(outcome[1])
+            canonical, multiplicity = canonicalize(streets)
+            key = pack_key(canonical[-1])
+            if self.chance_children is None:
+                self.index_chance_children()
+            child = self.chance_children.get((node, key))
+            if child is None:
+                child = self.add_node(self.decision_type(self.next_actor(game_actions, i, current_better)), node, 3)
+                self.chance_key[child] = key
+                self.multiplicity[child] = multiplicity
+                self.chance_children[(node, key)] = child
+            return child, key
+        else:
+            child = self.showdown_child[node]
+            if child < 0:
+                child = self.add_node(SHOWDOWN, node, action_num)
+                self.showdown_child[node] = child
+            return child, action_num
+
+    def find(self, start_player, game_actions):
+        # node reached by game_actions without adding any, -1 if the tree has not seen the line
+        node = self.roots[start_player]
+        streets = list()
+        for action, arg in game_actions:
+            action_num = ACTIONS[action]
+            key = None
+            if action_num == 3:
+                streets.append(arg)
+                canonical, _ = canonicalize(streets)
+                key = pack_key(canonical[-1])
+            node = self.child(node, action_num, key)
+            if node < 0:
+                return -1
+        return int(node)
+
+    def subtree(self, node):
+        # boolean mask of node, everything below it and its ancestors (for select())
+        mask = np.zeros(self.n_nodes, dtype=bool)
+        mask[node] = True
+        for group in self.depth_groups()[int(self.depth[node]) + 1:]:
+            mask[group] = mask[self.parent[group]]
+        while node >= 0:
+            mask[node] = True
+            node = self.parent[node]
+        return mask
+
+    def walk(self, game_state):
+        # node reached by the actions of a game in progress, expanding as needed
+        node = self.roots[game_state.start_player]
+        streets = list()
+        for i in range(len(game_state.game_actions)):
+            node, _ = self.step(node, game_state.game_actions, i, streets, game_state.current_better)
+        return node
+
+    def add_game(self, game_state, showdown_bucket=None):
+        # Count a finished game along its path, as VexBot.add_branch_to_tree.
+        # showdown_bucket is the opponent's hand bucket if it was revealed.
+        return self.add_actions(game_state.start_player, game_state.game_actions, game_state.current_better, showdown_bucket)
+
+    def add_actions(self, start_player, game_actions, current_better, showdown_bucket=None):
+        self.own()
+        node = self.roots[start_player]
+        streets = list()
+        for i in range(len(game_actions)):
+            self.n_visited[node] += 1
+            child, key = self.step(node, game_actions, i, streets, current_better)
+            if self.node_type[node] == CHANCE:
+                self.chance_freq[child] += 1
+            elif key == 4:
+                self.showdown_freq[node] += 1
+            else:
+                self.act_freqs[node, key] += 1
+            node = child
+        self.n_visited[node] += 1
+        if self.node_type[node] == SHOWDOWN and showdown_bucket is not None:
+            self.hists[self.hist_row[node], showdown_bucket] += 1
+        self.version += 1
+        return node
+
+    def child(self, node, action, key=None):
+        # child of node along an action (0-2 bet/call/fold, 3 deal with its packed key, 4 showdown), -1 if absent
+        if action < 3:
+            return self.children[node, action]
+        if action == 3:
+            if self.chance_children is None:
+                self.index_chance_children()
+            return self.chance_children.get((node, key), -1)
+        return self.showdown_child[node]
+
+    def merge(self, other):
+        # Add every count and histogram of other (a tree for the same seat) into this tree,
+        # creating the nodes it is missing. Node ids are ordered parents first, so one pass in
+        # id order maps every node of other to its node here. Returns that mapping.
+        if other.player_idx != self.player_idx or other.n_buckets != self.n_buckets:
+            raise ValueError("Can only merge trees learned for the same seat and buckets")
+        self.own()
+        n = other.n_nodes
+        mapping = np.full(n, -1, dtype=np.int64)
+        mapping[other.roots[0]] = self.roots[0]
+        mapping[other.roots[1]] = self.roots[1]
+        for idx in range(n):
+            if mapping[idx] >= 0:
+                continue
+            parent = mapping[other.parent[idx]]
+            action = int(other.parent_action[idx])
+            key = int(other.chance_key[idx])
+            child = self.child(parent, action, key)
+            if child < 0:
+                child = self.add_node(int(other.node_type[idx]), parent, action)
+                self.street[child] = other.street[idx]
+                self.p_win[child] = other.p_win[idx]
+                if action < 3:
+                    self.children[parent, action] = child
+                elif action == 3:
+                    self.chance_key[child] = key
+                    self.multiplicity[child] = other.multiplicity[idx]
+                    self.chance_children[(parent, key)] = child
+                else:
+                    self.showdown_child[parent] = child
+            mapping[idx] = child
+        for name in ('n_visited', 'act_freqs', 'showdown_freq', 'chance_freq'):
+            getattr(self, name)[mapping] += getattr(other, name)[:n]
+        leaves = np.flatnonzero(other.node_type[:n] == SHOWDOWN)
+        self.hists[self.hist_row[mapping[leaves]]] += other.hists[other.hist_row[leaves]]
+        self.version += 1
+        return mapping
+
+    def depth_groups(self):
+        # node ids grouped by depth, shallowest first
+        depth = self.depth[:self.n_nodes]
+        order = np.argsort(depth, kind='stable')
+        return np.split(order, np.flatnonzero(np.diff(depth[order])) + 1)
+
+    def prefix_hashes(self, depth):
+        # per node, the hash of its path from the root cut at depth (prefix_hash of the games through it)
+        hashes = np.zeros(self.n_nodes, dtype=np.int64)
+        for root_seat, root in enumerate(self.roots):
+            hashes[root] = step_hash(0, root_seat)
+        for group in self.depth_groups()[1:]:
+            parents = self.parent[group]
+            if self.depth[group[0]] > depth:
+                hashes[group] = hashes[parents]
+                continue
+            for idx, p in zip(group.tolist(), parents.tolist()):
+                action = int(self.parent_action[idx])
+                key = (3 << 32) | int(self.chance_key[idx]) if action == 3 else action
+                hashes[idx] = step_hash(int(hashes[p]), key)
+        return hashes
+
+    def select(self, keep):
+        # A new tree of the nodes in the boolean mask keep (closed under parents, roots included),
+        # with their statistics; node ids keep their order.
+        n = self.n_nodes
+        idx = np.flatnonzero(keep[:n])
+        new_id = np.full(n + 1, -1, dtype=np.int64)
+        new_id[idx] = np.arange(len(idx))
+        tree = ArrayTree.__new__(ArrayTree)
+        tree.player_idx = self.player_idx
+        tree.opponent_idx = self.opponent_idx
+        tree.n_buckets = self.n_buckets
+        tree.n_nodes = tree.capacity = len(idx)
+        for name, _, _ in NODE_ARRAYS:
+            setattr(tree, name, np.array(getattr(self, name)[idx]))
+        # -1 (no node) indexes new_id[n], which stays -1
+        tree.parent = new_id[tree.parent].astype(np.int32)
+        tree.children = new_id[tree.children].astype(np.int32)
+        tree.showdown_child = new_id[tree.showdown_child].astype(np.int32)
+        leaves = np.flatnonzero(tree.node_type == SHOWDOWN)
+        tree.hists = self.hists[tree.hist_row[leaves]].copy()
+        tree.hist_row[leaves] = np.arange(len(leaves))
+        tree.n_leaves = tree.leaf_capacity = len(leaves)
+        tree.roots = [int(new_id[root]) for root in self.roots]
+        tree.chance_children = None
+        tree.levels = None
+        tree.last_subtree = None
+        tree.step_seconds = {'filter': [0.0, 0.0], 'backup': [0.0, 0.0]}
+        tree.version = 0
+        tree.read_only = False
+        return tree
+
+    def split(self, n_shards, depth=4):
+        # one tree per shard (see game_shard); merging them all gives this tree back
+        n = self.n_nodes
+        shard = self.prefix_hashes(depth) % n_shards
+        parent = self.parent[:n]
+        shallow = (self.depth[:n] < depth) & (self.node_type[:n] != FOLD) & (self.node_type[:n] != SHOWDOWN)
+        groups = self.depth_groups()[::-1]
+        trees = list()
+        for k in range(n_shards):
+            # a shallow node's share is the games of shard k that pass through it, summed up from the cut
+            visits = np.where((shard == k) & ~shallow, self.n_visited[:n], 0).astype(np.int64)
+            keep = (shard == k) & ~shallow
+            for group in groups[:-1]:
+                np.add.at(visits, parent[group], np.where(shallow[parent[group]], visits[group], 0))
+            # shallow nodes no game of any shard went through stay with their own hash
+            keep |= shallow & (shard == k) & (visits == 0)
+            keep[self.roots] = True
+            # with all their ancestors
+            for group in groups[:-1]:
+                keep[parent[group[keep[group]]]] = True
+            tree = self.select(keep)
+            old = np.flatnonzero(keep)
+            is_shallow = shallow[old]
+            tree.n_visited[is_shallow] = visits[old[is_shallow]]
+            for a in range(3):
+                children = tree.children[:, a]
+                tree.act_freqs[is_shallow, a] = np.where(children[is_shallow] >= 0, tree.n_visited[children[is_shallow]], 0)
+            showdown = tree.showdown_child[is_shallow]
+            tree.showdown_freq[is_shallow] = np.where(showdown >= 0, tree.n_visited[showdown], 0)
+            chance_children = np.flatnonzero(is_shallow[tree.parent] & (tree.parent >= 0) & (tree.parent_action == 3))
+            tree.chance_freq[chance_children] = tree.n_visited[chance_children]
+            trees.append(tree)
+        return trees
+
+    def index_chance_children(self):
+        idx = np.flatnonzero(self.parent_action[:self.n_nodes] == 3)
+        self.chance_children = dict(zip(zip(self.parent[idx].tolist(), self.chance_key[idx].tolist()), idx.tolist()))
+
+    def get_levels(self):
+        # Per depth (deepest first): node ids by type, plus the chance children at that depth.
+        # Nodes are only ever appended, so new ones go onto the end of buffers grown by doubling.
+        n = self.n_nodes
+        if self.levels is None:
+            self.levels = dict()
+            self.levels_n = 0
+            self.level_list = list()
+        if self.levels_n < n:
+            new = np.arange(self.levels_n, n)
+            node_type = self.node_type[new]
+            depth = self.depth[new]
+            parent = self.parent[new]
+            has_chance_parent = np.zeros(len(new), dtype=bool)
+            has_chance_parent[parent >= 0] = self.node_type[parent[parent >= 0]] == CHANCE
+            order = np.argsort(depth, kind='stable')
+            bounds = np.flatnonzero(np.diff(depth[order])) + 1
+            for group in np.split(order, bounds):
+                t = node_type[group]
+                added = {'all': new[group], PROGRAM: new[group[t == PROGRAM]], OPPONENT: new[group[t == OPPONENT]],
+                         CHANCE: new[group[t == CHANCE]], FOLD: new[group[t == FOLD]], SHOWDOWN: new[group[t == SHOWDOWN]],
+                         'chance_children': new[group[has_chance_parent[group]]]}
+                # depth -> key -> [buffer, used]
+                buffers = self.levels.setdefault(int(depth[group[0]]), dict())
+                for key, idx in added.items():
+                    buffer, used = buffers.get(key, (np.zeros(0, dtype=np.int64), 0))
+                    if used + len(idx) > len(buffer):
+                        grown = np.zeros(max(2 * len(buffer), used + len(idx), 16), dtype=np.int64)
+                        grown[:used] = buffer[:used]
+                        buffer = grown
+                    buffer[used:used + len(idx)] = idx
+                    buffers[key] = (buffer, used + len(idx))
+            self.levels_n = n
+            self.level_list = list()
+            for d in sorted(self.levels, reverse=True):
+                level = {key: buffer[:used] for key, (buffer, used) in self.levels[d].items()}
+                level['depth'] = d
+                self.level_list.append(level)
+        return self.level_list
+
+    def fits(self, deadline, step, n_nodes):
+        # whether a step over n_nodes of a level, at the cost measured so far, ends before the deadline
+        if deadline is None:
+            return True
+        per_level, per_node = self.step_seconds[step]
+        return time.perf_counter() + per_level + per_node * n_nodes <= deadline
+
+    def measure(self, step, n_nodes, start):
+        # small levels cost numpy's per-call overhead, large ones time per node on top of it;
+        # averaged with the earlier measurements so one slow step does not stall later searches
+        elapsed = time.perf_counter() - start
+        costs = self.step_seconds[step]
+        if n_nodes < 100:
+            costs[0] = 0.5 * (costs[0] + elapsed)
+        else:
+            costs[1] = 0.5 * (costs[1] + max(elapsed - costs[0], 0.0) / n_nodes)
+
+    @staticmethod
+    def level_parts(level, deadline):
+        # a level in parts of at most PART_SIZE ids per key, so a deadline can cut in between;
+        # the steps of backup() and subtree_levels() work the same on any part of a level.
+        # 'all' holds the most ids, so it sets the number of parts.
+        if deadline is None or len(level['all']) <= PART_SIZE:
+            yield level
+            return
+        for start in range(0, len(level['all']), PART_SIZE):
+            yield {key: idx[start:start + PART_SIZE] if key != 'depth' else idx for key, idx in level.items()}
+
+    def subtree_levels(self, root, max_depth=None, deadline=None):
+        # get_levels() cut down to root's subtree, down to max_depth (or the bottom of the tree).
+        # Levels are filtered from the top as deep as a caller has asked and kept for the last
+        # root while no nodes are added, since an anytime search backs up the same subtree
+        # once per horizon; None if the deadline passes while filtering.
+        n = self.n_nodes
+        if self.last_subtree is None or self.last_subtree['root'] != root or self.last_subtree['n'] != n:
+            in_subtree = np.zeros(n, dtype=bool)
+            in_subtree[root] = True
+            self.last_subtree = {'root': root, 'n': n, 'mask': in_subtree, 'levels': list()}
+        subtree = self.last_subtree
+        in_subtree = subtree['mask']
+        root_depth = int(self.depth[root])
+        # get_levels() runs deepest first
+        for level in self.get_levels()[::-1]:
+            if level['depth'] < root_depth + len(subtree['levels']):
+                continue
+            if max_depth is not None and level['depth'] > max_depth:
+                break
+            if level['depth'] > root_depth:
+                for part in self.level_parts({'all': level['all'], 'depth': level['depth']}, deadline):
+                    if not self.fits(deadline, 'filter', len(part['all'])):
+                        return None
+                    start = time.perf_counter()
+                    in_subtree[part['all']] = in_subtree[self.parent[part['all']]]
+                    self.measure('filter', len(part['all']), start)
+            filtered = {key: list() for key in level if key != 'depth'}
+            for part in self.level_parts(level, deadline):
+                if not self.fits(deadline, 'filter', len(part['all'])):
+                    return None
+                start = time.perf_counter()
+                for key in filtered:
+                    filtered[key].append(part[key][in_subtree[part[key]]])
+                self.measure('filter', len(part['all']), start)
+            filtered = {key: np.concatenate(parts) for key, parts in filtered.items()}
+            filtered['depth'] = level['depth']
+            subtree['levels'].append(filtered)
+        if max_depth is None:
+            return subtree['levels'][::-1]
+        return subtree['levels'][:max_depth - root_depth + 1][::-1]
+
+    def backup(self, hr_idx, pot, bet, coarse_abstraction, prior_weight, root=None, max_depth=None, deadline=None):
+        # EV of every node for our hand bucket hr_idx, the pot and our current bet.
+        # A search can bound it: with root only root's subtree is computed (the other
+        # entries are left undefined), with max_depth
+        # non-leaf nodes at that depth are valued like unexplored ones (from the coarse
+        # histogram of their raise count) instead of from their children, and with a deadline
+        # (a time.perf_counter() value) it returns None rather than run past it.
+        # backup_nodes is left at the number of nodes evaluated.
+        def hist_ev(hists):
+            return (hists[:, :hr_idx].sum(axis=1) + 0.5 * hists[:, hr_idx]) / hists.sum(axis=1) * pot
+        max_raises = len(coarse_abstraction) - 1
+        coarse_ev = hist_ev(coarse_abstraction)
+        coarse_pdf = coarse_abstraction / coarse_abstraction.sum(axis=1)[:, None]
+        # unexplored bet children sit one raise deeper
+        unexplored_offset = np.array([1, 0, 0])
+
+        n = self.n_nodes
+        # left uninitialized, as filling whole-tree arrays costs more than backing up a
+        # small subtree: every node backed up is written before it is read
+        ev = np.empty(n)
+        chance_sum = np.empty(n)
+        chance_mass = np.empty(n)
+        levels = self.get_levels()
+        self.backup_nodes = 0
+        min_depth = 0
+        if max_depth is not None:
+            levels = [level for level in levels if level['depth'] <= max_depth]
+        if root is not None:
+            min_depth = int(self.depth[root])
+            levels = self.subtree_levels(root, max_depth, deadline)
+            if levels is None:
+                return None
+        for level in levels:
+            chance_sum[level[CHANCE]] = 0.0
+            chance_mass[level[CHANCE]] = 0.0
+        for level in levels:
+            for part in self.level_parts(level, deadline):
+                if not self.fits(deadline, 'backup', len(part['all'])):
+                    return None
+                start = time.perf_counter()
+                self.backup_nodes += len(part['all'])
+                idx = part[FOLD]
+                ev[idx] = self.p_win[idx].astype(np.float64) * pot - bet
+                idx = part[SHOWDOWN]
+                if len(idx):
+                    prior = coarse_pdf[np.minimum(self.n_raises[idx], max_raises)]
+                    ev[idx] = hist_ev(self.hists[self.hist_row[idx]] + prior_weight * prior)
+                for node_type in (PROGRAM, OPPONENT):
+                    idx = part[node_type]
+                    if len(idx) == 0:
+                        continue
+                    if part['depth'] == max_depth:
+                        ev[idx] = coarse_ev[np.minimum(self.n_raises[idx], max_raises)]
+                        continue
+                    children = self.children[idx]
+                    unexplored = coarse_ev[np.minimum(self.n_raises[idx][:, None] + unexplored_offset, max_raises)]
+                    child_evs = np.where(children >= 0, ev[children], unexplored)
+                    if node_type == PROGRAM:
+                        ev[idx] = child_evs.max(axis=1)
+                    else:
+                        freqs = self.act_freqs[idx]
+                        total = freqs.sum(axis=1)
+                        weighted = (child_evs * freqs).sum(axis=1) / np.maximum(total, 1)
+                        ev[idx] = np.where(total > 0, weighted, child_evs.mean(axis=1))
+                idx = part[CHANCE]
+                if part['depth'] == max_depth:
+                    ev[idx] = coarse_ev[np.minimum(self.n_raises[idx], max_raises)]
+                elif len(idx):
+                    num_outcomes = NUM_OUTCOMES_BY_STREET[self.street[idx]]
+                    unexplored = coarse_ev[np.minimum(self.n_raises[idx], max_raises)]
+                    ev[idx] = chance_sum[idx] / num_outcomes + (num_outcomes - chance_mass[idx]) / num_outcomes * unexplored
+                self.measure('backup', len(part['all']), start)
+            # chance children feed their parents one level up, in one step so the sums
+            # come out the same with or without a deadline
+            idx = level['chance_children']
+            if level['depth'] > min_depth and len(idx):
+                if not self.fits(deadline, 'backup', len(idx)):
+                    return None
+                start = time.perf_counter()
+                # summed per parent in idx order, as np.add.at would
+                parents, position = np.unique(self.parent[idx], return_inverse=True)
+                multiplicity = self.multiplicity[idx]
+                chance_sum[parents] += np.bincount(position, multiplicity * ev[idx], len(parents))
+                chance_mass[parents] += np.bincount(position, multiplicity, len(parents))
+                self.measure('backup', len(idx), start)
+        return ev
+
+    def nbytes(self):
+        return sum(getattr(self, name)[:self.n_nodes].nbytes for name, _, _ in NODE_ARRAYS) + self.hists[:self.n_leaves].nbytes
+
+    @classmethod
+    def from_vexbot(cls, bot):
+        # copy a VexBot object tree; node ids follow a depth-first walk. Decayed counts are rounded.
+        tree = cls(bot.player_idx)
+        for root_idx in range(2):
+            stack = [(bot.roots[root_idx], tree.roots[root_idx])]
+            while stack:
+                node, idx = stack.pop()
+                tree.n_visited[idx] = np.rint(node.n_visited)
+                if isinstance(node, bot.ShowdownLeafNode):
+                    tree.hists[tree.hist_row[idx]] = node.hist
+                    continue
+                if isinstance(node, bot.FoldLeafNode):
+                    tree.p_win[idx] = node.p_win
+                    continue
+                if isinstance(node, bot.ChanceNode):
+                    tree.street[idx] = STREET_CARDS[node.node_type]
+                    for key, (child, freq, multiplicity) in node.children_and_freqs.items():
+                        child_idx = tree.add_node(cls.type_of(bot, child), idx, 3)
+                        packed = pack_key(key)
+                        tree.chance_key[child_idx] = packed
+                        tree.chance_freq[child_idx] = np.rint(freq)
+                        tree.multiplicity[child_idx] = multiplicity
+                        tree.chance_children[(idx, packed)] = child_idx
+                        stack.append((child, child_idx))
+                    continue
+                tree.act_freqs[idx] = np.rint(node.act_freqs)
+                tree.showdown_freq[idx] = np.rint(node.showdown_freq)
+                for a, child in enumerate(node.children):
+                    if child is not None:
+                        child_idx = tree.add_node(cls.type_of(bot, child), idx, a)
+                        tree.children[idx, a] = child_idx
+                        stack.append((child, child_idx))
+                if node.showdown_node is not None:
+                    child_idx = tree.add_node(SHOWDOWN, idx, 4)
+                    tree.showdown_child[idx] = child_idx
+                    stack.append((node.showdown_node, child_idx))
+        return tree
+
+    @staticmethod
+    def type_of(bot, node):
+        if isinstance(node, bot.ProgramDecisionNode):
+            return PROGRAM
+        if isinstance(node, bot.OpponentNode):
+            return OPPONENT
+        if isinstance(node, bot.ChanceNode):
+            return CHANCE
+        if isinstance(node, bot.FoldLeafNode):
+            return FOLD
+        return SHOWDOWN
+
+    def to_vexbot(self, bot):
+        # rebuild the object tree of bot from the arrays
+        street_names = {3: 'flop', 4: 'turn', 5: 'river'}
+        nodes = dict()
+        for idx in range(self.n_nodes):
+            node_type = self.node_type[idx]
+            parent = nodes.get(self.parent[idx])
+            parent_action = int(self.parent_action[idx]) if self.parent[idx] >= 0 else None
+            if node_type == PROGRAM:
+                node = bot.ProgramDecisionNode(bot.player_idx, parent, parent_action)
+            elif node_type == OPPONENT:
+                node = bot.OpponentNode(bot.opponent_idx, parent, parent_action)
+            elif node_type == CHANCE:
+                node = bot.ChanceNode(None, parent, parent_action, street_names[self.street[idx]])
+            elif node_type == FOLD:
+                node = bot.FoldLeafNode(parent, parent_action, int(self.p_win[idx]))
+            else:
+                node = bot.ShowdownLeafNode(parent, parent_action)
+                node.hist = self.hists[self.hist_row[idx]].copy()
+            node.n_visited = int(self.n_visited[idx])
+            if node_type == PROGRAM or node_type == OPPONENT:
+                node.act_freqs = [int(f) for f in self.act_freqs[idx]]
+                node.showdown_freq = int(self.showdown_freq[idx])
+            if parent is not None:
+                if parent_action == 3:
+                    parent.add_child(unpack_key(self.chance_key[idx]), node, int(self.chance_freq[idx]), int(self.multiplicity[idx]))
+                elif parent_action == 4:
+                    parent.showdown_node = node
+                else:
+                    parent.children[parent_action] = node
+            nodes[idx] = node
+        bot.roots = [nodes[self.roots[0]], nodes[self.roots[1]]]
+
+    def save(self, path, coarse_abstraction):
+        coarse_abstraction = np.asarray(coarse_abstraction, dtype=np.float64)
+        layout, journal_offset = file_layout(self.n_nodes, self.n_leaves, self.n_buckets, coarse_abstraction.shape)
+        header = dict(version=FILE_VERSION, player_idx=self.player_idx, n_nodes=self.n_nodes, n_leaves=self.n_leaves,
+                      n_buckets=self.n_buckets, root_0=self.roots[0], root_1=self.roots[1], coarse_rows=coarse_abstraction.shape[0],
+                      coarse_cols=coarse_abstraction.shape[1], journal_offset=journal_offset)
+        arrays = {name: getattr(self, name)[:self.n_nodes] for name, _, _ in NODE_ARRAYS}
+        arrays['hists'] = self.hists[:self.n_leaves]
+        arrays['coarse_abstraction'] = coarse_abstraction
+        # written next to path and renamed over it, so trees mapped from the old file stay valid
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(FILE_MAGIC + struct.pack(f'<{len(HEADER_FIELDS)}q', *[header[field] for field in HEADER_FIELDS]))
+            for name, dtype, shape, offset in layout:
+                f.seek(offset)
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+            f.truncate(journal_offset)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mode='c'):
+        # Returns (tree, coarse abstraction). Arrays stay memory-mapped until the tree
+        # grows past the saved nodes (mode 'c') or first changes (mode 'r', see own),
+        # at which point they are copied into memory.
+        header = read_header(path)
+        layout, journal_offset = file_layout(header['n_nodes'], header['n_leaves'], header['n_buckets'], (header['coarse_rows'], header['coarse_cols']))
+        journal, _ = read_journal(path, journal_offset)
+        if journal and mode == 'r':
+            raise ValueError(f"{path} has {len(journal)} journaled games, which would be replayed into a private copy of the tree; "
+                             "save it again (e.g. load_model then save_model) to fold them in before loading it read-only")
+        tree = cls.__new__(cls)
+        tree.player_idx = header['player_idx']
+        tree.opponent_idx = (tree.player_idx + 1) % 2
+        tree.n_buckets = header['n_buckets']
+        tree.n_nodes = tree.capacity = header['n_nodes']
+        tree.n_leaves = tree.leaf_capacity = header['n_leaves']
+        tree.roots = [header['root_0'], header['root_1']]
+        tree.chance_children = None
+        tree.levels = None
+        tree.last_subtree = None
+        tree.step_seconds = {'filter': [0.0, 0.0], 'backup': [0.0, 0.0]}
+        tree.version = 0
+        tree.read_only = mode == 'r'
+        coarse_abstraction = None
+        for name, dtype, shape, offset in layout:
+            if 0 in shape:
+                array = np.zeros(shape, dtype=dtype)
+            else:
+                # a plain ndarray view of the mapping: indexing an np.memmap is several times slower
+                array = np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape).view(np.ndarray)
+            if name == 'coarse_abstraction':
+                coarse_abstraction = array
+            else:
+                setattr(tree, name, array)
+        for start_player, game_actions, current_better, showdown_bucket in journal:
+            tree.add_actions(start_player, game_actions, current_better, showdown_bucket)
+        return tree, coarse_abstraction
+
+def file_layout(n_nodes, n_leaves, n_buckets, coarse_shape):
+    # (name, dtype, shape, byte offset) of every array in a tree file, and where the journal starts
+    layout = list()
+    offset = HEADER_SIZE
+    arrays = [(name, dtype, (n_nodes,) + width) for name, dtype, width in NODE_ARRAYS]
+    arrays.append(('hists', np.float64, (n_leaves, n_buckets)))
+    arrays.append(('coarse_abstraction', np.float64, tuple(coarse_shape)))
+    for name, dtype, shape in arrays:
+        layout.append((name, dtype, shape, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset = (offset + 63) // 64 * 64
+    return layout, offset
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        raw = f.read(len(FILE_MAGIC) + 8 * len(HEADER_FIELDS))
+    if raw[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise ValueError(f"{path} is not a VexBot tree file")
+    header = dict(zip(HEADER_FIELDS, struct.unpack(f'<{len(HEADER_FIELDS)}q', raw[len(FILE_MAGIC):])))
+    if header['version'] != FILE_VERSION:
+        raise ValueError(f"Unsupported tree file version: {header['version']}")
+    return header
+
+# Journal records: payload length (2 bytes), start player, current better and
+# showdown bucket (255 if none), then per action its index in JOURNAL_ACTIONS
+# followed by the actor for bets/calls/folds or the dealt card codes.
+
+def encode_game(start_player, game_actions, current_better, showdown_bucket=None):
+    payload = bytearray()
+    for action, arg in game_actions:
+        payload.append(JOURNAL_ACTIONS.index(action))
+        if ACTIONS[action] < 3:
+            payload.append(arg)
+        elif ACTIONS[action] == 3:
+            payload.extend(card.code for card in arg)
+    bucket = 255 if showdown_bucket is None else showdown_bucket
+    return struct.pack('<HBBB', len(payload), start_player, current_better, bucket) + bytes(payload)
+
+def decode_actions(payload):
+    # the game actions of a record's payload, None unless the payload holds exactly whole actions
+    game_actions = list()
+    i = 0
+    while i < len(payload):
+        if payload[i] >= len(JOURNAL_ACTIONS):
+            return None
+        action = JOURNAL_ACTIONS[payload[i]]
+        i += 1
+        if ACTIONS[action] < 3:
+            n_args = 1
+        elif ACTIONS[action] == 3:
+            n_args = 3 if action == 'flop' else 1
+        else:
+            n_args = 0
+        args = payload[i:i+n_args]
+        if len(args) < n_args:
+            return None
+        i += n_args
+        if ACTIONS[action] < 3:
+            game_actions.append((action, args[0]))
+        elif ACTIONS[action] == 3:
+            if max(args) >= len(CARDS):
+                return None
+            game_actions.append((action, tuple(CARDS[code] for code in args)))
+        else:
+            game_actions.append((action, None))
+    return game_actions
+
+def decode_games(data):
+    # (games, length of the complete records): decoding stops at the first record that is
+    # cut short or does not parse
+    games = list()
+    pos = 0
+    while pos + 5 <= len(data):
+        length, start_player, current_better, bucket = struct.unpack_from('<HBBB', data, pos)
+        end = pos + 5 + length
+        if end > len(data):
+            break
+        game_actions = decode_actions(data[pos+5:end])
+        if game_actions is None:
+            break
+        games.append((start_player, game_actions, current_better, None if bucket == 255 else bucket))
+        pos = end
+    return games, pos
+
+def read_journal(path, journal_offset):
+    # (games, file offset just past the last complete record)
+    with open(path, 'rb') as f:
+        f.seek(journal_offset)
+        games, length = decode_games(f.read())
+    return games, journal_offset + length
+
+def trim_journal(path):
+    # cut off a record torn by a crash, before games are appended after it
+    header = read_header(path)
+    _, end = read_journal(path, header['journal_offset'])
+    with open(path, 'r+b') as f:
+        f.truncate(end)
+
+def append_game(path, start_player, game_actions, current_better, showdown_bucket=None):
+    read_header(path)
+    with open(path, 'ab') as f:
+        f.write(encode_game(start_player, game_actions, current_better, showdown_bucket))